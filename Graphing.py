@@ -1,7 +1,6 @@
 from flight_querying import query_flights
 from weather_querying import query_weather
 import plotly.graph_objects as go
-from dotenv import load_dotenv
 import numpy as np
 import os
 import pandas as pd
@@ -26,10 +25,7 @@ def create_mapbox_map_per_flight(flight_id: int):
         longitude: A numpy array of Double data type longitudes for the flight.
     """
 
-    # Load .env file
-    load_dotenv()
-
-    # Get mapbox token to run the code.
+    # Get mapbox token to run the code, the .env file is already loaded by database.py
     mapbox_access_token = os.getenv('MAPBOX_PUBLIC_TOKEN')
 
     # Specify Waterloo Wellington Flight Center coordinates and specify the columns to query
@@ -479,21 +475,26 @@ def charging_graph_creation(graph_type: str, flight_ids, x_variable: str, y_vari
     y_ax_data = []
     # Make the query connection
     flight_db_conn = query_flights()
-    flight_data = flight_db_conn.get_flight_soc_and_time(flight_ids)
-    print(flight_data)
+
+    # Get the telemetry columns of all the flights in one query, and their dates and temperatures in one query each
+    telemetry_columns = [column for column in dict.fromkeys(list(x_variable) + list(y_variable)) if column != "temperature"]
+    flights_data = flight_db_conn.get_flights_data_on_ids(telemetry_columns, flight_ids) if telemetry_columns else {}
+    flight_dates = flight_db_conn.get_flight_dates_by_ids(flight_ids)
+    temperatures = flight_db_conn.get_temperatures_on_ids(flight_ids) if "temperature" in (x_variable[0], y_variable[0]) else {}
+
     # Get data from x-variables
     for flight_id in flight_ids:
         if x_variable[0] == "temperature":
-            query_result_x = flight_db_conn.get_temperature_on_id(flight_id)
+            query_result_x = temperatures[flight_id].copy()
         else:
-            query_result_x = flight_db_conn.get_flight_data_on_id(x_variable, flight_id)
+            query_result_x = pd.DataFrame({column: flights_data[flight_id][column] for column in x_variable})
 
         # Get data from y-variables if they are not the same as the x-variables
         if y_variable != x_variable:
             if y_variable[0] == "temperature":
-                query_result_y = flight_db_conn.get_temperature_on_id(flight_id)
+                query_result_y = temperatures[flight_id].copy()
             else:
-                query_result_y = flight_db_conn.get_flight_data_on_id(y_variable, flight_id)
+                query_result_y = pd.DataFrame({column: flights_data[flight_id][column] for column in y_variable})
 
         # if one of the columns is temp, then we run the function
         if x_variable[0] == "temperature":
@@ -525,7 +526,7 @@ def charging_graph_creation(graph_type: str, flight_ids, x_variable: str, y_vari
     for i in range(len(flight_ids)):
         x_data = x_ax_data[i]
         y_data = y_ax_data[i]
-        date = flight_data[flight_ids[i]]["date"]
+        date = flight_dates[flight_ids[i]].strftime("%b %d, %Y")
         if graph_type == "Line Plot":
             plt.plot(x_data, y_data, label=date)
         elif graph_type == "Scatter Plot":
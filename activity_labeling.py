@@ -0,0 +1,69 @@
+# this file labels the activity (takeoff, cruise, steep turn, ...) of every telemetry row with the label model
+# the model is loaded once per process and the features are built straight from the flight dataframes
+import threading
+import joblib
+import pandas as pd
+
+LABEL_MODEL_PATH = 'ML_model_outputs/label_xgboost_model.joblib'
+
+# the model predicts the index of the activity in this list
+ACTIVITY_LABELS = ['HASEL', 'NA', 'climb', 'cruise', 'descent', 'landing', 'post-flight',
+                   'power off stall', 'power on stall', 'pre-flight', 'slow flight',
+                   'steep turn', 'steep turns', 'takeoff']
+
+# the features the model was trained on, in training order
+LABEL_FEATURES = ['time', 'soc', 'motor_rpm', 'voltage', 'motor_power', 'pressure_altitude', 'ground_speed',
+                  'pitch', 'roll', 'ias', 'soh', 'stall_warn_active', 'torque', 'heading', 'qng']
+
+_label_model = None
+_label_model_lock = threading.Lock()
+
+# returns the label model, loading it from disk on first use
+def get_label_model():
+  global _label_model
+  with _label_model_lock:
+    if _label_model is None:
+      _label_model = joblib.load(LABEL_MODEL_PATH)
+  return _label_model
+
+# takes in one flight's telemetry df (the columns as stored in the database) and returns
+# its flight_id, time_min and the model features, rows with a missing feature are dropped
+def label_features(df):
+  features = pd.DataFrame({
+    'flight_id': df['flight_id'],
+    'time_min': df['time_min'],
+    'time': df['time_min'],
+    'soc': (df['bat_1_soc'] + df['bat_2_soc']) / 2,
+    'motor_rpm': df['motor_rpm'],
+    'voltage': (df['bat_1_voltage'] + df['bat_2_voltage']) / 2,
+    'motor_power': df['motor_power'],
+    'pressure_altitude': df['pressure_alt'],
+    'ground_speed': df['ground_speed'],
+    'pitch': df['pitch'],
+    'roll': df['roll'],
+    'ias': df['ias'],
+    'soh': (df['bat_1_soh'] + df['bat_2_soh']) / 2,
+    'stall_warn_active': df['stall_warn_active'],
+    'torque': df['requested_torque'],
+    'heading': df['heading'],
+    'qng': df['qng'],
+  })
+  return features.dropna(subset=LABEL_FEATURES)
+
+# takes in a list of flight telemetry dfs and labels all of them with one predict call
+# returns a df of flight_id, time_min and activity, ready for the flight_activities table
+def predict_activities(flight_dfs):
+  return predict_feature_activities([label_features(df) for df in flight_dfs])
+
+# takes in a list of label_features dfs, built wherever the telemetry was (the ingest workers build them),
+# and labels all of them with one predict call. returns the same df as predict_activities
+def predict_feature_activities(features_list):
+  features = pd.concat(features_list, ignore_index=True)
+  if features.empty:
+    return pd.DataFrame({'flight_id': pd.Series(dtype=int), 'time_min': pd.Series(dtype=float),
+                         'activity': pd.Series(dtype=object)})
+  predictions = get_label_model().predict(features[LABEL_FEATURES])
+  activities = pd.Series(ACTIVITY_LABELS, dtype=object).to_numpy()[pd.Series(predictions).astype(int).to_numpy()]
+  return pd.DataFrame({'flight_id': features['flight_id'].astype(int).to_numpy(),
+                       'time_min': features['time_min'].to_numpy(),
+                       'activity': activities})
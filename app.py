@@ -21,54 +21,14 @@ from model_querying import Model
 from pathlib import Path
 import asyncio
 from math import ceil, floor
+import telemetry_schema
 
-# List of custom aggregate variables
-custom_aggregate_variables_dict = {
-    "Flight ID": ["flight_id"], 
-    "Time (min)": ["time_min"], 
-    "Current (Amp)": ["bat_1_current", "bat_2_current"], 
-    "Voltage (Volts)": ["bat_1_voltage", "bat_2_voltage"], 
-    "State-of-Charge (Percent)": ["bat_1_soc", "bat_2_soc"], 
-    "State-of-Health (Percent)": ["bat_1_soh", "bat_2_soh"], 
-    "Motor Power (KW)": ["motor_power"], "Ground Speed (Knots)": ["ground_speed"], "Pressure Altitude (Meters)": ["pressure_alt"],
-    "Average Cell Temperature (°C)": ["bat_1_avg_cell_temp", "bat_2_avg_cell_temp"], 
-    "Minimum Cell Temperature (°C)": ["bat_1_min_cell_temp", "bat_2_min_cell_temp"], 
-    "Maximum Cell Temperature (°C)": ["bat_1_max_cell_temp", "bat_2_max_cell_temp"], 
-    "Minimum Cell Volt (Volts)": ["bat_1_min_cell_volt", "bat_2_min_cell_volt"], 
-    "Maximum Cell Volt (Volts)": ["bat_1_max_cell_volt", "bat_2_max_cell_volt"], 
-    "Inverter Cooling Temperature (°C)": ["inverter_cooling_temp_1", "inverter_cooling_temp_1"], 
-    "Motor RPM (rpm)": ["motor_rpm"], "Motor Temperature (°C)": ["motor_temp"], 
-    "Requested Torque (Nm)": ["requested_torque"], "Indicated Air Speed (Knots)": ["ias"], 
-    "Latitude (Degrees)": ["lat"], "Longitude (Degrees)": ["lng"],
-    'Stall Warn Active (0/1)': ["stall_warn_active"], 'Inverter Temp (°C)': ["inverter_temp"],
-    'Bat 1 Cooling Temp (°C)': ["bat_1_cooling_temp"], 'Remaining Flight Time': ["remaining_flight_time"],
-    'Pitch (Degrees)': ["pitch"], 'Roll (Degrees)': ["roll"], 'Heading (Degrees)': ["heading"],
-    'Stall Diff Pressure (Pa)': ["stall_diff_pressure"], 'QNG (hPa)': ["qng"], 
-    'Outside Air Temperature (°C)': ["oat"], 'ISO Leakage Current': ["iso_leakage_current"]
-}
+# List of custom aggregate variables, generated from the telemetry schema
+custom_aggregate_variables_dict = telemetry_schema.aggregate_choices()
 custom_aggregate_variables = list(custom_aggregate_variables_dict.keys())
 
-# List of custom granular variables
-custom_granular_variables_dict = {"Flight ID": ["flight_id"], "Time (Min)": ["time_min"],
-                        'Bat 1 Current (amp)': ["bat_1_current"], 'Bat 2 Current (amp)': ["bat_2_current"], 
-                        'Bat 1 Voltage (volts)': ["bat_1_voltage"], 'Bat 2 Voltage (volts)': ["bat_2_voltage"],
-                        'Bat 1 SOC (Percent)': ["bat_1_soc"], 'Bat 2 SOC (Percent)': ["bat_2_soc"], 'Bat 1 SOH (Percent)': ["bat_1_soh"], 'Bat 2 SOH (Percent)': ["bat_2_soh"], 
-                        'Bat 1 Min Cell Temp (°C)': ["bat_1_min_cell_temp"], 'Bat 2 Min Cell Temp (°C)': ["bat_2_min_cell_temp"], 
-                        'Bat 1 Max Cell Temp (°C)': ["bat_1_max_cell_temp"], 'Bat 2 Max Cell Temp (°C)': ["bat_2_max_cell_temp"], 
-                        'Bat 1 Avg Cell Temp (°C)': ["bat_1_avg_cell_temp"], 'Bat 2 Avg Cell Temp (°C)': ["bat_2_avg_cell_temp"], 
-                        'Bat 1 Min Cell Volt (volts)': ["bat_1_min_cell_volt"], 'Bat 2 Min Cell Volt (volts)': ["bat_2_min_cell_volt"], 
-                        'Bat 1 Max Cell Volt (volts)': ["bat_1_max_cell_volt"], 'Bat 2 Max Cell Volt (volts)': ["bat_2_max_cell_volt"], 
-                        'Requested Torque (Nm)': ["requested_torque"], 'Indicated Air Speed (knots)': ["ias"],
-                        'Motor RPM (rpm)': ["motor_rpm"], 'Motor Power (KW)': ["motor_power"], 'Motor Temp (°C)': ["motor_temp"], 
-                        'Stall Warn Active (0/1)': ["stall_warn_active"], 'Inverter Temp (°C)': ["inverter_temp"], 'Bat 1 Cooling Temp (°C)': ["bat_1_cooling_temp"],
-                        'Inverter Cooling Temp 1 (°C)': ["inverter_cooling_temp_1"], 'Inverter Cooling Temp 2 (°C)': ["inverter_cooling_temp_2"], 
-                        'Remaining Flight Time': ["remaining_flight_time"], 'Pressure Altitude (m)': ["pressure_alt"], 
-                        'Latitude (Degrees)': ["lat"], 'Longitude (Degrees)': ["lng"], 
-                        'Ground Speed (knots)': ["ground_speed"], 'Time Stamp (Seconds)': ["time_stamp"],
-                        'Pitch (Degrees)': ["pitch"], 'Roll (Degrees)': ["roll"], 'Heading (Degrees)': ["heading"], 
-                        'Stall Diff Pressure (Pa)': ["stall_diff_pressure"], 'QNG (hPa)': ["qng"], 
-                        'Outside Air Temperature (°C)': ["oat"], 'ISO Leakage Current': ["iso_leakage_current"]
-}
+# List of custom granular variables, generated from the telemetry schema
+custom_granular_variables_dict = telemetry_schema.granular_choices()
 custom_granular_variables = list(custom_granular_variables_dict.keys())
 
 # List of custom granular variables
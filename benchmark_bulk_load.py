@@ -0,0 +1,44 @@
+# compares DataFrame.to_sql against the COPY bulk loader on a scratch table
+# run: python benchmark_bulk_load.py [--rows 50000]  (uses TEST_DATABASE_URL, falls back to DATABASE_URL)
+import argparse
+import os
+import time
+import psycopg2
+from dotenv import load_dotenv
+from sqlalchemy import create_engine
+from bulk_load import copy_dataframe
+from benchmark_resampling import synthetic_flight
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--rows", type=int, default=50000)
+  args = parser.parse_args()
+
+  load_dotenv()
+  connection_string = os.getenv('TEST_DATABASE_URL') or os.getenv('DATABASE_URL')
+  df = synthetic_flight(hours=args.rows / 3600, hz=1)
+  table = "bulk_load_benchmark"
+
+  conn = psycopg2.connect(connection_string)
+  cursor = conn.cursor()
+  cursor.execute(f"DROP TABLE IF EXISTS {table}")
+  conn.commit()
+
+  engine = create_engine("postgresql+psycopg2" + connection_string[8:])
+  start = time.perf_counter()
+  df.to_sql(table, engine, if_exists="fail", index=False)
+  to_sql_seconds = time.perf_counter() - start
+  engine.dispose()
+  print(f"to_sql: {len(df) / to_sql_seconds:.0f} rows/sec")
+
+  cursor.execute(f"DROP TABLE {table}")
+  conn.commit()
+  start = time.perf_counter()
+  copy_dataframe(df, table, conn, if_exists="fail")
+  copy_seconds = time.perf_counter() - start
+  print(f"COPY:   {len(df) / copy_seconds:.0f} rows/sec ({to_sql_seconds / copy_seconds:.1f}x)")
+
+  cursor.execute(f"DROP TABLE {table}")
+  conn.commit()
+  cursor.close()
+  conn.close()
@@ -0,0 +1,63 @@
+# benchmarks reading a flight export zip: extract + read_csv + transform_overview_data against
+# read_flight_zip, which streams the csv out of the zip and only parses the declared telemetry columns
+# run: python benchmark_flight_reader.py [--hours 3] [--hz 5]
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+import numpy as np
+import pandas as pd
+from transformation import transform_overview_data
+from ingest_pipeline import read_flight_zip
+import telemetry_schema
+from test_transformation import sample_flight_data
+
+# writes a synthetic export zip with every overview column, headers with a leading space like the real exports
+def synthetic_export(directory, hours, hz):
+  rng = np.random.default_rng(42)
+  num_rows = int(hours * 3600 * hz)
+  columns = [" " + col for col in sample_flight_data().columns]
+  df = pd.DataFrame(rng.normal(size=(num_rows, len(columns))).round(3), columns=columns)
+  df[columns[1]] = np.arange(num_rows) / (60 * hz)
+  zip_path = os.path.join(directory, "1.zip")
+  with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zip:
+    zip.writestr("1.csv", df.to_csv(index=False))
+  return zip_path
+
+# the old scraper path: extract to disk, parse every column, then drop the unused ones
+def legacy_read(zip_path, directory):
+  extract_dir = os.path.join(directory, "extract")
+  with zipfile.ZipFile(zip_path, 'r') as zip:
+    zip.extractall(extract_dir)
+  df = transform_overview_data(pd.read_csv(os.path.join(extract_dir, "1.csv")))
+  shutil.rmtree(extract_dir)
+  return df
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--hours", type=float, default=3)
+  parser.add_argument("--hz", type=float, default=5)
+  args = parser.parse_args()
+
+  with tempfile.TemporaryDirectory() as directory:
+    zip_path = synthetic_export(directory, args.hours, args.hz)
+    print(f"synthetic export: {args.hours} h at {args.hz} Hz, {os.path.getsize(zip_path) / 1e6:.1f} MB zipped")
+
+    start = time.perf_counter()
+    legacy_df = legacy_read(zip_path, directory)
+    legacy_seconds = time.perf_counter() - start
+    print(f"extract + read_csv + transform: {legacy_seconds:.3f} s")
+
+    start = time.perf_counter()
+    streamed_df = read_flight_zip(zip_path)
+    streamed_seconds = time.perf_counter() - start
+    print(f"read_flight_zip:                {streamed_seconds:.3f} s, {len(streamed_df.columns)} columns")
+    print(f"speedup:                        {legacy_seconds / streamed_seconds:.1f}x")
+    legacy_df = legacy_df.rename(columns=telemetry_schema.source_names())
+    legacy_df = legacy_df.astype({col: dtype for col, dtype in telemetry_schema.storage_dtypes().items() if col in legacy_df})
+    pd.testing.assert_frame_equal(streamed_df, legacy_df)
+    print(f"in memory: {streamed_df.memory_usage().sum() / 1e6:.1f} MB with the declared dtypes, "
+          f"{streamed_df.astype(float).memory_usage().sum() / 1e6:.1f} MB as float64")
+    print("outputs match")
@@ -0,0 +1,60 @@
+# benchmarks the vectorized resampler against the old row-by-row downsampling loop
+# run: python benchmark_resampling.py [--hours 3] [--hz 5]
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from resampling import resample_flight_data
+
+# the row-by-row downsampling loop the flight loader used before the resampler
+def legacy_downsample(df, flight_id):
+  max_time = df["time_min"].to_numpy().max()
+  initial_time = 0
+  time_index = 0.02
+  end_time = 0
+  downsampled_df = pd.DataFrame(columns=df.columns)
+  while end_time <= max_time:
+    end_time = end_time + time_index
+    downsampled_data = df[(df["time_min"] >= initial_time) & (df["time_min"] < end_time)].mean(skipna=True).to_dict()
+    downsampled_data["time_min"] = initial_time
+    downsampled_data["flight_id"] = int(flight_id)
+    downsampled_df.loc[len(downsampled_df)] = downsampled_data
+    initial_time = initial_time + time_index
+  return downsampled_df
+
+# builds a synthetic flight with the same 42 telemetry columns the flight loader stores
+def synthetic_flight(hours, hz, columns=42):
+  rng = np.random.default_rng(42)
+  num_rows = int(hours * 3600 * hz)
+  times = np.arange(num_rows) / (60 * hz) + rng.uniform(0, 0.001, num_rows)
+  data = {"time_min": times}
+  for i in range(columns - 1):
+    data[f"column_{i}"] = rng.normal(size=num_rows)
+  df = pd.DataFrame(data)
+  df.insert(0, "flight_id", 1)
+  return df
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--hours", type=float, default=3)
+  parser.add_argument("--hz", type=float, default=5)
+  parser.add_argument("--skip-legacy", action="store_true", help="only time the vectorized resampler")
+  args = parser.parse_args()
+
+  df = synthetic_flight(args.hours, args.hz)
+  print(f"synthetic flight: {args.hours} h at {args.hz} Hz, {len(df)} rows x {len(df.columns)} columns")
+
+  start = time.perf_counter()
+  resampled_df = resample_flight_data(df, 1)
+  vectorized_seconds = time.perf_counter() - start
+  print(f"vectorized resampler: {vectorized_seconds:.3f} s, {len(resampled_df)} buckets")
+
+  if not args.skip_legacy:
+    start = time.perf_counter()
+    legacy_df = legacy_downsample(df, 1)
+    legacy_seconds = time.perf_counter() - start
+    print(f"legacy loop:          {legacy_seconds:.3f} s, {len(legacy_df)} buckets")
+    print(f"speedup:              {legacy_seconds / vectorized_seconds:.0f}x")
+    legacy_df = legacy_df.astype({"flight_id": "int64"}).astype({col: float for col in df.columns[1:]})
+    pd.testing.assert_frame_equal(resampled_df, legacy_df, check_exact=False, rtol=1e-12)
+    print("outputs match")
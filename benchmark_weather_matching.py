@@ -0,0 +1,28 @@
+# benchmarks matching weather to flights on a multi-year archive
+# run: python benchmark_weather_matching.py [--years 3] [--flights 300]
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from weather_matching import match_weather_to_flights
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--years", type=float, default=3)
+  parser.add_argument("--flights", type=int, default=300)
+  args = parser.parse_args()
+
+  # 5 minute observations, as the transformation leaves them: date and time objects
+  observed = pd.date_range("2021-01-01", periods=int(args.years * 365 * 24 * 12), freq="5min")
+  weather_df = pd.DataFrame({"weather_date": observed.date, "weather_time_utc": observed.time,
+                             "temperature": np.random.default_rng(0).normal(10, 8, len(observed))})
+
+  rng = np.random.default_rng(1)
+  flights_df = pd.DataFrame({"flight_id": np.arange(args.flights),
+                             "start": observed[0] + pd.to_timedelta(rng.uniform(0, args.years * 365 * 24 * 60, args.flights), unit="m"),
+                             "duration_min": rng.uniform(20, 90, args.flights)})
+
+  start = time.perf_counter()
+  matched_df = match_weather_to_flights(flights_df, weather_df)
+  seconds = time.perf_counter() - start
+  print(f"{len(weather_df)} observations x {len(flights_df)} flights -> {len(matched_df)} pairs in {seconds:.3f} s")
@@ -0,0 +1,78 @@
+# benchmarks the METAR transformation on a synthetic multi-year CYKF archive:
+# the old row-by-row strptime transformation against read_weather_csv, whole and in chunks
+# run: python benchmark_weather_transformation.py [--years 3]
+import argparse
+import io
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from transformation import read_weather_csv, WEATHER_CHUNK_ROWS
+from test_transformation import sample_weather_data
+
+# builds an archive of 5-minute observations with a few missing values, like the ASOS download
+def synthetic_archive(years):
+  rng = np.random.default_rng(42)
+  valid = pd.date_range("2021-01-01", periods=int(years * 365 * 24 * 12), freq="5min")
+  row = sample_weather_data().iloc[0]
+  df = pd.DataFrame({col: np.repeat(row[col], len(valid)) for col in row.index})
+  df["valid"] = valid.strftime("%Y-%m-%d %H:%M")
+  df["tmpf"] = rng.normal(50, 20, len(valid)).round(2).astype(str)
+  df["drct"] = rng.integers(0, 36, len(valid)) * 10.0
+  missing = rng.random(len(valid)) < 0.05
+  df.loc[missing, "tmpf"] = "M"
+  df.loc[missing, "drct"] = "M"
+  return df.to_csv(index=False)
+
+# the transformation before it was vectorized
+def legacy_weather_transformation(df):
+  for col in ["station", "p01i", "feel", "ice_accretion_1hr", "ice_accretion_3hr", "ice_accretion_6hr",
+              "peak_wind_gust", "peak_wind_drct", "peak_wind_time", "snowdepth"]:
+    df = df.drop(col, axis=1)
+  weather_date = []
+  weather_time_utc = []
+  for timestamp in df['valid'].tolist():
+    datetime_obj = datetime.strptime(timestamp, "%Y-%m-%d %H:%M")
+    weather_date.append(datetime_obj.date())
+    weather_time_utc.append(datetime_obj.time())
+  df["valid"] = weather_date
+  df.insert(1, "weather_time_utc", weather_time_utc)
+  df = df.set_axis(["weather_date", "weather_time_utc", "temperature", "dewpoint", "relative_humidity",
+                    "wind_direction", "wind_speed", "pressure_altimeter", "sea_level_pressure", "visibility",
+                    "wind_gust", "sky_coverage_1", "sky_coverage_2", "sky_coverage_3", "sky_coverage_4",
+                    "sky_level_1", "sky_level_2", "sky_level_3", "sky_level_4", "weather_codes", "metar"], axis="columns")
+  df.replace("M", np.nan, inplace=True)
+  for col in ["wind_direction", "wind_speed", "wind_gust", "sky_level_1", "sky_level_2", "sky_level_3", "sky_level_4"]:
+    df[col] = df[col].astype(float).round().astype(int, errors="ignore")
+  return df
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--years", type=float, default=3)
+  args = parser.parse_args()
+
+  csv_text = synthetic_archive(args.years)
+  print(f"synthetic archive: {args.years} years of 5-minute observations, {len(csv_text) / 1e6:.0f} MB")
+
+  start = time.perf_counter()
+  legacy_df = legacy_weather_transformation(pd.read_csv(io.StringIO(csv_text)))
+  legacy_seconds = time.perf_counter() - start
+  print(f"read_csv + legacy transformation: {legacy_seconds:.2f} s, {len(legacy_df)} rows")
+
+  start = time.perf_counter()
+  weather_df = read_weather_csv(io.StringIO(csv_text))
+  whole_seconds = time.perf_counter() - start
+  print(f"read_weather_csv:                 {whole_seconds:.2f} s ({legacy_seconds / whole_seconds:.1f}x)")
+
+  start = time.perf_counter()
+  largest_chunk = 0
+  for chunk in read_weather_csv(io.StringIO(csv_text), chunksize=WEATHER_CHUNK_ROWS):
+    largest_chunk = max(largest_chunk, chunk.memory_usage(deep=True).sum())
+  chunked_seconds = time.perf_counter() - start
+  print(f"read_weather_csv in chunks:       {chunked_seconds:.2f} s, at most {largest_chunk / 1e6:.0f} MB per chunk "
+        f"vs {weather_df.memory_usage(deep=True).sum() / 1e6:.0f} MB whole")
+
+  pd.testing.assert_series_equal(weather_df["temperature"], legacy_df["temperature"].astype(float))
+  pd.testing.assert_series_equal(weather_df["weather_time_utc"], legacy_df["weather_time_utc"])
+  pd.testing.assert_series_equal(weather_df["wind_direction"].astype(float), legacy_df["wind_direction"].astype(float))
+  print("outputs match")
@@ -0,0 +1,82 @@
+# loads a folder of downloaded Pipistrel flight exports (<id>.zip) without the scraper or a browser
+# run: python bulk_ingest.py <zip_dir> <metadata_csv> [--weather-csv CYKF.csv] [--workers N] [--batch-size N]
+# the metadata csv has one row per flight with the columns id, datetime (UTC), type, notes and plane.
+# flights already in the flights table are skipped and anything a crashed run left half written is cleared
+# before it is loaded again, so the same command can be re-run until everything is in
+import argparse
+import os
+import time
+import pandas as pd
+from transformation import read_weather_csv, WEATHER_CHUNK_ROWS
+from storage import ingested_flight_ids, relevant_weather, flights_awaiting_weather, refresh_flight_views, \
+  create_tables, create_views
+from ingest_pipeline import IngestPipeline, INGEST_WORKERS, INGEST_QUEUE_SIZE, INGEST_BATCH_SIZE
+from ingest_ledger import IngestLedger
+
+# reads the metadata csv into flight job dicts for the ingest pipeline
+def read_metadata(metadata_csv):
+  metadata_df = pd.read_csv(metadata_csv, dtype={"id": int, "type": str, "notes": str, "plane": str},
+                            keep_default_na=False)
+  metadata_df["datetime"] = pd.to_datetime(metadata_df["datetime"])
+  return [{'id': int(row.id), 'datetime': row.datetime.to_pydatetime(), 'notes': row.notes,
+           'flight_type': row.type, 'plane': row.plane}
+          for row in metadata_df.itertuples(index=False)]
+
+# takes in the flight jobs and the zip folder, returns the (job, zip path) pairs that still need loading
+def pending_flights(jobs, zip_dir):
+  ingested = ingested_flight_ids([job['id'] for job in jobs]) if jobs else set()
+  pending = []
+  missing = 0
+  for job in jobs:
+    if job['id'] in ingested:
+      continue
+    zip_path = os.path.join(zip_dir, f"{job['id']}.zip")
+    if not os.path.exists(zip_path):
+      print(f"No export found for flight {job['id']}, skipping it")
+      missing += 1
+      continue
+    pending.append((job, zip_path))
+  print(f"{len(jobs)} flights in the metadata: {len(ingested)} already ingested, {missing} without an export, "
+        f"{len(pending)} to load")
+  return pending
+
+def bulk_ingest(zip_dir, metadata_csv, weather_csv=None, workers=INGEST_WORKERS,
+                queue_size=INGEST_QUEUE_SIZE, batch_size=INGEST_BATCH_SIZE):
+  create_tables()
+  create_views()
+  pending = pending_flights(read_metadata(metadata_csv), zip_dir)
+
+  start = time.perf_counter()
+  pipeline = IngestPipeline(workers=workers, queue_size=queue_size, batch_size=batch_size,
+                            ledger=IngestLedger('bulk').start())
+  try:
+    for job, zip_path in pending:
+      # the exports are left where they are
+      pipeline.submit(job, zip_path, keep_zip=True)
+    loaded_flights = pipeline.drain()
+    print(f"Loaded {len(loaded_flights)} of {len(pending)} flights in {time.perf_counter() - start:.1f} s")
+
+    # link the loaded flights, and any an earlier run loaded without weather, to a METAR download covering them
+    if weather_csv:
+      flight_ids = [flight['id'] for flight in flights_awaiting_weather()]
+      if flight_ids:
+        link_start = time.perf_counter()
+        weather_chunks = read_weather_csv(weather_csv, chunksize=WEATHER_CHUNK_ROWS)
+        relevant_weather(weather_chunks, flight_ids)
+        pipeline.record_weather_link(flight_ids, time.perf_counter() - link_start)
+    refresh_flight_views()
+  finally:
+    # the ledger run closes after the weather is linked
+    pipeline.close()
+  return loaded_flights
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description="Load a folder of Pipistrel flight export zips into the database.")
+  parser.add_argument("zip_dir", help="folder holding the <id>.zip flight exports")
+  parser.add_argument("metadata_csv", help="csv with the columns id, datetime, type, notes, plane")
+  parser.add_argument("--weather-csv", help="METAR csv from the Iowa Mesonet ASOS download to link to the flights")
+  parser.add_argument("--workers", type=int, default=INGEST_WORKERS, help="worker processes")
+  parser.add_argument("--queue-size", type=int, default=INGEST_QUEUE_SIZE, help="flights waiting to be loaded")
+  parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE, help="flights per database write")
+  args = parser.parse_args()
+  bulk_ingest(args.zip_dir, args.metadata_csv, args.weather_csv, args.workers, args.queue_size, args.batch_size)
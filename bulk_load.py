@@ -0,0 +1,115 @@
+# this file has the commands to bulk load pandas dataframes into the database with COPY
+
+import io
+import pandas as pd
+from sqlalchemy import MetaData, Table, Column
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateTable
+from sqlalchemy.types import BigInteger, Integer, SmallInteger, Float, Boolean, DateTime, Date, Time, Text
+
+# written in place of missing values, so empty strings stay empty strings
+NULL_MARKER = "\\N"
+
+# quotes a table or column name the same way to_sql does, so mixed case names survive
+def quote_identifier(name):
+  return '"' + str(name).replace('"', '""') + '"'
+
+# returns the sqlalchemy type that to_sql would have picked for the given column
+def infer_column_type(series):
+  if pd.api.types.is_bool_dtype(series):
+    return Boolean()
+  if isinstance(series.dtype, pd.DatetimeTZDtype):
+    return DateTime(timezone=True)
+  if pd.api.types.is_datetime64_any_dtype(series):
+    return DateTime()
+  if pd.api.types.is_integer_dtype(series):
+    if series.dtype.itemsize <= 2:
+      return SmallInteger()
+    if series.dtype.itemsize == 4:
+      return Integer()
+    return BigInteger()
+  if pd.api.types.is_float_dtype(series):
+    return Float(precision=23) if series.dtype.itemsize == 4 else Float(precision=53)
+  # object columns are typed by what they hold
+  inferred = pd.api.types.infer_dtype(series, skipna=True)
+  if inferred in ("floating", "mixed-integer-float", "decimal"):
+    return Float(precision=53)
+  if inferred == "integer":
+    return BigInteger()
+  if inferred == "boolean":
+    return Boolean()
+  if inferred == "date":
+    return Date()
+  if inferred == "time":
+    return Time()
+  if inferred in ("datetime", "datetime64"):
+    return DateTime()
+  return Text()
+
+# builds the CREATE TABLE query for the dataframe, explicit_columns overrides the inferred types
+def create_table_query(df, table, explicit_columns=None):
+  explicit_columns = explicit_columns or {}
+  columns = [Column(str(col), explicit_columns.get(col, infer_column_type(df[col]))) for col in df.columns]
+  create_table = CreateTable(Table(table, MetaData(), *columns))
+  return str(create_table.compile(dialect=postgresql.psycopg2.dialect()))
+
+# this function checks if the given table exists, using the caller's cursor
+def _table_exists(cursor, table):
+  cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (quote_identifier(table),))
+  return cursor.fetchone()[0]
+
+# COPY does not cast like INSERT does, so float values headed for integer columns are rounded first
+def _match_integer_columns(df, cursor, table):
+  cursor.execute("""
+      SELECT column_name
+      FROM information_schema.columns
+      WHERE table_name = %s AND data_type IN ('smallint', 'integer', 'bigint');
+  """, (table,))
+  integer_columns = [row[0] for row in cursor.fetchall()]
+  to_round = [col for col in df.columns if col in integer_columns and not pd.api.types.is_integer_dtype(df[col])]
+  if not to_round:
+    return df
+  df = df.copy()
+  for col in to_round:
+    df[col] = pd.to_numeric(df[col]).round().astype("Int64")
+  return df
+
+# writes the dataframe as csv into an in-memory buffer for COPY
+def _csv_buffer(df):
+  buffer = io.StringIO()
+  df.to_csv(buffer, index=False, header=False, na_rep=NULL_MARKER)
+  buffer.seek(0)
+  return buffer
+
+# streams the dataframe into the given table with COPY ... FROM STDIN
+# if_exists="append" creates the table when it is missing, if_exists="fail" raises if it already exists
+# if commit is False the caller owns the transaction and rolls it back on an error, otherwise the load is
+# committed or rolled back here
+def copy_dataframe(df, table, conn, if_exists="append", explicit_columns=None, commit=True):
+  if if_exists not in ("append", "fail"):
+    raise ValueError(f"if_exists must be 'append' or 'fail', got '{if_exists}'")
+
+  cursor = conn.cursor()
+  try:
+    exists = _table_exists(cursor, table)
+    if exists and if_exists == "fail":
+      raise ValueError(f"Table '{table}' already exists.")
+    if not exists:
+      cursor.execute(create_table_query(df, table, explicit_columns))
+    else:
+      df = _match_integer_columns(df, cursor, table)
+
+    if not df.empty:
+      column_list = ", ".join(quote_identifier(col) for col in df.columns)
+      copy_query = f"COPY {quote_identifier(table)} ({column_list}) FROM STDIN WITH (FORMAT csv, NULL '{NULL_MARKER}')"
+      cursor.copy_expert(copy_query, _csv_buffer(df))
+
+    if commit:
+      conn.commit()
+  except Exception:
+    if commit:
+      conn.rollback()
+    raise
+  finally:
+    cursor.close()
+  return len(df)
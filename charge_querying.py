@@ -1,26 +1,19 @@
-from dotenv import load_dotenv
-from sqlalchemy import create_engine
+from database import get_engine
 import pandas as pd
 import os
 from datetime import datetime
 from dateutil.relativedelta import relativedelta
+from storage import telemetry_source
 
 class Charge:
 
     # Database Connection Function ---------------------------------------------------------------------------------------------------------
     def __connect(self):
         """
-        The function initiates a connection with the PostgreSQL database using the DATABASE_URL.
+        The function returns the process-wide engine for the PostgreSQL database, see database.py.
         """
-        # Load .env file
-        load_dotenv()
-
-        # Connect to Database
-        engine_string = "postgresql+psycopg2" + os.getenv('DATABASE_URL')[8:]
-        
-        engine = create_engine(engine_string)
-
-        return engine
+        # Borrow the shared engine, its pool keeps the connections open between queries
+        return get_engine()
     
 
     # Get charges Function -----------------------------------------------------------------------------------------------------------------
@@ -42,9 +35,6 @@ class Charge:
         # Select the data based on the query
         charge_data = pd.read_sql_query(query, engine)
 
-        # Dispose of the connection, so we don't overuse it.
-        engine.dispose()
-
         return charge_data
 
 
@@ -63,9 +53,6 @@ class Charge:
         # Select the data based on the query
         charge_data = pd.read_sql_query(query, engine)
 
-        # Dispose of the connection, so we don't overuse it.
-        engine.dispose()
-
         return charge_data
 
     # Get Flight Data Function ------------------------------------------------------------------------------------------------------------
@@ -78,14 +65,11 @@ class Charge:
         str_column = "".join([f"{column}, " for column in columns])[:-2]
 
         # Make query
-        query = f"SELECT {str_column} FROM flightdata_{str(id)}"
+        query = f"SELECT {str_column} FROM {telemetry_source(id)}"
 
         # Select the data based on the query
         charge_data = pd.read_sql_query(query, engine)
 
-        # Dispose of the connection, so we don't overuse it.
-        engine.dispose()
-
         return charge_data
 
     
@@ -0,0 +1,39 @@
+# collapses the duplicate weather rows written before weather was keyed by (station, weather_date, weather_time_utc)
+# run once: python compact_weather.py
+# every flight_weather link is pointed at the oldest copy of its observation, then the other copies are deleted
+# and the unique keys that relevant_weather's upsert relies on are created. it all runs in one transaction
+import queries
+from storage import db_connect, db_disconnect
+
+# returns the number of rows in the given table
+def count_rows(cursor, table):
+  cursor.execute(f"SELECT COUNT(*) FROM {table}")
+  return cursor.fetchone()[0]
+
+def compact():
+  conn = db_connect()
+  cursor = conn.cursor()
+  try:
+    weather_before = count_rows(cursor, "weather")
+    links_before = count_rows(cursor, "flight_weather")
+
+    cursor.execute(queries.ADD_WEATHER_STATION)
+    cursor.execute(queries.REPOINT_DUPLICATE_WEATHER)
+    print(f"Repointed {cursor.rowcount} flight_weather links")
+    cursor.execute(queries.DELETE_DUPLICATE_FLIGHT_WEATHER)
+    cursor.execute(queries.DELETE_DUPLICATE_WEATHER)
+    cursor.execute(queries.CREATE_WEATHER_KEYS)
+    conn.commit()
+
+    print(f"weather: {weather_before} -> {count_rows(cursor, 'weather')} rows")
+    print(f"flight_weather: {links_before} -> {count_rows(cursor, 'flight_weather')} rows")
+  except Exception:
+    conn.rollback()
+    raise
+  finally:
+    cursor.close()
+    db_disconnect(conn)
+
+if __name__ == '__main__':
+  compact()
+  print("Compaction done.")
@@ -0,0 +1,68 @@
+# this file owns the process-wide database connection pool
+# storage.py, the querying classes and the scraper all borrow their connections from here
+
+import os
+import threading
+import time
+from dotenv import load_dotenv
+from sqlalchemy import create_engine
+from sqlalchemy.pool import QueuePool
+
+# Load .env file once for the whole process
+load_dotenv()
+
+# pool bounds, overridable from .env
+POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 30))
+
+# a QueuePool that counts checkouts and measures how long callers wait for a connection
+class MeteredQueuePool(QueuePool):
+  def __init__(self, *args, **kwargs):
+    super().__init__(*args, **kwargs)
+    self._metrics_lock = threading.Lock()
+    self.checkouts = 0
+    self.total_wait = 0.0
+    self.max_wait = 0.0
+
+  def _do_get(self):
+    start = time.perf_counter()
+    try:
+      return super()._do_get()
+    finally:
+      waited = time.perf_counter() - start
+      with self._metrics_lock:
+        self.checkouts += 1
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+
+_engine = None
+_engine_lock = threading.Lock()
+
+# returns the shared sqlalchemy engine, creating it on first use
+# never call dispose() on it, that would close every pooled connection in the process
+def get_engine():
+  global _engine
+  with _engine_lock:
+    if _engine is None:
+      engine_string = "postgresql+psycopg2" + os.getenv('DATABASE_URL')[8:]
+      _engine = create_engine(engine_string, poolclass=MeteredQueuePool, pool_size=POOL_SIZE,
+                              max_overflow=0, pool_timeout=POOL_TIMEOUT, pool_pre_ping=True)
+  return _engine
+
+# returns a raw psycopg2 connection from the pool, calling close() on it hands it back to the pool
+def get_connection():
+  return get_engine().raw_connection()
+
+# returns the pool size, usage and wait time metrics
+def pool_stats():
+  pool = get_engine().pool
+  checkouts = pool.checkouts
+  return {
+    "pool_size": pool.size(),
+    "checked_out": pool.checkedout(),
+    "idle": pool.checkedin(),
+    "checkouts": checkouts,
+    "total_wait_seconds": pool.total_wait,
+    "avg_wait_seconds": pool.total_wait / checkouts if checkouts else 0.0,
+    "max_wait_seconds": pool.max_wait,
+  }
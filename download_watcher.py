@@ -0,0 +1,157 @@
+# this file watches the browser's download directory and tells the scraper when a download has finished.
+# Chrome writes a download to <name>.crdownload and renames it to <name> once it is complete, so a file is
+# finished when it is moved into place (or closed after writing, for files written directly). on Linux the
+# watcher blocks on inotify events, elsewhere it falls back to listing the directory every WATCH_POLL_INTERVAL.
+# every expected file gets a future that resolves to its path, or fails with TimeoutError at its deadline,
+# so any number of downloads can be in flight and each one is waited on only as long as it takes
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import Future
+
+# seconds a download may take, and the fallback directory listing interval, overridable from .env
+DOWNLOAD_TIMEOUT = float(os.getenv('DOWNLOAD_TIMEOUT', 25))
+WATCH_POLL_INTERVAL = float(os.getenv('WATCH_POLL_INTERVAL', 0.05))
+
+# inotify event masks (sys/inotify.h) and the fixed part of an inotify_event: wd, mask, cookie, len
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_EVENT_HEADER = struct.Struct("iIII")
+
+# returns an inotify file descriptor watching the directory for finished files, or None without inotify
+def _inotify_watch(directory):
+  if not sys.platform.startswith("linux"):
+    return None
+  try:
+    libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+    if fd < 0:
+      return None
+    if libc.inotify_add_watch(fd, os.fsencode(directory), IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+      os.close(fd)
+      return None
+    return fd
+  except (OSError, AttributeError):
+    return None
+
+# takes in a buffer read from an inotify descriptor, returns the file names in it
+def _event_names(buffer):
+  names = []
+  offset = 0
+  while offset + _EVENT_HEADER.size <= len(buffer):
+    _, _, _, name_length = _EVENT_HEADER.unpack_from(buffer, offset)
+    offset += _EVENT_HEADER.size
+    names.append(buffer[offset:offset + name_length].rstrip(b"\0").decode(errors="replace"))
+    offset += name_length
+  return names
+
+class DownloadWatcher:
+  def __init__(self, directory, poll_interval=WATCH_POLL_INTERVAL, use_inotify=True):
+    self.directory = directory
+    self.poll_interval = poll_interval
+    os.makedirs(directory, exist_ok=True)
+    # file name -> (future, deadline)
+    self._expected = {}
+    self._lock = threading.Lock()
+    self._closed = False
+    self._inotify_fd = _inotify_watch(directory) if use_inotify else None
+    # expect() and close() wake the watcher thread, through a pipe next to the inotify descriptor
+    # or through an event when listing the directory (select only takes sockets on Windows)
+    self._wake = threading.Event()
+    self._wake_read, self._wake_write = os.pipe() if self.event_driven else (None, None)
+    self._thread = threading.Thread(target=self._watch, name="download-watcher", daemon=True)
+    self._thread.start()
+
+  # checks if the watcher is driven by inotify events rather than directory listings
+  @property
+  def event_driven(self):
+    return self._inotify_fd is not None
+
+  # returns a future for the file name in the download directory. it resolves to the file's path once the
+  # file is in place, or fails with TimeoutError after timeout seconds. call it before starting the download
+  def expect(self, file_name, timeout=DOWNLOAD_TIMEOUT):
+    future = Future()
+    with self._lock:
+      if self._closed:
+        raise RuntimeError("the download watcher is closed")
+      self._expected[file_name] = (future, time.monotonic() + timeout)
+    # the file may have been finished before it was expected
+    self._resolve([file_name])
+    self._notify()
+    return future
+
+  def _notify(self):
+    if self.event_driven:
+      os.write(self._wake_write, b"\0")
+    else:
+      self._wake.set()
+
+  # resolves the futures of the given finished file names
+  def _resolve(self, names):
+    finished = []
+    with self._lock:
+      for name in names:
+        if name in self._expected and os.path.exists(os.path.join(self.directory, name)):
+          finished.append((self._expected.pop(name)[0], os.path.join(self.directory, name)))
+    for future, path in finished:
+      future.set_result(path)
+
+  # fails the futures whose deadline has passed and returns the seconds until the next deadline
+  def _expire(self):
+    now = time.monotonic()
+    expired = []
+    with self._lock:
+      for name, (future, deadline) in list(self._expected.items()):
+        if deadline <= now:
+          expired.append((name, self._expected.pop(name)[0]))
+      next_deadline = min((deadline for _, deadline in self._expected.values()), default=None)
+    for name, future in expired:
+      future.set_exception(TimeoutError(f"{name} did not finish downloading in time"))
+    return None if next_deadline is None else max(0.0, next_deadline - now)
+
+  def _watch(self):
+    while True:
+      until_deadline = self._expire()
+      with self._lock:
+        if self._closed:
+          return
+        waiting = bool(self._expected)
+      if self.event_driven:
+        ready, _, _ = select.select([self._inotify_fd, self._wake_read], [], [], until_deadline)
+        if self._wake_read in ready:
+          os.read(self._wake_read, 4096)
+        if self._inotify_fd in ready:
+          try:
+            self._resolve(_event_names(os.read(self._inotify_fd, 65536)))
+          except BlockingIOError:
+            pass
+      else:
+        # without inotify the directory is listed while anything is expected
+        self._wake.wait(min(until_deadline, self.poll_interval) if waiting else None)
+        self._wake.clear()
+        with self._lock:
+          names = list(self._expected)
+        self._resolve(names)
+
+  # stops the watcher, futures still waiting fail with TimeoutError
+  def close(self):
+    with self._lock:
+      if self._closed:
+        return
+      self._closed = True
+      waiting = [future for future, _ in self._expected.values()]
+      self._expected = {}
+    self._notify()
+    self._thread.join()
+    for future in waiting:
+      future.set_exception(TimeoutError("the download watcher was closed"))
+    for fd in (self._inotify_fd, self._wake_read, self._wake_write):
+      if fd is not None:
+        os.close(fd)
@@ -1,28 +1,197 @@
-from dotenv import load_dotenv
-from sqlalchemy import create_engine
+from database import get_engine
 import pandas as pd
 import numpy as np
 import os
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
 from dateutil.relativedelta import relativedelta
-from storage import execute, select
+from storage import execute, select, telemetry_source, telemetry_batch_query, partitioned_telemetry, db_connect, db_disconnect
+import queries
+
+# Telemetry cache bounds, overridable from .env
+TELEMETRY_CACHE_MB = float(os.getenv('TELEMETRY_CACHE_MB', 256))
+TELEMETRY_CACHE_CHECK_SECONDS = float(os.getenv('TELEMETRY_CACHE_CHECK_SECONDS', 10))
+
+# Function -------------------------------------------------------------------------------------------------------------------------------
+def read_cache_stamps():
+    """
+    Function that returns the last scraper runtime and a dictionary of flight id: label version, the two things the telemetry
+    cache is checked against.
+    """
+    conn = db_connect()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(queries.SELECT_LAST_SCRAPER_RUN)
+        last_run = cursor.fetchone()[0]
+        cursor.execute(queries.SELECT_LABEL_VERSIONS)
+        return last_run, {flight_id: version for flight_id, version in cursor.fetchall()}
+    finally:
+        cursor.close()
+        db_disconnect(conn)
+
+
+class TelemetryCache:
+    """
+    In-process cache of flight telemetry columns (flight_id, column) -> numpy array, evicting the least recently used
+    columns once their arrays take up more than max_bytes.
+
+    Ingested telemetry does not change, so a flight's columns are kept until a new scraper run shows up in scraper_last_run
+    (everything is dropped) or the flight's label version changes (the flight is dropped). Both are checked at most every
+    check_seconds, so a flight viewed again in between costs no query at all. hits, misses, evictions and invalidations
+    count what the cache did, see stats().
+    """
+
+    def __init__(self, max_bytes, check_seconds=TELEMETRY_CACHE_CHECK_SECONDS, read_stamps=read_cache_stamps):
+        self.max_bytes = max_bytes
+        self.check_seconds = check_seconds
+        self.read_stamps = read_stamps
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._lock = threading.RLock()
+        self._checked_at = None
+        self._last_run = None
+        self._label_versions = {}
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "invalidations": self.invalidations,
+                    "entries": len(self.entries), "bytes": self.bytes}
+
+    def clear(self):
+        with self._lock:
+            if self.entries:
+                self.invalidations += 1
+            self.entries.clear()
+            self.bytes = 0
+
+    def invalidate_flight(self, flight_id):
+        with self._lock:
+            keys = [key for key in self.entries if key[0] == int(flight_id)]
+            for key in keys:
+                self.bytes -= self.entries.pop(key).nbytes
+            if keys:
+                self.invalidations += 1
+
+    def validate(self):
+        """
+        Function that drops what a new scraper run or a label change made stale, at most every check_seconds.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._checked_at is not None and now - self._checked_at < self.check_seconds:
+                return
+            first_check = self._checked_at is None
+            self._checked_at = now
+            try:
+                last_run, label_versions = self.read_stamps()
+            except Exception as e:
+                # Without the stamps nothing cached can be trusted
+                print(f"Could not check the telemetry cache: {e}")
+                self.clear()
+                self._checked_at = None
+                return
+            if not first_check and last_run != self._last_run:
+                self.clear()
+            elif not first_check:
+                # a version only moves when its change commits, however late that is
+                for flight_id, version in label_versions.items():
+                    if self._label_versions.get(flight_id) != version:
+                        self.invalidate_flight(flight_id)
+            self._last_run = last_run
+            self._label_versions = label_versions
+
+    def get(self, flight_id, columns):
+        """
+        Function that returns a dictionary of column: numpy array for the flight, or None unless every column is cached.
+        """
+        self.validate()
+        with self._lock:
+            keys = [(int(flight_id), column) for column in columns]
+            if not all(key in self.entries for key in keys):
+                self.misses += 1
+                return None
+            self.hits += 1
+            for key in keys:
+                self.entries.move_to_end(key)
+            return {column: self.entries[key] for column, key in zip(columns, keys)}
+
+    def put(self, flight_id, column_arrays):
+        """
+        Function that caches the flight's columns (a dictionary of column: numpy array), read-only so no caller can change them.
+        """
+        with self._lock:
+            for column, array in column_arrays.items():
+                key = (int(flight_id), column)
+                if key in self.entries:
+                    self.bytes -= self.entries.pop(key).nbytes
+                array = np.array(array)
+                array.flags.writeable = False
+                # A column larger than the whole cache is not kept
+                if array.nbytes > self.max_bytes:
+                    continue
+                self.entries[key] = array
+                self.bytes += array.nbytes
+            while self.bytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.bytes -= evicted.nbytes
+                self.evictions += 1
+
+
+# Shared by every query_flights object of the process
+telemetry_cache = TelemetryCache(int(TELEMETRY_CACHE_MB * 2 ** 20))
+
+# The materialized copies of the views the scraper keeps up to date, see storage.refresh_flight_views
+MATERIALIZED_VIEWS = {"flight_weather_data_view": "flight_weather_data_mat", "labeled_activities_view": "labeled_activities_mat"}
+_materialized_tables = set()
+
+# Function -------------------------------------------------------------------------------------------------------------------------------
+def materialized(table: str):
+    """
+    Function that checks if the scraper has created the given materialized table yet. Once it has, it is not checked again.
+    """
+    if table not in _materialized_tables:
+        conn = db_connect()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (table,))
+            if cursor.fetchone()[0]:
+                _materialized_tables.add(table)
+        finally:
+            cursor.close()
+            db_disconnect(conn)
+    return table in _materialized_tables
+
+def view_source(view: str):
+    """
+    Function that returns what to select the view's rows from: its materialized copy once the scraper has created it (aliased to
+    the view's name, so the queries read the same), the view itself until then.
+    """
+    table = MATERIALIZED_VIEWS[view]
+    return f"{table} AS {view}" if materialized(table) else view
+
+def soc_rate_of_change(times, soc):
+    """
+    Function that returns the SOC rate of change between each 30 second bucket and the next. The rate of change for the last entry
+    is set to 0 since there is no next entry to compare with.
+    """
+    return np.append((soc[1:] - soc[:-1]) / (times[1:] - times[:-1]), 0)
+
 
 class query_flights:
 
     # Database Connection Function ---------------------------------------------------------------------------------------------------------
     def __connect(self):
         """
-        The function initiates a connection with the PostgreSQL database using the DATABASE_URL.
+        The function returns the process-wide engine for the PostgreSQL database, see database.py.
         """
-        # Load .env file
-        load_dotenv()
-
-        # Connect to Database
-        engine_string = "postgresql+psycopg2" + os.getenv('DATABASE_URL')[8:]
-        
-        engine = create_engine(engine_string)
-
-        return engine
+        # Borrow the shared engine, its pool keeps the connections open between queries
+        return get_engine()
     
 
     # Get Flights Function -----------------------------------------------------------------------------------------------------------------
@@ -45,9 +214,6 @@ class query_flights:
         # Select the data based on the query
         flights = pd.read_sql_query(query, engine)
 
-        # Dispose of the connection, so we don't overuse it.
-        engine.dispose()
-
         return flights
     
 
@@ -66,15 +232,17 @@ class query_flights:
         # Select the data based on the query
         flights = pd.read_sql_query(query, engine)
 
-        # Dispose of the connection, so we don't overuse it.
-        engine.dispose()
-
         return flights
     
 
     # Get Flight Data Function ------------------------------------------------------------------------------------------------------------
     def get_flight_data_on_id(self, columns: list, id: int):
 
+        # A flight viewed before is served from the telemetry cache
+        cached = telemetry_cache.get(id, columns)
+        if cached is not None:
+            return pd.DataFrame(cached)
+
         # Make database connection
         engine = self.__connect()
 
@@ -82,40 +250,124 @@ class query_flights:
         str_column = "".join([f"{column}, " for column in columns])[:-2]
 
         # Make query
-        query = f"SELECT {str_column} FROM flightdata_{str(id)}"
+        query = f"SELECT {str_column} FROM {telemetry_source(id)}"
 
         # Select the data based on the query
         flight_data = pd.read_sql_query(query, engine)
-
-        # Dispose of the connection, so we don't overuse it.
-        engine.dispose()
+        telemetry_cache.put(id, {column: flight_data[column].to_numpy() for column in flight_data.columns})
 
         return flight_data
     
+    # Get Flights Data on Ids Function -------------------------------------------------------------------------------------------------------
+    def get_flights_data_on_ids(self, columns: list, flight_ids: list):
+        """
+        Function that gets the given telemetry columns of all the given flights in a single query. Returns a dictionary of
+        flight_id: {column: numpy array}, keyed by the ids as they were given. Flights without telemetry get empty arrays.
+        """
+
+        # Take the flights viewed before from the telemetry cache
+        flights_data = {}
+        for id in flight_ids:
+            cached = telemetry_cache.get(id, columns)
+            if cached is not None:
+                flights_data[id] = cached
+        missing_ids = [id for id in flight_ids if id not in flights_data]
+        if len(missing_ids) == 0:
+            return flights_data
+
+        # Make database connection
+        engine = self.__connect()
+
+        # Leave out the flights without a telemetry table, one missing table would fail the whole batch
+        stored_ids = [int(id) for id in missing_ids]
+        if not partitioned_telemetry():
+            stored_df = pd.read_sql_query(queries.SELECT_FLIGHTS_WITH_TELEMETRY_TABLE, engine, params={"ids": stored_ids})
+            stored_ids = [int(id) for id in stored_df["id"]]
+
+        # Select every other flight's rows at once, led by their flight id
+        if stored_ids:
+            flights_df = pd.read_sql_query(telemetry_batch_query(columns, stored_ids), engine)
+        else:
+            flights_df = pd.DataFrame(columns=["batch_flight_id"] + list(columns))
+
+        # Split the rows by flight
+        flight_groups = {flight_id: group for flight_id, group in flights_df.groupby("batch_flight_id", sort=False)}
+        no_rows = flights_df.iloc[0:0]
+
+        for id in missing_ids:
+            flights_data[id] = {column: flight_groups.get(int(id), no_rows)[column].to_numpy() for column in columns}
+            telemetry_cache.put(id, flights_data[id])
+
+        return flights_data
+
+
+    # Get Flight Dates by Ids Function --------------------------------------------------------------------------------------------------------
+    def get_flight_dates_by_ids(self, flight_ids: list):
+        """
+        The function runs the following query: SELECT id, flight_date FROM flights WHERE id = ANY(ids). Returns a dictionary of
+        flight_id: flight_date, keyed by the ids as they were given.
+        """
+
+        if len(flight_ids) == 0:
+            return {}
+
+        # Make database connection
+        engine = self.__connect()
+
+        # Select the dates of all the flights at once
+        query = "SELECT id, flight_date FROM flights WHERE id = ANY(%(ids)s)"
+        dates_df = pd.read_sql_query(query, engine, params={"ids": [int(id) for id in flight_ids]})
+        dates = dict(zip(dates_df["id"], dates_df["flight_date"]))
+
+        return {id: dates[int(id)] for id in flight_ids if int(id) in dates}
+
     def get_temperature_on_id(self, id: int):
         
         # Make database connection
         engine = self.__connect()
 
         # Make query
-        query = f"SELECT temperature FROM flight_weather_data_view WHERE fw_flight_id = {str(id)}"
+        query = f"SELECT temperature FROM {view_source('flight_weather_data_view')} WHERE fw_flight_id = {str(id)}"
 
         # Select the data based on the query
         temperature = pd.read_sql_query(query, engine)
 
-        # Dispose of the connection, so we don't overuse it.
-        engine.dispose()
-
         return temperature
 
+    def get_temperatures_on_ids(self, flight_ids: list):
+        """
+        Function that gets the temperatures of all the given flights in a single query. Returns a dictionary of
+        flight_id: temperature dataframe, keyed by the ids as they were given.
+        """
+
+        if len(flight_ids) == 0:
+            return {}
+
+        # Make database connection
+        engine = self.__connect()
+
+        # Make query
+        query = f"SELECT fw_flight_id, temperature FROM {view_source('flight_weather_data_view')} WHERE fw_flight_id = ANY(%(ids)s)"
+
+        # Select the data based on the query
+        temperature = pd.read_sql_query(query, engine, params={"ids": [int(id) for id in flight_ids]})
+
+        return {id: temperature.loc[temperature["fw_flight_id"] == int(id), ["temperature"]].reset_index(drop=True)
+                for id in flight_ids}
+
     # Get Flight Data for every half minute Function ------------------------------------------------------------------------------------------------------------
     def get_flight_data_every_half_min_on_id(self, id: int):
         """
-        The function runs a query to get the fw_flight_id, activity, time, soc, power, soh, date from labeled activities view in 30 sec intervals.
+        The function runs a query to get the fw_flight_id, activity, time, soc, power, soh, date and soc rate of change in 30 sec intervals,
+        from flight_rollup_30s once the scraper has built it and from the labeled activities view until then.
         """
         # Make database connection
         engine = self.__connect()
 
+        # Read the precomputed buckets
+        if materialized("flight_rollup_30s"):
+            return pd.read_sql_query(queries.SELECT_FLIGHT_ROLLUP_30S, engine, params={"id": int(id)})
+
         # Make query
         query = f"""
                 SELECT
@@ -129,7 +381,7 @@ class query_flights:
                     AVG(bat_2_soh) AS bat_2_soh,
                     flight_date AS dates
                 FROM
-                    labeled_activities_view
+                    {view_source('labeled_activities_view')}
                 WHERE
                     fw_flight_id = {str(id)} and bat_1_soh != 0 and bat_2_soh != 0
                 GROUP BY
@@ -141,9 +393,8 @@ class query_flights:
 
         # Select the data based on the query
         flight_data = pd.read_sql_query(query, engine)
-
-        # Dispose of the connection, so we don't overuse it.
-        engine.dispose()
+        flight_data["soc_rate_of_change"] = soc_rate_of_change(flight_data["time_min_rounded"].to_numpy(),
+                                                               (flight_data["bat_1_soc"].to_numpy() + flight_data["bat_2_soc"].to_numpy()) / 2)
 
         return flight_data
     
@@ -165,7 +416,7 @@ class query_flights:
                     AVG(bat_2_soc) AS bat_2_soc,
                     AVG(temperature) AS temperature
                 FROM
-                    flight_weather_data_view
+                    {view_source('flight_weather_data_view')}
                 WHERE
                     fw_flight_id = {str(id)} 
                 GROUP BY
@@ -177,13 +428,17 @@ class query_flights:
         # Select the data based on the query
         flight_data = pd.read_sql_query(query, engine)
 
-        # Dispose of the connection, so we don't overuse it.
-        engine.dispose()
-
         return flight_data
     
     # Get AVG SOH per month Function (labeled activities view) ---------------------------------------------------------------------------------
     def get_avg_soh_per_month_act_view(self):
+        """
+        Function that gets the average SOH of both batteries per month, from soh_rollup once the scraper has built it and from the
+        labeled activities view until then.
+        """
+        # Read the monthly rollup, one row per plane and month
+        if materialized("soh_rollup"):
+            return self.get_soh_trend("month")
 
         # Make database connection
         engine = self.__connect()
@@ -195,7 +450,7 @@ class query_flights:
                     AVG(bat_1_soh) as bat_1_soh, 
                     AVG(bat_2_soh) as bat_2_soh
                 FROM 
-                    labeled_activities_view 
+                    {view_source('labeled_activities_view')} 
                 WHERE  
                     bat_1_soh != 0 and bat_2_soh != 0
                 GROUP BY 
@@ -208,9 +463,6 @@ class query_flights:
         # Select the data based on the query
         flight_data = pd.read_sql_query(query, engine)
 
-        # Dispose of the connection, so we don't overuse it.
-        engine.dispose()
-
         return flight_data
     
 
@@ -222,13 +474,11 @@ class query_flights:
         # Get the columns in order and make the query
         str_column = "".join([f"{value[0]} AS \"{key}\", " if len(value) == 1 else f"({value[0]}+{value[1]})/2 AS \"{key}\", " for key, value in list(columns_dict.items())])[:-2]
         query = f"""SELECT {str_column} 
-                    FROM flightdata_{flight_id};"""
+                    FROM {telemetry_source(flight_id)};"""
         
         # Select the data based on the query
         flight_df = pd.read_sql_query(query, engine)
 
-        # Dispose and return
-        engine.dispose()
         return flight_df
 
 
@@ -279,17 +529,15 @@ class query_flights:
         # Initialize the dictionary
         flight_dict = {}
 
-        # Get soc, and time data for the specific flight
-        for id in flight_ids:
+        # Get the soc and time data of all the flights in one query, and their dates in another
+        flights_data = self.get_flights_data_on_ids(["time_min", "bat_1_soc", "bat_2_soc"], flight_ids)
+        flight_dates = self.get_flight_dates_by_ids(flight_ids)
 
-            # Get the flight data
-            flights_df = self.get_flight_data_on_id(["flight_id", "time_min", "bat_1_soc", "bat_2_soc"], id)
-            flight_date_df = self.get_flight_by_id(id)
+        for id in flight_ids:
 
-            # Change to Numpy
-            times = flights_df["time_min"].to_numpy()
-            soc = (flights_df["bat_1_soc"].to_numpy() + flights_df["bat_2_soc"].to_numpy()) / 2
-            date = flight_date_df["flight_date"].iloc[0].strftime("%b %d, %Y")
+            times = flights_data[id]["time_min"]
+            soc = (flights_data[id]["bat_1_soc"] + flights_data[id]["bat_2_soc"]) / 2
+            date = flight_dates[id].strftime("%b %d, %Y")
 
             flight_dict[id] = {"soc": soc, "time_min": times, "date": date}
 
@@ -304,7 +552,6 @@ class query_flights:
         # Loop through each flight id
         flight_date_df = self.get_flight_by_id(flight_id)
         total_weight = flight_date_df["total_weight"].iloc[0]
-        engine.dispose()
         if total_weight==None: 
             return "N/A"
         else: 
@@ -321,17 +568,15 @@ class query_flights:
         # Initialize the dictionary
         flight_dict = {}
 
-        # Get soc, and time data for the specific flight
-        for id in flight_ids:
+        # Get the motor power and time data of all the flights in one query, and their dates in another
+        flights_data = self.get_flights_data_on_ids(["time_min", "motor_power"], flight_ids)
+        flight_dates = self.get_flight_dates_by_ids(flight_ids)
 
-            # Get the flight data
-            flights_df = self.get_flight_data_on_id(["flight_id", "time_min", "motor_power"], id)
-            flight_date_df = self.get_flight_by_id(id)
+        for id in flight_ids:
 
-            # Change to Numpy
-            times = flights_df["time_min"].to_numpy()
-            motor_power = flights_df["motor_power"].to_numpy()
-            date = flight_date_df["flight_date"].iloc[0].strftime("%b %d, %Y")
+            times = flights_data[id]["time_min"]
+            motor_power = flights_data[id]["motor_power"]
+            date = flight_dates[id].strftime("%b %d, %Y")
 
             flight_dict[id] = {"motor_power": motor_power, "time_min": times, "date": date}
 
@@ -356,12 +601,7 @@ class query_flights:
         motor_power = flights_df["motor_power"].to_numpy()
         activity = flights_df["activity"].to_numpy()
         soc = (flights_df["bat_1_soc"].to_numpy() + flights_df["bat_2_soc"].to_numpy()) / 2 # get soc avg
-
-        # Calculate SOC rate of change
-        # The rate of change for the last entry will be set to 0 since there is no next entry to compare with
-        soc_rate_of_change = (soc[1:] - soc[:-1]) / (times[1:] - times[:-1])
-        # Append a 0 to soc_rate_of_change to keep the array sizes consistent
-        soc_rate_of_change = np.append(soc_rate_of_change, 0)
+        soc_rate_of_change = flights_df["soc_rate_of_change"].to_numpy()
 
         # Filter based on activities_filter
         # If certain activities are selected by the user in the filter, update the variables
@@ -397,18 +637,35 @@ class query_flights:
         dates = flights_df["dates"].iloc[0].strftime("%b %d, %Y")
         soc = (flights_df["bat_1_soc"].to_numpy() + flights_df["bat_2_soc"].to_numpy()) / 2 # get soc avg
         soh = (flights_df["bat_1_soh"].to_numpy() + flights_df["bat_2_soh"].to_numpy()) / 2 # get soh avg
-
-        # Calculate SOC rate of change
-        # The rate of change for the last entry will be set to 0 since there is no next entry to compare with
-        soc_rate_of_change = (soc[1:] - soc[:-1]) / (times[1:] - times[:-1])
-        # Append a 0 to soc_rate_of_change to keep the array sizes consistent
-        soc_rate_of_change = np.append(soc_rate_of_change, 0)
+        soc_rate_of_change = flights_df["soc_rate_of_change"].to_numpy()
 
         flight_dict[id] = {"time_min_rounded": times, "soc": soc, "soc_rate_of_change": soc_rate_of_change, "soh": soh, "dates": dates}
 
         return flight_dict
     
 
+    # Get SOH trend Function --------------------------------------------------------------------------------------------------------------------------
+    def get_soh_trend(self, period: str = "month", plane: str = None):
+        """
+        Function that gets the average SOH of both batteries per month or week (period) from soh_rollup, of the whole fleet or of one plane.
+        Returns a df of flight_date, bat_1_soh, bat_2_soh.
+        """
+        # Make database connection
+        engine = self.__connect()
+
+        return pd.read_sql_query(queries.SELECT_SOH_ROLLUP, engine, params={"period": period, "plane": plane})
+
+    # Get SOH trend per plane Function -------------------------------------------------------------------------------------------------------------
+    def get_soh_trend_per_plane(self, period: str = "month"):
+        """
+        Function that gets the average SOH of both batteries per month or week (period) of every plane from soh_rollup.
+        Returns a df of plane, flight_date, bat_1_soh, bat_2_soh.
+        """
+        # Make database connection
+        engine = self.__connect()
+
+        return pd.read_sql_query(queries.SELECT_SOH_ROLLUP_PER_PLANE, engine, params={"period": period})
+
     # Get Date, SOH Function -------------------------------------------------------------------------
     def get_flight_soh(self):
         """
@@ -457,7 +714,7 @@ class query_flights:
                         ROUND(pressure_alt) AS altitude,
                         LAG(ROUND(pressure_alt)) OVER (ORDER BY time_min) AS prev_altitude,
                         LEAD(ROUND(pressure_alt)) OVER (ORDER BY time_min) AS next_altitude
-                    FROM flightdata_{flight_id}
+                    FROM {telemetry_source(flight_id)}
                 )
 
                 SELECT
@@ -481,9 +738,6 @@ class query_flights:
         # Get number of circuits
         num_circuits = count_array[0][0]
 
-        # Dispose of the connection, so we don't overuse it.
-        engine.dispose()
-
         return num_circuits
     
 
@@ -505,9 +759,6 @@ class query_flights:
         for i in range(len(activities_list)):
             result_list.append(activities_list[i][0])
 
-        # Dispose of the connection, so we don't overuse it.
-        engine.dispose()
-
         return result_list
     
 
@@ -532,26 +783,12 @@ class query_flights:
             error_df = pd.DataFrame(error_dict)
             return error_df
 
-        # Get the engine UNLIMITED POWWWEEERRRRRR!
-        engine = self.__connect()
-
         # Get the flight data
         result_df = self.get_flight_data_every_half_min_on_id(flight_id)
 
         # Change to Numpy
-        times = result_df["time_min_rounded"].to_numpy()
         activity = result_df["activity"].to_numpy()
-        soc = (result_df["bat_1_soc"].to_numpy() + result_df["bat_2_soc"].to_numpy()) / 2 # get soc avg
-
-        # Calculate SOC rate of change
-        # The rate of change for the last entry will be set to 0 since there is no next entry to compare with
-        soc_rate_of_change = (soc[1:] - soc[:-1]) / (times[1:] - times[:-1])
-
-        # Append a 0 to soc_rate_of_change to keep the array sizes consistent
-        soc_rate_of_change = np.append(soc_rate_of_change, 0)
-
-        # Dispose of the connection, so we don't overuse it.
-        engine.dispose()
+        soc_rate_of_change = result_df["soc_rate_of_change"].to_numpy()
 
         # Add activity and SOC information into dataframe
         df = pd.DataFrame({
@@ -589,15 +826,12 @@ class query_flights:
                         requested_torque AS torque,
                         heading AS heading, 
                         qng AS qng
-                    FROM labeled_activities_view
+                    FROM {view_source('labeled_activities_view')}
                     WHERE flight_id={flight}"""
 
         # Select the data based on the query
         flight_data = pd.read_sql_query(query, engine) 
 
-        # Dispose of the connection, so we don't overuse it.
-        engine.dispose()
-
         # Return the data
         return flight_data
     
@@ -625,11 +859,10 @@ class query_flights:
                         requested_torque AS torque,
                         heading AS heading, 
                         qng AS qng
-                    FROM flightdata_{flight};
+                    FROM {telemetry_source(flight)};
                 """
 
         flight_data = pd.read_sql_query(query, engine) 
-        engine.dispose()
         return flight_data
 
 
@@ -650,16 +883,13 @@ class query_flights:
                         temperature,
                         visibility,
                         wind_speed
-                    FROM labeled_activities_view  
+                    FROM {view_source('labeled_activities_view')}  
                     WHERE labeled_activities_view.flight_id={flight} and labeled_activities_view.time_min >= 0.02
                     ORDER BY time_min;"""
 
         # Select the data based on the query
         flight_data = pd.read_sql_query(query, engine) 
 
-        # Dispose of the connection, so we don't overuse it.
-        engine.dispose()
-
         # Return the data
         return flight_data
     
@@ -691,8 +921,5 @@ class query_flights:
         visibility = flights.iloc[0, 1]
         wind_speed = flights.iloc[0, 2]
 
-        # Dispose of the connection, so we don't overuse it.
-        engine.dispose()
-
         # Return the data
         return temp, visibility, wind_speed
@@ -1,8 +1,7 @@
 import requests
 import pandas as pd
 import os
-from storage import db_connect, execute, table_exists
-from sqlalchemy import create_engine
+from storage import db_connect, execute, table_exists, bulk_insert
 
 # get data
 def get_forcast_from_today():
@@ -38,8 +37,4 @@ def get_forcast_from_today():
     df_combined.pop(df_combined.columns[-1])
 
     # push the data to the forecast table
-    engine_string = "postgresql+psycopg2" + os.getenv('DATABASE_URL')[8:]
-    engine = create_engine(engine_string)
-
-    # add new table to db
-    df_combined.to_sql("forecast", engine, if_exists="fail", index=False)
\ No newline at end of file
+    bulk_insert(df_combined, "forecast", if_exists="fail")
\ No newline at end of file
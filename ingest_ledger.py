@@ -0,0 +1,107 @@
+# this file keeps the ingest ledger: a row in ingest_runs for every scraper or bulk ingest run, and a row in
+# ingest_flight_metrics for every flight the run handled, with how long each stage took, its rows in and out
+# and the size of its zip. scraper_last_run only says when the scraper last ran, the ledger says how fast.
+# run: python ingest_ledger.py [--days 30] to print the throughput of the recent runs
+import argparse
+import json
+import pandas as pd
+from database import get_engine
+from storage import db_connect, db_disconnect
+import queries
+
+# the per-flight stage timings of the pipeline and the ledger column each one is stored in
+STAGE_COLUMNS = {'download': 'download_s', 'read': 'parse_s', 'resample': 'resample_s', 'label': 'label_s',
+                 'load': 'db_write_s'}
+
+# takes in a flight's job dict, whether it was 'loaded' or 'failed', its stage timings and its sizes,
+# and returns its ingest_flight_metrics row
+def flight_metrics(job, status, timings, zip_bytes=None, rows_in=None, rows_out=None):
+  metrics = {'flight_id': int(job['id']), 'plane': job.get('plane'), 'status': status,
+             'zip_bytes': zip_bytes, 'rows_in': rows_in, 'rows_out': rows_out}
+  for stage, column in STAGE_COLUMNS.items():
+    metrics[column] = timings.get(stage)
+  return metrics
+
+class IngestLedger:
+  """
+  The ledger rows of one ingest run.
+
+  start() opens the run, record_flights() and record_weather_link() add to it as the flights are
+  loaded and linked, and finish() closes it. The ledger is only a record: a failed write is printed
+  and the ingest carries on.
+  """
+
+  def __init__(self, source):
+    # 'scrape' or 'bulk'
+    self.source = source
+    self.run_id = None
+
+  def _execute(self, query, params, many=False):
+    conn = db_connect()
+    cursor = conn.cursor()
+    try:
+      if many:
+        cursor.executemany(query, params)
+      else:
+        cursor.execute(query, params)
+      result = cursor.fetchone() if cursor.description else None
+      conn.commit()
+      return result
+    except Exception as e:
+      conn.rollback()
+      print(f"Failed to write the ingest ledger: {e}")
+      return None
+    finally:
+      cursor.close()
+      db_disconnect(conn)
+
+  def start(self):
+    row = self._execute(queries.INSERT_INGEST_RUN, (self.source,))
+    self.run_id = row[0] if row else None
+    return self
+
+  # takes in flight_metrics rows and adds them to the run
+  def record_flights(self, metrics):
+    if self.run_id is None or not metrics:
+      return
+    self._execute(queries.INSERT_INGEST_FLIGHT_METRICS, [dict(row, run_id=self.run_id) for row in metrics], many=True)
+
+  # takes in the flights weather was linked to and how long it took, each gets an even share
+  def record_weather_link(self, flight_ids, seconds):
+    if self.run_id is None or not flight_ids:
+      return
+    self._execute(queries.RECORD_WEATHER_LINK_SECONDS,
+                  (seconds / len(flight_ids), self.run_id, [int(id) for id in flight_ids]))
+
+  # closes the run with its flight counts and the pipeline's total seconds per stage
+  def finish(self, flights_loaded, flights_failed, stage_seconds):
+    if self.run_id is None:
+      return
+    self._execute(queries.FINISH_INGEST_RUN, (flights_loaded, flights_failed,
+                                              json.dumps({stage: round(seconds, 3) for stage, seconds in stage_seconds.items()}),
+                                              self.run_id))
+
+# returns the throughput of every run of the last days days, oldest first (see SELECT_INGEST_THROUGHPUT)
+def ingest_throughput(days=30):
+  return pd.read_sql_query(queries.SELECT_INGEST_THROUGHPUT, get_engine(), params={"days": days})
+
+# prints one line per run, so a slower stage or a drop in rows per second stands out against the runs before it
+def print_throughput(throughput_df):
+  if throughput_df.empty:
+    print("No ingest runs recorded in that time")
+    return
+  stages = list(STAGE_COLUMNS.values()) + ['weather_link_s']
+  # runs without a loaded flight have no rows or bytes
+  throughput_df = throughput_df.fillna({'rows_in': 0, 'zip_bytes': 0, 'rows_per_s': 0})
+  for run in throughput_df.itertuples(index=False):
+    stage_text = ", ".join(f"{stage[:-2]} {getattr(run, stage):.2f} s" for stage in stages
+                           if pd.notna(getattr(run, stage)))
+    print(f"{run.started_at:%Y-%m-%d %H:%M} {run.source}: {run.flights_loaded} flights loaded, "
+          f"{run.flights_failed} failed, {run.rows_in:.0f} rows, {run.zip_bytes / 1e6:.1f} MB, "
+          f"{run.rows_per_s:.0f} rows/s. per flight: {stage_text}")
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description="Print the throughput of the recent ingest runs.")
+  parser.add_argument("--days", type=int, default=30, help="how many days back to look (default 30)")
+  args = parser.parse_args()
+  print_throughput(ingest_throughput(args.days))
@@ -0,0 +1,239 @@
+# this file runs the flight ingest as a producer/consumer pipeline
+# the scraper (the Selenium thread) only finds new flights and downloads their zips, then hands them to submit().
+# a process pool reads (dropping the unused columns), downsamples and builds the label features of each flight, and a
+# loader thread labels each batch of flights with one predict call and writes it to the database. the pending queue is bounded, so when the workers or the
+# loader fall behind, submit() blocks and the browser waits instead of piling up downloads.
+import os
+import queue
+import shutil
+import threading
+import time
+import zipfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from transformation import read_overview_csv
+from activity_labeling import label_features, predict_feature_activities
+from storage import prepare_flight_data, ingest_flights
+from ingest_ledger import flight_metrics
+
+# pipeline bounds, overridable from .env
+INGEST_WORKERS = int(os.getenv('INGEST_WORKERS', max(1, (os.cpu_count() or 2) - 1)))
+INGEST_QUEUE_SIZE = int(os.getenv('INGEST_QUEUE_SIZE', 8))
+INGEST_BATCH_SIZE = int(os.getenv('INGEST_BATCH_SIZE', 4))
+INGEST_CHUNK_ROWS = int(os.getenv('INGEST_CHUNK_ROWS', 100000))
+
+# where downloaded zips wait for a worker, outside the browser's download directory
+STAGING_DIR = os.path.join(os.getcwd(), 'ingest_staging')
+
+# marks the end of the pending queue for the loader
+_STOP = object()
+
+# reads the flight csv straight out of the downloaded zip, without extracting it, into the transformed df.
+# long exports are parsed INGEST_CHUNK_ROWS rows at a time so the parser never buffers the whole file
+def read_flight_zip(zip_path, chunksize=INGEST_CHUNK_ROWS):
+  csv_name = os.path.basename(zip_path)[:-4] + ".csv"
+  with zipfile.ZipFile(zip_path, 'r') as zip:
+    with zip.open(csv_name) as csv_file:
+      if not chunksize:
+        return read_overview_csv(csv_file)
+      return pd.concat(read_overview_csv(csv_file, chunksize=chunksize), ignore_index=True)
+
+# runs in a worker process: takes in a flight job and returns its telemetry df, the features its activities are
+# labeled from (only for flight tests), how long each step took and its rows before and after downsampling
+def prepare_flight(job):
+  timings = {}
+  start = time.perf_counter()
+  df = read_flight_zip(job['zip_path'])
+  timings['read'] = time.perf_counter() - start
+
+  start = time.perf_counter()
+  telemetry_df = prepare_flight_data(df, job['id'])
+  timings['resample'] = time.perf_counter() - start
+
+  features_df = None
+  if job['flight_type'] == "Flight test":
+    start = time.perf_counter()
+    features_df = label_features(telemetry_df)
+    timings['label'] = time.perf_counter() - start
+
+  if job['remove_zip']:
+    os.remove(job['zip_path'])
+  return {'job': job, 'telemetry': telemetry_df, 'features': features_df, 'timings': timings,
+          'rows_in': len(df), 'rows_out': len(telemetry_df)}
+
+class IngestPipeline:
+  """
+  Bounded producer/consumer pipeline from downloaded flight zips to the database.
+
+  submit() each downloaded flight, drain() to wait until everything submitted so far is
+  written (it returns the flights that were), and close() once at the end. With an
+  IngestLedger every flight's timings and sizes are recorded in it as its batch is written.
+  """
+
+  def __init__(self, workers=INGEST_WORKERS, queue_size=INGEST_QUEUE_SIZE, batch_size=INGEST_BATCH_SIZE, ledger=None):
+    os.makedirs(STAGING_DIR, exist_ok=True)
+    self.batch_size = batch_size
+    self.ledger = ledger
+    # (job, future) pairs in submission order, bounded for backpressure
+    self.pending = queue.Queue(maxsize=queue_size)
+    # spawned workers, forking would copy the browser session, the loader thread and the pooled db sockets
+    self.executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    self._lock = threading.Lock()
+    self.stage_seconds = {}
+    # flight id -> seconds of the stages timed outside the workers (the download), until the flight is recorded
+    self._flight_seconds = {}
+    self.flights_loaded = 0
+    self.flights_failed = 0
+    self._loaded = []
+    self.loader = threading.Thread(target=self._load_loop, name="ingest-loader", daemon=True)
+    self.loader.start()
+
+  # adds the given seconds to the running total of a stage, the scraper reports its download time here too.
+  # with flight_id set the seconds are also kept for that flight's ledger row
+  def time_stage(self, stage, seconds, flight_id=None):
+    with self._lock:
+      self.stage_seconds[stage] = self.stage_seconds.get(stage, 0.0) + seconds
+      if flight_id is not None and self.ledger is not None:
+        self._flight_seconds.setdefault(int(flight_id), {})[stage] = seconds
+
+  # takes in the flights weather was linked to and how long linking took
+  def record_weather_link(self, flight_ids, seconds):
+    self.time_stage('weather_link', seconds)
+    if self.ledger is not None:
+      self.ledger.record_weather_link(flight_ids, seconds)
+
+  # takes in a flight job dict (id, datetime, notes, flight_type, plane) and the path of its downloaded zip,
+  # moves the zip out of the download directory and queues the flight, blocking while the queue is full.
+  # with keep_zip the zip is read in place and left on disk, for exports that are not ours to delete
+  def submit(self, job, zip_path, keep_zip=False):
+    zip_bytes = os.path.getsize(zip_path)
+    if keep_zip:
+      job = dict(job, zip_path=zip_path, remove_zip=False)
+    else:
+      job = dict(job, zip_path=shutil.move(zip_path, os.path.join(STAGING_DIR, os.path.basename(zip_path))), remove_zip=True)
+    job['zip_bytes'] = zip_bytes
+    future = self.executor.submit(prepare_flight, job)
+    start = time.perf_counter()
+    self.pending.put((job, future))
+    self.time_stage('backpressure', time.perf_counter() - start)
+
+  # waits until every submitted flight is written or failed, returns the jobs of the written flights.
+  # with plane set only that plane's jobs are returned, the others are kept for their own drain
+  def drain(self, plane=None):
+    self.pending.join()
+    with self._lock:
+      if plane is None:
+        loaded, self._loaded = self._loaded, []
+      else:
+        loaded = [job for job in self._loaded if job['plane'] == plane]
+        self._loaded = [job for job in self._loaded if job['plane'] != plane]
+    return loaded
+
+  # drains the pipeline, stops the loader and the workers, prints where the time went and closes the ledger run
+  def close(self):
+    loaded = self.drain()
+    self.pending.put(_STOP)
+    self.loader.join()
+    self.executor.shutdown()
+    self.print_summary()
+    if self.ledger is not None:
+      with self._lock:
+        self.ledger.finish(self.flights_loaded, self.flights_failed, dict(self.stage_seconds))
+    return loaded
+
+  def print_summary(self):
+    with self._lock:
+      stages = ", ".join(f"{stage} {seconds:.2f} s" for stage, seconds in self.stage_seconds.items())
+      print(f"Ingest pipeline: {self.flights_loaded} flights loaded, {self.flights_failed} failed. {stages}")
+
+  # loader thread: collects finished flights into batches and writes each batch
+  def _load_loop(self):
+    batch = []
+    while True:
+      pending = self.pending.get()
+      if pending is _STOP:
+        self.pending.task_done()
+        break
+      batch.append(pending)
+      # write when the batch is full or nothing else is waiting
+      if len(batch) >= self.batch_size or self.pending.empty():
+        self._flush(batch)
+        for _ in batch:
+          self.pending.task_done()
+        batch = []
+
+  # pops the seconds kept for the flight and returns its ledger row
+  def _flight_metrics(self, job, status, timings=None, rows_in=None, rows_out=None):
+    with self._lock:
+      flight_seconds = self._flight_seconds.pop(int(job['id']), {})
+    return flight_metrics(job, status, dict(flight_seconds, **(timings or {})), job.get('zip_bytes'), rows_in, rows_out)
+
+  # labels the batch's flight tests with one predict call, returns their labels or None without any.
+  # each flight's share of the call, by its rows, is added to its label time
+  def _label(self, results):
+    labeled = [result for result in results if result['features'] is not None]
+    if not labeled:
+      return None
+    start = time.perf_counter()
+    labels_df = predict_feature_activities([result['features'] for result in labeled])
+    elapsed = time.perf_counter() - start
+    self.time_stage('label', elapsed)
+    total_rows = sum(len(result['features']) for result in labeled) or 1
+    for result in labeled:
+      result['timings']['label'] = result['timings'].get('label', 0.0) + elapsed * len(result['features']) / total_rows
+    return labels_df
+
+  # waits for the batch's workers and writes the flights that were prepared
+  def _flush(self, batch):
+    results = []
+    failed = []
+    start = time.perf_counter()
+    for job, future in batch:
+      try:
+        results.append(future.result())
+      except Exception as e:
+        # the flight is not written, so the next scrape will pick it up again
+        print(f"Failed to prepare flight {job['id']}: {e}")
+        failed.append(self._flight_metrics(job, 'failed'))
+        with self._lock:
+          self.flights_failed += 1
+    self.time_stage('worker_wait', time.perf_counter() - start)
+    if self.ledger is not None:
+      self.ledger.record_flights(failed)
+    if not results:
+      return
+
+    for result in results:
+      for stage, seconds in result['timings'].items():
+        self.time_stage(stage, seconds)
+      steps = ", ".join(f"{stage} {seconds:.2f} s" for stage, seconds in result['timings'].items())
+      print(f"Prepared flight {result['job']['id']}: {steps}")
+
+    start = time.perf_counter()
+    try:
+      labels_df = self._label(results)
+      # the batch's telemetry, labels and flights rows go in one transaction, all of them or none
+      ingest_flights([result['job'] for result in results],
+                     {result['job']['id']: result['telemetry'] for result in results}, labels_df)
+    except Exception as e:
+      print(f"Failed to load flights {[result['job']['id'] for result in results]}: {e}")
+      with self._lock:
+        self.flights_failed += len(results)
+      if self.ledger is not None:
+        self.ledger.record_flights([self._flight_metrics(result['job'], 'failed', result['timings'], result['rows_in'],
+                                                         result['rows_out']) for result in results])
+      return
+    elapsed = time.perf_counter() - start
+    self.time_stage('load', elapsed)
+    if self.ledger is not None:
+      # the batch is written at once, each flight's share of the write is its share of the rows
+      total_rows = sum(result['rows_out'] for result in results) or 1
+      self.ledger.record_flights([self._flight_metrics(result['job'], 'loaded',
+                                                       dict(result['timings'], load=elapsed * result['rows_out'] / total_rows),
+                                                       result['rows_in'], result['rows_out']) for result in results])
+
+    with self._lock:
+      self.flights_loaded += len(results)
+      self._loaded.extend(result['job'] for result in results)
+    print(f"Loaded {len(results)} flights in {elapsed:.2f} s: {[result['job']['id'] for result in results]}")
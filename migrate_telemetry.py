@@ -0,0 +1,70 @@
+# moves every flightdata_<id> table into the partitioned flight_telemetry table
+# run: python migrate_telemetry.py [--drop-old]
+# then set TELEMETRY_STORAGE=partitioned in .env so ingest and the querying classes use flight_telemetry
+import argparse
+import queries
+from storage import db_connect, db_disconnect, execute
+
+# returns the column names of the given table in table order
+def table_columns(cursor, table):
+  cursor.execute("""
+      SELECT column_name
+      FROM information_schema.columns
+      WHERE table_name = %s
+      ORDER BY ordinal_position;
+  """, (table,))
+  return [row[0] for row in cursor.fetchall()]
+
+# copies one flightdata_<id> table into flight_telemetry in its own transaction
+# the flight's rows are deleted first, so a crashed migration can simply be run again
+def migrate_flight_table(conn, table, telemetry_columns):
+  flight_id = int(table[len("flightdata_"):])
+  cursor = conn.cursor()
+  try:
+    old_columns = set(table_columns(cursor, table))
+    columns = ", ".join(f'"{col}"' for col in telemetry_columns if col in old_columns)
+    cursor.execute("DELETE FROM flight_telemetry WHERE flight_id = %s", (flight_id,))
+    cursor.execute(f"INSERT INTO flight_telemetry ({columns}) SELECT {columns} FROM {table}")
+    rows = cursor.rowcount
+    conn.commit()
+  except Exception:
+    conn.rollback()
+    raise
+  finally:
+    cursor.close()
+  return rows
+
+def migrate(drop_old=False):
+  # create the partitioned table and its index
+  execute(queries.CREATE_FLIGHT_TELEMETRY)
+
+  conn = db_connect()
+  cursor = conn.cursor()
+  cursor.execute(queries.PER_FLIGHT_TELEMETRY_TABLES)
+  tables = [row[0] for row in cursor.fetchall()]
+  telemetry_columns = table_columns(cursor, "flight_telemetry")
+  cursor.close()
+
+  for table in tables:
+    rows = migrate_flight_table(conn, table, telemetry_columns)
+    print(f"Moved {rows} rows from {table} into flight_telemetry")
+
+  # point the view at flight_telemetry, labeled_activities_view is built on top of it
+  execute(queries.CREATE_FLIGHT_WEATHER_VIEW_PARTITIONED)
+
+  # the old tables are only dropped once nothing reads from them anymore
+  if drop_old:
+    cursor = conn.cursor()
+    for table in tables:
+      cursor.execute(f"DROP TABLE {table}")
+    conn.commit()
+    cursor.close()
+    print(f"Dropped {len(tables)} flightdata tables")
+  db_disconnect(conn)
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--drop-old", action="store_true", help="drop the flightdata_<id> tables after they are moved")
+  args = parser.parse_args()
+  migrate(args.drop_old)
+  print("Migration done. Set TELEMETRY_STORAGE=partitioned in .env to read and write flight_telemetry.")
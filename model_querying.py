@@ -1,13 +1,13 @@
 import pandas as pd
-import psycopg2
 import random
 import numpy as np
 import os
 import pickle
 import joblib
 from flight_querying import query_flights
-from dotenv import load_dotenv
-from sqlalchemy import create_engine
+from storage import bulk_insert
+from database import get_connection
+from activity_labeling import get_label_model
 
 class Model():
 
@@ -19,34 +19,21 @@ class Model():
         self.model = joblib.load(model_filename)
 
         # Get the activity label model too
-        label_model_filename = 'ML_model_outputs/label_xgboost_model.joblib'
-        self.label_model = joblib.load(label_model_filename)
+        self.label_model = get_label_model()
 
-        # Initializae the engine string and make sure that the model table is in the db
-        self.__engine_string = "postgresql+psycopg2" + os.getenv('DATABASE_URL')[8:]
+        # Make sure that the model table is in the db
         self.fights = query_flights()
         self.database_model_data()
 
 
     # Hidden Function -----------------------------------------------------------------------------
-    # Creates and returns a connection to the database
+    # Borrows a connection from the shared pool in database.py
     def __connection(self):
-        
-        # Load .env file
-        load_dotenv()
-
-        # Get the connection string from the environment variable
-        connection_string = os.getenv('DATABASE_URL')
-
-        # Connect to the PostgreSQL database
-        conn = psycopg2.connect(connection_string)
-
-        # Return the connection
-        return conn
+        return get_connection()
 
 
     # Hidden Function -----------------------------------------------------------------------------
-    # Disconnect the given connection from the database
+    # Hand the given connection back to the pool
     def __disconnect(self, conn):
         conn.close()
 
@@ -91,11 +78,8 @@ class Model():
             # Get data from the csv file
             all_data = pd.read_csv("ML_model_outputs/all_data.csv").drop(columns=["unique_data_identifier"])
 
-            # push the data to the forecast table
-            engine = create_engine(self.__engine_string)
-
             # add new table to db
-            all_data.to_sql("model", engine, if_exists="fail", index=False)
+            bulk_insert(all_data, "model", if_exists="fail")
 
 
     # Function ------------------------------------------------------------------------------------
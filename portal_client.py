@@ -0,0 +1,217 @@
+# this file scrapes the Pipistrel portal over plain HTTP instead of driving Chrome.
+# it logs in once with a cookie session, parses the aircraft and flight tables out of the HTML and
+# downloads the "Download CSV file" zips straight from their URLs, several at a time, retrying failed requests.
+# the pages are read the same way the Selenium scraper reads them: rows with the clickable-aircraft class,
+# the Registration cell, and the "Next" and "Download CSV file" links
+import os
+import re
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlparse
+import requests
+
+# client bounds, overridable from .env
+PORTAL_CONCURRENCY = int(os.getenv('PORTAL_CONCURRENCY', 4))
+PORTAL_RETRIES = int(os.getenv('PORTAL_RETRIES', 3))
+PORTAL_TIMEOUT = float(os.getenv('PORTAL_TIMEOUT', 30))
+# seconds before the first retry, doubled for every one after it
+PORTAL_BACKOFF = float(os.getenv('PORTAL_BACKOFF', 0.5))
+
+ROW_CLASS = "clickable-aircraft"
+DOWNLOAD_LINK_TEXT = "Download CSV file"
+NEXT_LINK_TEXT = "Next"
+# the home page lists the planes followed by the 20 most recent flights, all as clickable rows
+HOME_RECENT_FLIGHT_ROWS = 20
+
+# the page a clickable row opens, from its data-href/data-url, its onclick or the first link inside it
+_ONCLICK_URL = re.compile(r"""location(?:\.href)?\s*=\s*['"]([^'"]+)['"]""")
+
+# a table row: the text of its cells and the absolute URL it opens
+PortalRow = namedtuple("PortalRow", ["cells", "href"])
+# a form: its absolute action URL and its inputs as name -> (type, value)
+PortalForm = namedtuple("PortalForm", ["action", "inputs"])
+
+class PortalError(Exception):
+  pass
+
+class _PageParser(HTMLParser):
+  def __init__(self):
+    super().__init__(convert_charrefs=True)
+    self.rows = []
+    self.links = []
+    self.cells = []
+    self.forms = []
+    self._row = None
+    self._cell = None
+    self._link = None
+
+  def handle_starttag(self, tag, attrs):
+    attrs = dict(attrs)
+    if tag == "tr" and ROW_CLASS in (attrs.get("class") or "").split():
+      onclick = _ONCLICK_URL.search(attrs.get("onclick") or "")
+      self._row = {"cells": [], "href": attrs.get("data-href") or attrs.get("data-url") or
+                   (onclick.group(1) if onclick else None)}
+    elif tag == "td":
+      self._cell = []
+    elif tag == "a" and attrs.get("href"):
+      self._link = {"href": attrs["href"], "text": []}
+      if self._row is not None and self._row["href"] is None:
+        self._row["href"] = attrs["href"]
+    elif tag == "form":
+      self.forms.append({"action": attrs.get("action") or "", "inputs": {}})
+    elif tag in ("input", "button") and self.forms and attrs.get("name"):
+      self.forms[-1]["inputs"][attrs["name"]] = (attrs.get("type") or "text", attrs.get("value") or "")
+
+  def handle_endtag(self, tag):
+    if tag == "td" and self._cell is not None:
+      text = " ".join("".join(self._cell).split())
+      self.cells.append(text)
+      if self._row is not None:
+        self._row["cells"].append(text)
+      self._cell = None
+    elif tag == "a" and self._link is not None:
+      self.links.append((" ".join("".join(self._link["text"]).split()), self._link["href"]))
+      self._link = None
+    elif tag == "tr" and self._row is not None:
+      self.rows.append(self._row)
+      self._row = None
+
+  def handle_data(self, data):
+    if self._cell is not None:
+      self._cell.append(data)
+    if self._link is not None:
+      self._link["text"].append(data)
+
+class PortalPage:
+  def __init__(self, html, url):
+    parser = _PageParser()
+    parser.feed(html)
+    parser.close()
+    self.url = url
+    self.rows = [PortalRow(row["cells"], urljoin(url, row["href"]) if row["href"] else None) for row in parser.rows]
+    self.links = [(text, urljoin(url, href)) for text, href in parser.links]
+    self.forms = [PortalForm(urljoin(url, form["action"]) if form["action"] else url, form["inputs"])
+                  for form in parser.forms]
+    # the cell after the one reading "Registration", on a plane's page
+    self.registration = None
+    for label, value in zip(parser.cells, parser.cells[1:]):
+      if label == "Registration":
+        self.registration = value
+        break
+
+  # returns the absolute URL of the first link with the given text, or None
+  def link(self, text):
+    return next((href for link_text, href in self.links if link_text == text), None)
+
+  # returns the form with a password field, or None when the session is logged in
+  @property
+  def login_form(self):
+    return next((form for form in self.forms if any(kind == "password" for kind, _ in form.inputs.values())), None)
+
+class PortalClient:
+  def __init__(self, base_url, username, password, concurrency=PORTAL_CONCURRENCY, retries=PORTAL_RETRIES,
+               timeout=PORTAL_TIMEOUT, backoff=PORTAL_BACKOFF, session=None):
+    self.base_url = base_url
+    self.username = username
+    self.password = password
+    self.retries = retries
+    self.timeout = timeout
+    self.backoff = backoff
+    self.session = session if session is not None else requests.Session()
+    self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="portal-download")
+    self._lock = threading.Lock()
+    self.requests_made = 0
+    self.requests_retried = 0
+
+  # sends the request, retrying connection errors, timeouts and server errors with exponential backoff.
+  # client errors (4xx) are not retried
+  def _request(self, method, url, **kwargs):
+    for attempt in range(self.retries + 1):
+      with self._lock:
+        self.requests_made += 1
+      try:
+        response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+        if response.status_code < 500:
+          response.raise_for_status()
+          return response
+        error = requests.HTTPError(f"{response.status_code} from {url}", response=response)
+      except (requests.ConnectionError, requests.Timeout) as request_error:
+        error = request_error
+      if attempt == self.retries:
+        raise error
+      with self._lock:
+        self.requests_retried += 1
+      time.sleep(self.backoff * 2 ** attempt)
+
+  def get_page(self, url):
+    response = self._request("GET", url)
+    return PortalPage(response.text, response.url)
+
+  # logs the session in if it is not already, and returns the home page
+  def login(self):
+    page = self.get_page(self.base_url)
+    form = page.login_form
+    if form is None:
+      return page
+    data = {name: value for name, (kind, value) in form.inputs.items() if kind not in ("submit", "button")}
+    for name, (kind, _) in form.inputs.items():
+      if kind == "password":
+        data[name] = self.password
+      elif kind in ("text", "email"):
+        data[name] = self.username
+    # the portal checks the referer of form posts
+    response = self._request("POST", form.action, data=data, headers={"Referer": page.url})
+    page = PortalPage(response.text, response.url)
+    if page.login_form is not None:
+      raise PortalError("logging in to the Pipistrel portal failed, check the user and password in .env")
+    return page
+
+  # returns the URL of every plane's page on the home page
+  def plane_urls(self, home_page):
+    plane_rows = home_page.rows[:len(home_page.rows) - HOME_RECENT_FLIGHT_ROWS]
+    if any(row.href is None for row in plane_rows):
+      raise PortalError("the aircraft rows on the home page have no link to follow")
+    return [row.href for row in plane_rows]
+
+  # takes in a flight's page URL, its id and the download directory, and returns a future for the downloaded
+  # zip's path. it resolves to None when the flight has no download yet (the portal is still processing it)
+  def download_flight(self, flight_url, flight_id, download_dir):
+    return self._executor.submit(self._download_flight, flight_url, flight_id, download_dir)
+
+  def _download_flight(self, flight_url, flight_id, download_dir):
+    download_url = self.get_page(flight_url).link(DOWNLOAD_LINK_TEXT)
+    if download_url is None or str(flight_id) not in download_url:
+      return None
+    zip_path = os.path.join(download_dir, os.path.basename(urlparse(download_url).path))
+    os.makedirs(download_dir, exist_ok=True)
+    self._download(download_url, zip_path)
+    return zip_path
+
+  # streams the URL to the path. the file is written next to its final name and renamed once complete,
+  # like a browser download, and a download cut off halfway is started again
+  def _download(self, url, path):
+    partial_path = path + ".part"
+    for attempt in range(self.retries + 1):
+      response = self._request("GET", url, stream=True)
+      try:
+        with open(partial_path, "wb") as download_file:
+          for block in response.iter_content(chunk_size=1 << 16):
+            download_file.write(block)
+        break
+      except (requests.ConnectionError, requests.exceptions.ChunkedEncodingError):
+        if attempt == self.retries:
+          raise
+        with self._lock:
+          self.requests_retried += 1
+        time.sleep(self.backoff * 2 ** attempt)
+      finally:
+        response.close()
+    os.replace(partial_path, path)
+
+  # waits for the downloads in flight and closes the session
+  def close(self):
+    self._executor.shutdown(wait=True)
+    self.session.close()
@@ -0,0 +1,174 @@
+# a local stand-in for the Pipistrel portal, for running the HTTP scraper offline and in tests.
+# it serves a login form, the home page (the planes, then the 20 most recent flights), each plane's flight
+# list newest first with "Next" pages, flight pages with their "Download CSV file" link and the zips
+# run: python portal_stub.py <zip_dir> [--port 8000] [--plane C-GMUT] [--page-size 10]
+# every <id>.zip in zip_dir becomes a flight of the plane, flights without a zip are still processing
+import argparse
+import html
+import os
+import threading
+from datetime import datetime, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+SESSION_COOKIE = "sessionid=stub-session"
+CSRF_TOKEN = "stub-csrf-token"
+# the portal's month abbreviations
+PORTAL_MONTHS = ["Jan.", "Feb.", "March", "April", "May", "June", "July", "Aug.", "Sept.", "Oct.", "Nov.", "Dec."]
+
+# formats a datetime the way the portal's flight list shows it, e.g. "Oct. 1, 2023, 8:20 p.m." or "May 2, 2024, noon"
+def portal_datetime(value):
+  if value.hour == 0 and value.minute == 0:
+    time_text = "midnight"
+  elif value.hour == 12 and value.minute == 0:
+    time_text = "noon"
+  else:
+    minutes = f":{value.minute:02d}" if value.minute else ""
+    time_text = f"{value.hour % 12 or 12}{minutes} {'a.m.' if value.hour < 12 else 'p.m.'}"
+  return f"{PORTAL_MONTHS[value.month - 1]} {value.day}, {value.year}, {time_text}"
+
+# a flight of the stand-in portal; zip_bytes is None while the portal is processing it
+class StubFlight:
+  def __init__(self, flight_id, plane, flight_datetime, flight_type="Training", notes="", zip_bytes=None):
+    self.id = flight_id
+    self.plane = plane
+    self.datetime = flight_datetime
+    self.type = flight_type
+    self.notes = notes
+    self.zip_bytes = zip_bytes
+
+class PortalStub:
+  def __init__(self, flights, username="pilot", password="secret", page_size=10, failures=None, port=0):
+    self.flights = sorted(flights, key=lambda flight: flight.id, reverse=True)
+    self.planes = sorted({flight.plane for flight in flights})
+    self.username = username
+    self.password = password
+    self.page_size = page_size
+    # path -> how many more times it answers 503, for exercising retries
+    self.failures = dict(failures or {})
+    self.requests = []
+    self._lock = threading.Lock()
+    self.server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+    self.url = f"http://127.0.0.1:{self.server.server_address[1]}/"
+    self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+  def start(self):
+    self._thread.start()
+    return self
+
+  def stop(self):
+    self.server.shutdown()
+    self.server.server_close()
+
+  # the flight list rows, formatted the way the portal shows them
+  def _flight_rows(self, flights):
+    rows = []
+    for flight in flights:
+      rows.append(f'<tr class="clickable-aircraft" data-href="/flights/{flight.id}/"><td>{flight.id}</td>'
+                  f'<td>{portal_datetime(flight.datetime)}</td><td>{html.escape(flight.type)}</td><td>{flight.plane}</td>'
+                  f'<td>{html.escape(flight.notes)}</td></tr>')
+    return "".join(rows)
+
+  def _page(self, path, query):
+    if path == "/":
+      plane_rows = "".join(f'<tr class="clickable-aircraft" data-href="/aircraft/{index}/"><td>{plane}</td></tr>'
+                           for index, plane in enumerate(self.planes))
+      return f"<html><body><table>{plane_rows}</table><table>{self._flight_rows(self.flights[:20])}</table></body></html>"
+    parts = path.strip("/").split("/")
+    if parts[0] == "aircraft":
+      plane = self.planes[int(parts[1])]
+      flights = [flight for flight in self.flights if flight.plane == plane]
+      page = int(query.get("page", ["1"])[0])
+      shown = flights[(page - 1) * self.page_size:page * self.page_size]
+      next_link = f'<a href="?page={page + 1}">Next</a>' if page * self.page_size < len(flights) else ""
+      return (f"<html><body><table><tr><td>Registration</td><td>{plane}</td></tr></table>"
+              f"<table>{self._flight_rows(shown)}</table>{next_link}</body></html>")
+    if parts[0] == "flights":
+      flight = next(flight for flight in self.flights if flight.id == int(parts[1]))
+      link = f'<a href="/media/exports/{flight.id}.zip">Download CSV file</a>' if flight.zip_bytes is not None else \
+             "<p>Processing</p>"
+      return f"<html><body><h1>Flight {flight.id}</h1>{link}</body></html>"
+    return None
+
+  def _login_page(self):
+    return (f'<html><body><form method="post" action="/accounts/login/">'
+            f'<input type="hidden" name="csrfmiddlewaretoken" value="{CSRF_TOKEN}">'
+            f'<input type="text" name="username" id="id_username"><input type="password" name="password" id="id_password">'
+            f'<button type="submit">Sign in</button></form></body></html>')
+
+  def _handler(self):
+    stub = self
+
+    class Handler(BaseHTTPRequestHandler):
+      def log_message(self, format, *args):
+        pass
+
+      def _send(self, status, body, content_type="text/html"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+      def _failing(self, path):
+        with stub._lock:
+          stub.requests.append(path)
+          if stub.failures.get(path, 0) > 0:
+            stub.failures[path] -= 1
+            return True
+        return False
+
+      def do_GET(self):
+        url = urlparse(self.path)
+        if self._failing(url.path):
+          return self._send(503, b"busy")
+        if SESSION_COOKIE not in (self.headers.get("Cookie") or ""):
+          return self._send(200, stub._login_page().encode())
+        if url.path.startswith("/media/exports/"):
+          flight_id = int(os.path.basename(url.path)[:-4])
+          flight = next((flight for flight in stub.flights if flight.id == flight_id), None)
+          if flight is None or flight.zip_bytes is None:
+            return self._send(404, b"not found")
+          return self._send(200, flight.zip_bytes, "application/zip")
+        page = stub._page(url.path, parse_qs(url.query))
+        if page is None:
+          return self._send(404, b"not found")
+        self._send(200, page.encode())
+
+      def do_POST(self):
+        url = urlparse(self.path)
+        with stub._lock:
+          stub.requests.append(url.path)
+        form = parse_qs(self.rfile.read(int(self.headers.get("Content-Length", 0))).decode())
+        accepted = (url.path == "/accounts/login/" and form.get("csrfmiddlewaretoken") == [CSRF_TOKEN] and
+                    form.get("username") == [stub.username] and form.get("password") == [stub.password])
+        if not accepted:
+          return self._send(200, stub._login_page().encode())
+        self.send_response(302)
+        self.send_header("Location", "/")
+        self.send_header("Set-Cookie", SESSION_COOKIE + "; Path=/")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    return Handler
+
+# builds the stand-in's flights from the <id>.zip files in the folder, one per hour going back from now
+def flights_from_folder(zip_dir, plane):
+  flights = []
+  names = sorted((name for name in os.listdir(zip_dir) if name.endswith(".zip")), reverse=True)
+  for hours_ago, name in enumerate(names):
+    with open(os.path.join(zip_dir, name), "rb") as zip_file:
+      flights.append(StubFlight(int(name[:-4]), plane, datetime.now().replace(second=0, microsecond=0) -
+                                timedelta(hours=hours_ago), zip_bytes=zip_file.read()))
+  return flights
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description="Serve a folder of flight zips as a stand-in Pipistrel portal.")
+  parser.add_argument("zip_dir")
+  parser.add_argument("--port", type=int, default=8000)
+  parser.add_argument("--plane", default="C-GMUT")
+  parser.add_argument("--page-size", type=int, default=10)
+  args = parser.parse_args()
+  stub = PortalStub(flights_from_folder(args.zip_dir, args.plane), page_size=args.page_size, port=args.port)
+  print(f"Stand-in portal on {stub.url} (user pilot, password secret)")
+  stub.server.serve_forever()
@@ -1,4 +1,5 @@
 # file with database queries
+import telemetry_schema
 
 ## Create Flights Table
 CREATE_FLIGHTS = """
@@ -36,7 +37,9 @@ CREATE TABLE weather (
   sky_level_3 SMALLINT,
   sky_level_4 SMALLINT,
   weather_codes VARCHAR(12),
-  metar VARCHAR(200)
+  metar VARCHAR(200),
+  station VARCHAR(4) NOT NULL DEFAULT 'CYKF',
+  UNIQUE (station, weather_date, weather_time_utc)
 );
 """
 
@@ -45,62 +48,53 @@ CREATE TABLE weather (
 CREATE_FLIGHT_WEATHER = """
 CREATE TABLE flight_weather (
   flight_id INTEGER REFERENCES flights(id),
-  weather_id INTEGER REFERENCES weather(id)
+  weather_id INTEGER REFERENCES weather(id),
+  UNIQUE (flight_id, weather_id)
 );
 """
 
+# Create the weather coverage table
+# Purpose: record which whole days of METAR observations weather already holds for a station,
+# a day is only recorded once it is over, so [start_date, end_date) never needs downloading again
+CREATE_WEATHER_COVERAGE = """
+CREATE TABLE weather_coverage (
+  station VARCHAR(4) NOT NULL,
+  start_date DATE NOT NULL,
+  end_date DATE NOT NULL,
+  fetched_at TIMESTAMP NOT NULL DEFAULT now(),
+  CHECK (start_date < end_date)
+);
+"""
+
+# The recorded ranges overlapping [start, end) for a station
+SELECT_WEATHER_COVERAGE = """
+SELECT start_date, end_date
+FROM weather_coverage
+WHERE station = %s AND end_date > %s AND start_date < %s
+ORDER BY start_date;
+"""
+
+INSERT_WEATHER_COVERAGE = """
+INSERT INTO weather_coverage (station, start_date, end_date) VALUES (%s, %s, %s);
+"""
+
+# The archived observations of a station from start (inclusive) to end (exclusive), in time order
+SELECT_ARCHIVED_WEATHER = """
+SELECT {columns}
+FROM weather
+WHERE station = %(station)s AND weather_date >= %(start)s AND weather_date < %(end)s
+ORDER BY weather_date, weather_time_utc;
+"""
+
 CREATE_FLIGHT_WEATHER_VIEW = """
 CREATE OR REPLACE FUNCTION get_flight_data(id integer)
 RETURNS TABLE (
-    -- Replace the column names and data types with the appropriate ones from flightdata tables
-	flight_id int8,
-	time_min float8,
-	bat_1_current float8,
-	bat_1_voltage float8,
-	bat_2_current float8,
-	bat_2_voltage float8,
-	bat_1_soc float8,
-	bat_2_soc float8,
-	bat_1_soh float8,
-	bat_2_soh float8,
-	bat_1_min_cell_temp float8,
-	bat_2_min_cell_temp float8,
-	bat_1_max_cell_temp float8,
-	bat_2_max_cell_temp float8,
-	bat_1_avg_cell_temp float8 ,
-	bat_2_avg_cell_temp float8 ,
-	bat_1_min_cell_volt float8 ,
-	bat_2_min_cell_volt float8 ,
-	bat_1_max_cell_volt float8 ,
-	bat_2_max_cell_volt float8 ,
-	requested_torque float8 ,
-	motor_rpm float8 ,
-	motor_power float8 ,
-	motor_temp float8 ,
-	ias float8 ,
-	stall_warn_active float8 ,
-	inverter_temp float8 ,
-	bat_1_cooling_temp float8 ,
-	inverter_cooling_temp_1 float8 ,
-	inverter_cooling_temp_2 float8 ,
-	remaining_flight_time float8 ,
-	pressure_alt float8 ,
-	lat float8 ,
-	lng float8 ,
-	ground_speed float8 ,
-	pitch float8 ,
-	roll float8 ,
-	"time_stamp" float8 ,
-	heading float8 ,
-	stall_diff_pressure float8 ,
-	qng float8 ,
-	oat float8 ,
-	iso_leakage_current float8 
+""" + telemetry_schema.column_definitions(telemetry_schema.READ_SQL_TYPES) + """
 )
 AS
 $$
 BEGIN
-    RETURN QUERY EXECUTE format('SELECT * FROM flightdata_%s WHERE flight_id = %s',id, id);
+    RETURN QUERY EXECUTE format('SELECT """ + telemetry_schema.cast_select_list() + """ FROM flightdata_%s WHERE flight_id = %s',id, id);
 END;
 $$
 LANGUAGE plpgsql;
@@ -118,6 +112,122 @@ JOIN weather w ON fw.weather_id = w.id
 JOIN LATERAL get_flight_data(fw.flight_id) fd ON true;
 """
 
+# Create the single telemetry table that holds every flight, used when TELEMETRY_STORAGE=partitioned
+# Purpose: one table the planner can index and scan in parallel instead of one flightdata_<id> table per flight
+CREATE_FLIGHT_TELEMETRY = """
+CREATE TABLE IF NOT EXISTS flight_telemetry (
+""" + telemetry_schema.column_definitions(not_null=("flight_id",)) + """
+) PARTITION BY HASH (flight_id);
+
+DO $$
+BEGIN
+    FOR i IN 0..15 LOOP
+        EXECUTE format('CREATE TABLE IF NOT EXISTS flight_telemetry_p%s PARTITION OF flight_telemetry FOR VALUES WITH (MODULUS 16, REMAINDER %s)', i, i);
+    END LOOP;
+END;
+$$;
+
+CREATE INDEX IF NOT EXISTS flight_telemetry_flight_id_time_min_idx ON flight_telemetry (flight_id, time_min);
+"""
+
+# Same view as CREATE_FLIGHT_WEATHER_VIEW, but joined straight onto flight_telemetry instead of the LATERAL get_flight_data call.
+# The telemetry columns are cast to the types get_flight_data returns, so replacing one view with the other never changes a column type
+CREATE_FLIGHT_WEATHER_VIEW_PARTITIONED = """
+CREATE OR REPLACE VIEW flight_weather_data_view AS
+SELECT
+    fw.flight_id AS fw_flight_id,
+    ff.flight_date,
+    ff.flight_time_utc,
+    """ + telemetry_schema.cast_select_list(table="fd") + """,
+    w.*
+FROM flight_weather fw
+JOIN flights ff ON fw.flight_id = ff.id
+JOIN weather w ON fw.weather_id = w.id
+JOIN flight_telemetry fd ON fd.flight_id = fw.flight_id;
+"""
+
+# the flightdata_<id> tables that are still to be moved into flight_telemetry
+PER_FLIGHT_TELEMETRY_TABLES = """
+SELECT tablename
+FROM pg_catalog.pg_tables
+WHERE tablename ~ '^flightdata_[0-9]+$'
+ORDER BY tablename;
+"""
+
+# Temporary staging table for the weather rows matched to the flights of one scrape
+# link_order numbers the rows, flight_id is the flight each row gets linked to
+CREATE_WEATHER_STAGING = """
+CREATE TEMP TABLE weather_staging ON COMMIT DROP AS
+SELECT 0 AS link_order, 0 AS flight_id, {columns}
+FROM weather
+WITH NO DATA;
+"""
+
+# Upserts the staged weather rows on their natural key, an observation already in weather keeps its id
+# a row is only rewritten when its METAR changed, so re-scraping a day does not touch unchanged rows
+UPSERT_STAGED_WEATHER = """
+INSERT INTO weather ({columns})
+SELECT DISTINCT ON (station, weather_date, weather_time_utc) {columns}
+FROM weather_staging
+ORDER BY station, weather_date, weather_time_utc, link_order
+ON CONFLICT (station, weather_date, weather_time_utc) DO UPDATE
+SET {updates}
+WHERE weather.metar IS DISTINCT FROM EXCLUDED.metar;
+"""
+
+# Links every staged row to its weather id by natural key, pairs that are already linked are skipped
+# this runs as its own statement after the upsert so it sees the rows the upsert just inserted
+LINK_STAGED_WEATHER = """
+INSERT INTO flight_weather (flight_id, weather_id)
+SELECT DISTINCT ws.flight_id, w.id
+FROM weather_staging ws
+JOIN weather w
+  ON w.station = ws.station
+  AND w.weather_date = ws.weather_date
+  AND w.weather_time_utc = ws.weather_time_utc
+ON CONFLICT (flight_id, weather_id) DO NOTHING;
+"""
+
+# One-off compaction of a weather table filled before it had a natural key
+# the oldest row of every (station, weather_date, weather_time_utc) is kept and flight_weather is pointed at it
+ADD_WEATHER_STATION = """
+ALTER TABLE weather ADD COLUMN IF NOT EXISTS station VARCHAR(4) NOT NULL DEFAULT 'CYKF';
+"""
+
+REPOINT_DUPLICATE_WEATHER = """
+UPDATE flight_weather fw
+SET weather_id = k.keep_id
+FROM (
+  SELECT id, MIN(id) OVER (PARTITION BY station, weather_date, weather_time_utc) AS keep_id
+  FROM weather
+) k
+WHERE fw.weather_id = k.id AND k.id <> k.keep_id;
+"""
+
+DELETE_DUPLICATE_FLIGHT_WEATHER = """
+DELETE FROM flight_weather a
+USING flight_weather b
+WHERE a.flight_id = b.flight_id
+  AND a.weather_id = b.weather_id
+  AND a.ctid > b.ctid;
+"""
+
+DELETE_DUPLICATE_WEATHER = """
+DELETE FROM weather w
+USING weather k
+WHERE k.station = w.station
+  AND k.weather_date = w.weather_date
+  AND k.weather_time_utc = w.weather_time_utc
+  AND k.id < w.id;
+"""
+
+CREATE_WEATHER_KEYS = """
+CREATE UNIQUE INDEX IF NOT EXISTS weather_station_weather_date_weather_time_utc_key
+  ON weather (station, weather_date, weather_time_utc);
+CREATE UNIQUE INDEX IF NOT EXISTS flight_weather_flight_id_weather_id_key
+  ON flight_weather (flight_id, weather_id);
+"""
+
 CREATE_FORECAST = """
 CREATE TABLE forecast (
   id INTEGER PRIMARY KEY, 
@@ -163,6 +273,14 @@ union ALL
 SELECT flight_id, time_min FROM flightdata_5362;
 """
 
+CREATE_FLIGHT_ACTIVITIES_PARTITIONED = """
+CREATE TABLE flight_activities AS
+SELECT flight_id, time_min
+FROM flight_telemetry
+WHERE flight_id IN (4620, 4940, 4929, 5019, 5021, 5034, 4636, 4842, 4868, 4925, 4978, 5116, 5362)
+ORDER BY flight_id, time_min;
+"""
+
 ADD_ACTIVITY_COLUMN = """
 ALTER TABLE flight_activities
 ADD COLUMN activity VARCHAR(255) DEFAULT 'NA';
@@ -544,6 +662,237 @@ FROM flight_weather_data_view f
 LEFT JOIN flight_activities fa ON f.flight_id = fa.flight_id AND f.time_min = fa.time_min;
 """
 
+# Materialized copies of flight_weather_data_view and labeled_activities_view: plain tables indexed on the flight id,
+# refreshed flight by flight by storage.refresh_flight_views instead of recomputed on every read.
+# materialized_flights records when each flight's rows were last refreshed and from which version of its labels
+CREATE_MATERIALIZED_FLIGHTS = """
+CREATE TABLE materialized_flights (
+  flight_id INTEGER PRIMARY KEY,
+  refreshed_at TIMESTAMP NOT NULL DEFAULT clock_timestamp(),
+  label_version BIGINT
+);
+"""
+
+# The label version columns, on databases created before they were
+ADD_LABEL_VERSION_COLUMNS = """
+ALTER TABLE flight_label_versions ADD COLUMN IF NOT EXISTS version BIGINT NOT NULL DEFAULT 1;
+ALTER TABLE materialized_flights ADD COLUMN IF NOT EXISTS label_version BIGINT;
+"""
+
+CREATE_FLIGHT_WEATHER_MAT = """
+CREATE TABLE flight_weather_data_mat AS SELECT * FROM flight_weather_data_view;
+CREATE INDEX flight_weather_data_mat_flight_id_idx ON flight_weather_data_mat (fw_flight_id);
+INSERT INTO materialized_flights (flight_id)
+SELECT DISTINCT fw_flight_id FROM flight_weather_data_mat
+ON CONFLICT (flight_id) DO UPDATE SET refreshed_at = EXCLUDED.refreshed_at;
+"""
+
+# labeled_activities_view's select, read from flight_weather_data_mat
+SELECT_LABELED_ACTIVITIES_MAT = """
+SELECT
+    f.*,
+    COALESCE(fa.activity, 'TBD') AS activity
+FROM flight_weather_data_mat f
+LEFT JOIN flight_activities fa ON f.flight_id = fa.flight_id AND f.time_min = fa.time_min
+"""
+
+# The label versions are recorded before the labels are read, so a change committing in between is refreshed again
+CREATE_LABELED_ACTIVITIES_MAT = """
+UPDATE materialized_flights m SET label_version = v.version FROM flight_label_versions v WHERE v.flight_id = m.flight_id;
+CREATE TABLE labeled_activities_mat AS """ + SELECT_LABELED_ACTIVITIES_MAT + """;
+CREATE INDEX labeled_activities_mat_fw_flight_id_idx ON labeled_activities_mat (fw_flight_id);
+CREATE INDEX labeled_activities_mat_flight_id_idx ON labeled_activities_mat (flight_id);
+"""
+
+# One refresh at a time, concurrent plane workers would otherwise insert the same flights twice
+LOCK_VIEW_REFRESH = """
+SELECT pg_advisory_xact_lock(hashtext('refresh_flight_views'));
+"""
+
+# The flights whose materialized rows are stale, with their label version: linked to their weather but never
+# refreshed since, or relabeled since their last refresh. Versions only move when a relabel commits, unlike its
+# changed_at, so a relabel committing during a refresh is still caught by the next one
+SELECT_STALE_MATERIALIZED_FLIGHTS = """
+SELECT s.flight_id, v.version
+FROM flight_ingest_state s
+LEFT JOIN materialized_flights m ON m.flight_id = s.flight_id
+LEFT JOIN flight_label_versions v ON v.flight_id = s.flight_id
+WHERE s.stage = 'weather_linked' AND (m.refreshed_at IS NULL OR m.refreshed_at < s.updated_at)
+UNION
+SELECT v.flight_id, v.version
+FROM flight_label_versions v
+JOIN materialized_flights m ON m.flight_id = v.flight_id
+WHERE v.version IS DISTINCT FROM m.label_version;
+"""
+
+REFRESH_FLIGHT_WEATHER_MAT = """
+DELETE FROM flight_weather_data_mat WHERE fw_flight_id = ANY(%(ids)s);
+INSERT INTO flight_weather_data_mat SELECT * FROM flight_weather_data_view WHERE fw_flight_id = ANY(%(ids)s);
+"""
+
+REFRESH_LABELED_ACTIVITIES_MAT = """
+DELETE FROM labeled_activities_mat WHERE fw_flight_id = ANY(%(ids)s);
+INSERT INTO labeled_activities_mat """ + SELECT_LABELED_ACTIVITIES_MAT + """ WHERE f.fw_flight_id = ANY(%(ids)s);
+"""
+
+RECORD_MATERIALIZED_FLIGHTS = """
+INSERT INTO materialized_flights (flight_id, label_version)
+SELECT * FROM unnest(%(ids)s::int[], %(versions)s::bigint[])
+ON CONFLICT (flight_id) DO UPDATE SET refreshed_at = EXCLUDED.refreshed_at, label_version = EXCLUDED.label_version;
+"""
+
+# Every flight's telemetry averaged over 30 second buckets per activity, with the SOC rate of change between
+# consecutive buckets (0 for the last one), read by the statistical insights instead of grouping labeled_activities_view
+# on every call. Refreshed with the materialized views, see storage.refresh_flight_views
+CREATE_FLIGHT_ROLLUP_30S = """
+CREATE TABLE flight_rollup_30s (
+  flight_id INTEGER NOT NULL,
+  activity VARCHAR(255) NOT NULL,
+  time_min_rounded DOUBLE PRECISION NOT NULL,
+  bat_1_soc DOUBLE PRECISION,
+  bat_2_soc DOUBLE PRECISION,
+  motor_power DOUBLE PRECISION,
+  bat_1_soh DOUBLE PRECISION,
+  bat_2_soh DOUBLE PRECISION,
+  flight_date DATE,
+  soc_rate_of_change DOUBLE PRECISION,
+  PRIMARY KEY (flight_id, activity, time_min_rounded)
+);
+"""
+
+# The buckets are ordered by activity then time, like the statistical insights always read them, and the rate of change
+# runs over that order. Buckets at the same time (across an activity change) get no rate instead of a division by zero
+INSERT_FLIGHT_ROLLUP_30S = """
+INSERT INTO flight_rollup_30s
+SELECT
+    flight_id, activity, time_min_rounded, bat_1_soc, bat_2_soc, motor_power, bat_1_soh, bat_2_soh, flight_date,
+    CASE
+        WHEN LEAD(time_min_rounded) OVER w IS NULL THEN 0
+        ELSE ((LEAD(bat_1_soc + bat_2_soc) OVER w) / 2 - (bat_1_soc + bat_2_soc) / 2)
+             / NULLIF(LEAD(time_min_rounded) OVER w - time_min_rounded, 0)
+    END AS soc_rate_of_change
+FROM (
+    SELECT
+        fw_flight_id AS flight_id,
+        activity,
+        ROUND(time_min*2)/2 AS time_min_rounded,
+        AVG(bat_1_soc) AS bat_1_soc,
+        AVG(bat_2_soc) AS bat_2_soc,
+        AVG(motor_power) AS motor_power,
+        AVG(bat_1_soh) AS bat_1_soh,
+        AVG(bat_2_soh) AS bat_2_soh,
+        MIN(flight_date) AS flight_date
+    FROM labeled_activities_mat
+    WHERE bat_1_soh != 0 AND bat_2_soh != 0 {where}
+    GROUP BY fw_flight_id, activity, time_min_rounded
+) buckets
+WINDOW w AS (PARTITION BY flight_id ORDER BY activity, time_min_rounded);
+"""
+
+REFRESH_FLIGHT_ROLLUP_30S = """
+DELETE FROM flight_rollup_30s WHERE flight_id = ANY(%(ids)s);
+""" + INSERT_FLIGHT_ROLLUP_30S.format(where="AND fw_flight_id = ANY(%(ids)s)")
+
+SELECT_FLIGHT_ROLLUP_30S = """
+SELECT
+    flight_id AS fw_flight_id, activity, time_min_rounded, bat_1_soc, bat_2_soc, motor_power, bat_1_soh, bat_2_soh,
+    flight_date AS dates, soc_rate_of_change
+FROM flight_rollup_30s
+WHERE flight_id = %(id)s
+ORDER BY activity, time_min_rounded;
+"""
+
+# Every flight's battery SOH over the rows where both batteries report one: the first, last and mean value per battery
+# and how many rows they come from. Written with the flight's telemetry at ingest, see storage.soh_summaries
+CREATE_FLIGHT_SOH_SUMMARY = """
+CREATE TABLE flight_soh_summary (
+  flight_id INTEGER PRIMARY KEY REFERENCES flights(id),
+  plane VARCHAR(20),
+  flight_date DATE NOT NULL,
+  samples INTEGER NOT NULL,
+  bat_1_soh_first DOUBLE PRECISION,
+  bat_1_soh_last DOUBLE PRECISION,
+  bat_1_soh_mean DOUBLE PRECISION,
+  bat_2_soh_first DOUBLE PRECISION,
+  bat_2_soh_last DOUBLE PRECISION,
+  bat_2_soh_mean DOUBLE PRECISION
+);
+"""
+
+# The flights loaded before the SOH summaries were written at ingest, with their telemetry still in place
+SELECT_FLIGHTS_WITHOUT_SOH_SUMMARY = """
+SELECT f.id, f.flight_date, f.plane
+FROM flights f
+WHERE NOT EXISTS (SELECT 1 FROM flight_soh_summary s WHERE s.flight_id = f.id)
+  AND (%(partitioned)s OR to_regclass('flightdata_' || f.id) IS NOT NULL)
+ORDER BY f.id;
+"""
+
+# The given flights whose flightdata_<id> table exists, so a batch read never names a table that is not there
+SELECT_FLIGHTS_WITH_TELEMETRY_TABLE = """
+SELECT id
+FROM unnest(%(ids)s::int[]) AS id
+WHERE to_regclass('flightdata_' || id) IS NOT NULL;
+"""
+
+# The fleet SOH trend: the summed SOH and row count of every plane's flights per month and per week, so a period's
+# mean is its sum over its samples however many flights it has. Built from flight_soh_summary once and then added to
+# by every ingest (ADD_TO_SOH_ROLLUP), the SOH plot reads one row per plane and period
+CREATE_SOH_ROLLUP = """
+CREATE TABLE soh_rollup (
+  period VARCHAR(5) NOT NULL,
+  period_start DATE NOT NULL,
+  plane VARCHAR(20) NOT NULL,
+  flights INTEGER NOT NULL,
+  samples BIGINT NOT NULL,
+  bat_1_soh_sum DOUBLE PRECISION NOT NULL,
+  bat_2_soh_sum DOUBLE PRECISION NOT NULL,
+  PRIMARY KEY (period, period_start, plane)
+);
+"""
+
+SOH_ROLLUP_ROWS = """
+SELECT
+    p.period, DATE_TRUNC(p.period, s.flight_date)::date, COALESCE(s.plane, ''), COUNT(*), SUM(s.samples),
+    SUM(s.bat_1_soh_mean * s.samples), SUM(s.bat_2_soh_mean * s.samples)
+FROM flight_soh_summary s
+CROSS JOIN (VALUES ('month'), ('week')) AS p(period)
+WHERE s.samples > 0 {where}
+GROUP BY 1, 2, 3
+"""
+
+INSERT_SOH_ROLLUP = """
+INSERT INTO soh_rollup """ + SOH_ROLLUP_ROWS.format(where="") + ";"
+
+ADD_TO_SOH_ROLLUP = """
+INSERT INTO soh_rollup """ + SOH_ROLLUP_ROWS.format(where="AND s.flight_id = ANY(%(ids)s)") + """
+ON CONFLICT (period, period_start, plane) DO UPDATE SET
+  flights = soh_rollup.flights + EXCLUDED.flights,
+  samples = soh_rollup.samples + EXCLUDED.samples,
+  bat_1_soh_sum = soh_rollup.bat_1_soh_sum + EXCLUDED.bat_1_soh_sum,
+  bat_2_soh_sum = soh_rollup.bat_2_soh_sum + EXCLUDED.bat_2_soh_sum;
+"""
+
+# The mean SOH per month or week ('period') of the fleet, or of one plane
+SELECT_SOH_ROLLUP = """
+SELECT
+    period_start::timestamp AS flight_date,
+    SUM(bat_1_soh_sum) / SUM(samples) AS bat_1_soh,
+    SUM(bat_2_soh_sum) / SUM(samples) AS bat_2_soh
+FROM soh_rollup
+WHERE period = %(period)s AND (%(plane)s IS NULL OR plane = %(plane)s)
+GROUP BY period_start
+ORDER BY period_start;
+"""
+
+SELECT_SOH_ROLLUP_PER_PLANE = """
+SELECT
+    plane, period_start::timestamp AS flight_date, bat_1_soh_sum / samples AS bat_1_soh, bat_2_soh_sum / samples AS bat_2_soh
+FROM soh_rollup
+WHERE period = %(period)s
+ORDER BY plane, period_start;
+"""
+
 MANUAL_FLIGHTS_TO_LABEL = """
 SELECT 
     COUNT(*) = COUNT(CASE WHEN table_name IN ('flightdata_4620', 'flightdata_4929', 'flightdata_4940', 'flightdata_5019', 'flightdata_5021', 'flightdata_5034') THEN 1 END) AS all_tables_exist
@@ -554,6 +903,203 @@ WHERE
     AND table_name IN ('flightdata_4620', 'flightdata_4929', 'flightdata_4940', 'flightdata_5019', 'flightdata_5021', 'flightdata_5034')
 """
 
+# Create the scraper progress table
+# Purpose: every flight of a plane at or below last_flight_id is stored (or was never downloadable),
+# so the scraper only needs to look at the newer ones
+CREATE_SCRAPER_PLANE_PROGRESS = """
+CREATE TABLE scraper_plane_progress (
+  plane VARCHAR(20) PRIMARY KEY,
+  last_flight_id INTEGER NOT NULL,
+  updated_at TIMESTAMP NOT NULL DEFAULT now()
+);
+"""
+
+SELECT_PLANE_HIGH_WATER_MARK = """
+SELECT last_flight_id FROM scraper_plane_progress WHERE plane = %s;
+"""
+
+UPSERT_PLANE_HIGH_WATER_MARK = """
+INSERT INTO scraper_plane_progress (plane, last_flight_id) VALUES (%s, %s)
+ON CONFLICT (plane) DO UPDATE
+SET last_flight_id = GREATEST(scraper_plane_progress.last_flight_id, EXCLUDED.last_flight_id), updated_at = now();
+"""
+
+# Create the ingest state table
+# Purpose: record how far each flight got. 'loaded' is written in the same transaction as the flight's
+# telemetry, labels and flights row; 'weather_linked' in the same transaction as its weather links.
+# a scrape that stopped in between links the weather of the 'loaded' flights on its next run
+CREATE_FLIGHT_INGEST_STATE = """
+CREATE TABLE flight_ingest_state (
+  flight_id INTEGER PRIMARY KEY REFERENCES flights(id),
+  stage VARCHAR(20) NOT NULL,
+  updated_at TIMESTAMP NOT NULL DEFAULT now()
+);
+"""
+
+INSERT_INGEST_STATE = """
+INSERT INTO flight_ingest_state (flight_id, stage)
+SELECT unnest(%s::int[]), 'loaded'
+ON CONFLICT (flight_id) DO UPDATE SET stage = EXCLUDED.stage, updated_at = now();
+"""
+
+MARK_WEATHER_LINKED = """
+UPDATE flight_ingest_state SET stage = 'weather_linked', updated_at = now()
+WHERE flight_id = ANY(%s);
+"""
+
+# The flights whose weather has not been linked yet, of one plane or (with a NULL plane) of every plane
+SELECT_FLIGHTS_AWAITING_WEATHER = """
+SELECT f.id, f.flight_date, f.flight_time_utc
+FROM flight_ingest_state s
+JOIN flights f ON f.id = s.flight_id
+WHERE s.stage = 'loaded' AND (%(plane)s IS NULL OR f.plane = %(plane)s)
+ORDER BY f.id;
+"""
+
+# Session advisory locks on a flight id, held by the scrape worker ingesting it
+TRY_LOCK_FLIGHT = """
+SELECT pg_try_advisory_lock(%s, %s);
+"""
+
+UNLOCK_FLIGHT = """
+SELECT pg_advisory_unlock(%s, %s);
+"""
+
+# The stored flight ids above a plane's high-water mark, loaded once per plane by the scraper
+SELECT_FLIGHT_IDS_ABOVE = """
+SELECT id FROM flights WHERE id > %s;
+"""
+
+# When each flight's labels in flight_activities last changed and how many times, kept by the triggers of TRACK_LABEL_CHANGES.
+# changed_at is taken before the change commits, so readers compare the version: it only moves when a change commits
+CREATE_FLIGHT_LABEL_VERSIONS = """
+CREATE TABLE flight_label_versions (
+  flight_id INTEGER PRIMARY KEY,
+  changed_at TIMESTAMP NOT NULL DEFAULT clock_timestamp(),
+  version BIGINT NOT NULL DEFAULT 1
+);
+"""
+
+# Statement triggers stamping every flight whose labels are inserted, updated or deleted, whichever process
+# writes them (ingest, relabeling or by hand), and bumping its version. Transition tables take one event per trigger.
+# Concurrent changes of a flight wait on its row, so every committed change gets its own version
+TRACK_LABEL_CHANGES = """
+CREATE OR REPLACE FUNCTION record_label_change() RETURNS trigger AS $$
+BEGIN
+  IF TG_OP = 'DELETE' THEN
+    INSERT INTO flight_label_versions (flight_id, changed_at)
+    SELECT DISTINCT flight_id, clock_timestamp() FROM old_rows
+    ON CONFLICT (flight_id) DO UPDATE SET changed_at = EXCLUDED.changed_at, version = flight_label_versions.version + 1;
+  ELSE
+    INSERT INTO flight_label_versions (flight_id, changed_at)
+    SELECT DISTINCT flight_id, clock_timestamp() FROM new_rows
+    ON CONFLICT (flight_id) DO UPDATE SET changed_at = EXCLUDED.changed_at, version = flight_label_versions.version + 1;
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS flight_activities_inserted ON flight_activities;
+CREATE TRIGGER flight_activities_inserted AFTER INSERT ON flight_activities
+REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION record_label_change();
+DROP TRIGGER IF EXISTS flight_activities_updated ON flight_activities;
+CREATE TRIGGER flight_activities_updated AFTER UPDATE ON flight_activities
+REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION record_label_change();
+DROP TRIGGER IF EXISTS flight_activities_deleted ON flight_activities;
+CREATE TRIGGER flight_activities_deleted AFTER DELETE ON flight_activities
+REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION record_label_change();
+"""
+
+# What the dashboard's telemetry cache checks: the last scraper run and every flight's label version
+SELECT_LAST_SCRAPER_RUN = """
+SELECT max(runtime) FROM scraper_last_run;
+"""
+
+SELECT_LABEL_VERSIONS = """
+SELECT flight_id, version FROM flight_label_versions;
+"""
+
+# The ingest ledger: one row per scraper or bulk ingest run, and one per flight the run handled
+CREATE_INGEST_RUNS = """
+CREATE TABLE ingest_runs (
+  id SERIAL PRIMARY KEY,
+  source VARCHAR(20) NOT NULL,
+  started_at TIMESTAMP NOT NULL DEFAULT now(),
+  finished_at TIMESTAMP,
+  flights_loaded INTEGER NOT NULL DEFAULT 0,
+  flights_failed INTEGER NOT NULL DEFAULT 0,
+  stage_seconds JSONB
+);
+"""
+
+CREATE_INGEST_FLIGHT_METRICS = """
+CREATE TABLE ingest_flight_metrics (
+  run_id INTEGER NOT NULL REFERENCES ingest_runs(id),
+  flight_id INTEGER NOT NULL,
+  plane VARCHAR(20),
+  status VARCHAR(10) NOT NULL,
+  zip_bytes BIGINT,
+  rows_in INTEGER,
+  rows_out INTEGER,
+  download_s REAL,
+  parse_s REAL,
+  resample_s REAL,
+  label_s REAL,
+  db_write_s REAL,
+  weather_link_s REAL,
+  recorded_at TIMESTAMP NOT NULL DEFAULT now(),
+  PRIMARY KEY (run_id, flight_id)
+);
+"""
+
+# The plane column as wide as flights.plane, on databases created when it was VARCHAR(10)
+WIDEN_INGEST_FLIGHT_METRICS_PLANE = """
+ALTER TABLE ingest_flight_metrics ALTER COLUMN plane TYPE VARCHAR(20);
+"""
+
+INSERT_INGEST_RUN = """
+INSERT INTO ingest_runs (source) VALUES (%s) RETURNING id;
+"""
+
+FINISH_INGEST_RUN = """
+UPDATE ingest_runs SET finished_at = now(), flights_loaded = %s, flights_failed = %s, stage_seconds = %s
+WHERE id = %s;
+"""
+
+INSERT_INGEST_FLIGHT_METRICS = """
+INSERT INTO ingest_flight_metrics (run_id, flight_id, plane, status, zip_bytes, rows_in, rows_out,
+                                   download_s, parse_s, resample_s, label_s, db_write_s)
+VALUES (%(run_id)s, %(flight_id)s, %(plane)s, %(status)s, %(zip_bytes)s, %(rows_in)s, %(rows_out)s,
+        %(download_s)s, %(parse_s)s, %(resample_s)s, %(label_s)s, %(db_write_s)s)
+ON CONFLICT (run_id, flight_id) DO UPDATE SET status = EXCLUDED.status, zip_bytes = EXCLUDED.zip_bytes,
+  rows_in = EXCLUDED.rows_in, rows_out = EXCLUDED.rows_out, download_s = EXCLUDED.download_s,
+  parse_s = EXCLUDED.parse_s, resample_s = EXCLUDED.resample_s, label_s = EXCLUDED.label_s,
+  db_write_s = EXCLUDED.db_write_s, recorded_at = now();
+"""
+
+# Each flight gets an even share of the time spent linking weather to the flights of its plane
+RECORD_WEATHER_LINK_SECONDS = """
+UPDATE ingest_flight_metrics SET weather_link_s = %s
+WHERE run_id = %s AND flight_id = ANY(%s);
+"""
+
+# Throughput of every run of the last %(days)s days, oldest first: the flights, rows and bytes it loaded,
+# its rows per second of wall time and the mean seconds per flight of every stage
+SELECT_INGEST_THROUGHPUT = """
+SELECT r.id, r.source, r.started_at,
+       EXTRACT(EPOCH FROM r.finished_at - r.started_at) AS wall_s,
+       r.flights_loaded, r.flights_failed,
+       SUM(m.rows_in) AS rows_in, SUM(m.rows_out) AS rows_out, SUM(m.zip_bytes) AS zip_bytes,
+       SUM(m.rows_in) / NULLIF(EXTRACT(EPOCH FROM r.finished_at - r.started_at), 0) AS rows_per_s,
+       AVG(m.download_s) AS download_s, AVG(m.parse_s) AS parse_s, AVG(m.resample_s) AS resample_s,
+       AVG(m.label_s) AS label_s, AVG(m.db_write_s) AS db_write_s, AVG(m.weather_link_s) AS weather_link_s
+FROM ingest_runs r
+LEFT JOIN ingest_flight_metrics m ON m.run_id = r.id AND m.status = 'loaded'
+WHERE r.started_at >= now() - %(days)s * INTERVAL '1 day'
+GROUP BY r.id
+ORDER BY r.started_at;
+"""
+
 SCRAPER_RUNTIME = """
 CREATE TABLE scraper_last_run (
     runtime TIMESTAMP
@@ -0,0 +1,55 @@
+# the methods in this script downsample raw flight data into fixed width time buckets
+import numpy as np
+
+# default bucket width in minutes. 0.02 min = 1.2 seconds
+DEFAULT_BUCKET_WIDTH = 0.02
+
+# aggregation rules that can be applied per column
+AGGREGATIONS = ("mean", "min", "max", "last")
+
+# returns the start time of every bucket needed to cover [0, max_time]
+def bucket_starts(max_time, bucket_width=DEFAULT_BUCKET_WIDTH):
+  if not np.isfinite(max_time) or max_time < 0:
+    return np.empty(0)
+  # the starts are accumulated one addition at a time (cumsum is sequential), so they are
+  # bit-for-bit the same floats as adding the bucket width in a loop
+  num_buckets = int(max_time / bucket_width) + 2
+  starts = np.concatenate(([0.0], np.cumsum(np.full(num_buckets, bucket_width))))
+  return starts[starts <= max_time]
+
+# assigns every row to the bucket [start_k, start_k+1) it falls into, -1 if it is outside all buckets
+def assign_buckets(times, starts, bucket_width=DEFAULT_BUCKET_WIDTH):
+  if len(starts) == 0:
+    return np.full(len(times), -1)
+  edges = np.append(starts, starts[-1] + bucket_width)
+  buckets = np.searchsorted(edges, times, side="right") - 1
+  # rows before the first edge, past the last edge or without a time are dropped
+  outside = (buckets < 0) | (buckets >= len(starts)) | np.isnan(times)
+  buckets[outside] = -1
+  return buckets
+
+# takes in flight data df with a time_min column and aggregates it into time buckets
+# aggregations maps a column to one of AGGREGATIONS, columns not given are averaged
+def resample_flight_data(df, flight_id, bucket_width=DEFAULT_BUCKET_WIDTH, aggregations=None):
+  aggregations = aggregations or {}
+  for column, rule in aggregations.items():
+    if rule not in AGGREGATIONS:
+      raise ValueError(f"Unknown aggregation '{rule}' for column '{column}'. Use one of {AGGREGATIONS}.")
+
+  times = df["time_min"].to_numpy(dtype=float)
+  max_time = times.max() if len(times) else np.nan
+  starts = bucket_starts(max_time, bucket_width)
+  buckets = assign_buckets(times, starts, bucket_width)
+
+  # aggregate every column with its rule in one grouped pass
+  value_columns = [col for col in df.columns if col not in ("time_min", "flight_id")]
+  rules = {col: aggregations.get(col, "mean") for col in value_columns}
+  in_bucket = buckets >= 0
+  grouped = df.loc[in_bucket, value_columns].astype(float).groupby(buckets[in_bucket])
+  resampled = grouped.agg(rules)
+
+  # empty buckets are kept as all-null rows, like the original downsampling loop
+  resampled = resampled.reindex(np.arange(len(starts)))
+  resampled.insert(0, "time_min", starts)
+  resampled.insert(0, "flight_id", int(flight_id))
+  return resampled.reset_index(drop=True)
@@ -4,24 +4,36 @@ from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.support.ui import Select
 from webdriver_manager.chrome import ChromeDriverManager
 from selenium.webdriver.common.by import By
-from dotenv import load_dotenv
-import pandas as pd
-import zipfile
 import os
 import time
-import psycopg2
 import shutil
 import datetime as dt
 from datetime import datetime, date
 import re
-from transformation import transform_overview_data, weather_transformation
-from storage import table_exists, view_exists, db_connect, execute, select, push_flight_metadata, push_flight_data, push_scraper_runtime, relevant_weather
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from storage import table_exists, db_connect, db_disconnect, execute, select, push_scraper_runtime, partitioned_telemetry, \
+  plane_high_water_mark, push_plane_high_water_mark, flights_awaiting_weather, refresh_flight_views, \
+  ingested_flight_ids, create_tables, create_views, create_materialized_views
+from database import POOL_SIZE
+from ingest_pipeline import IngestPipeline
+from ingest_ledger import IngestLedger
+from weather_archive import link_archived_weather
+from download_watcher import DownloadWatcher
+from portal_client import PortalClient, PortalError, NEXT_LINK_TEXT
+import requests
 import queries
 import platform
 import pytz
 
 # Path variables
 chromedriver_path = "./dependencies/chromedriver-win64/chromedriver.exe"
+# http scrapes the portal without a browser (falling back to Chrome if that fails), selenium always uses Chrome
+SCRAPER_MODE = os.getenv('SCRAPER_MODE', 'http')
+# planes scraped at once over HTTP, each by its own worker. capped by plane_worker_limit to what the pool can serve
+SCRAPER_PLANE_WORKERS = int(os.getenv('SCRAPER_PLANE_WORKERS', 2))
+# first key of the advisory locks taken on flight ids, the flight id is the second
+FLIGHT_LOCK_NAMESPACE = 4620
 def log_last_run_time():
     # check if the scraper_last_run table exists
     conn = db_connect()
@@ -68,61 +80,31 @@ def convert_str_to_datetime(str_datetime: str):
     return datetime.strptime(str_datetime, format)
 
 # returns the relevant weather data for the given scraped flights
-def weather_data(date_list, ids_list, driver, download_dir):
-  # get the oldest date
-  oldest_datetime = min(date_list)
-  newest_date = max(date_list).date()
-  newest_day = newest_date.day
-  # extract each part of the date
-  year = oldest_datetime.strftime("%Y")
-  month = oldest_datetime.strftime("%m")
-  day = oldest_datetime.strftime("%d")
-  # get the current date, add 1 day to include today
-  current_date = date.today()
-  current_year = current_date.year
-  current_month = current_date.month
-  current_day = current_date.day + 1
-  # dynamic download url
-  weather_download_url = (
-    f"https://mesonet.agron.iastate.edu/cgi-bin/request/asos.py?"
-    f"station=CYKF&data=all&year1={year}&month1={month}&day1={day}&"
-    f"year2={current_year}&month2={current_month}&day2={current_day}&"
-    f"tz=Etc%2FUTC&format=onlycomma&latlon=no&elev=no&missing=M&trace=T&direct=yes&"
-    f"report_type=3&report_type=4"
-  )
-  # read the new data into pandas df
-  weather_data_path = os.path.join(os.getcwd(),'temp','CYKF.csv')
-
-  # get the weather data
-  driver.get(weather_download_url)
-  time_counter = 0
-  time_to_wait = 15
-  # allow 15 seconds to download the weather csv
-  while not os.path.exists(weather_data_path):
-    time.sleep(1)
-    time_counter += 1
-    if time_counter > time_to_wait:
-      break
-
-  df = pd.read_csv(weather_data_path)
-  # transform the weather_data into DB format
-  df = weather_transformation(df)
-  # map out each weather data field to a flight
-  relevant_weather(df, ids_list)
+# only the days the local weather archive is missing are downloaded, over HTTP rather than through the browser
+def weather_data(date_list, ids_list, download_dir):
+  link_archived_weather(date_list, ids_list)
 
   # delete the temp files from disk
   shutil.rmtree(download_dir,ignore_errors=True)
 
-def environment_setup():
-  # Load .env file
-  load_dotenv()
-
+# returns the download directory, emptied of anything an earlier run left in it
+def download_directory():
   # delete the temp directory if it exists
   temp_dir = os.path.join(os.getcwd(),'temp')
   if os.path.exists(temp_dir) and os.path.isdir(temp_dir):
     shutil.rmtree(temp_dir, ignore_errors=True)
   # set download directory to working directory
-  download_dir = os.path.join(os.getcwd(),'temp')
+  return temp_dir
+
+# the connection is borrowed from the shared pool for the whole scrape, give it back with db_disconnect(env['conn'])
+def environment_setup():
+  download_dir = download_directory()
+
+  # borrow a connection from the shared pool
+  conn = db_connect()
+
+  # create a cursor object for the db
+  cur = conn.cursor()
 
   chrome_options = webdriver.ChromeOptions()
 
@@ -141,16 +123,7 @@ def environment_setup():
     driver = webdriver.Chrome(service=ChromeService(chromedriver_path), options=chrome_options)
   else:
     driver = webdriver.Chrome(options=chrome_options)
-  
-  # get the connection string from the environment variable
-  connection_string = os.getenv('DATABASE_URL')
-
-  # connect to the PostgreSQL database
-  conn = psycopg2.connect(connection_string)
-
-  # create a cursor object for the db
-  cur = conn.cursor()
-  return {'driver': driver, 'cursor': cur, 'download_dir': download_dir}
+  return {'driver': driver, 'conn': conn, 'cursor': cur, 'download_dir': download_dir}
 
 def pipistrel_go_home(driver):
    # Assumes are currently logged in, goes back to home page
@@ -190,28 +163,11 @@ def get_number_of_planes(driver):
    aircraft_elements = driver.find_elements(By.CLASS_NAME, "clickable-aircraft")
    return len(aircraft_elements) - 20
 
-# create tables if they don't exist
-def create_tables():
-  table_list = ['flights', 'weather', 'flight_weather']
-  create_queries = {'flights': queries.CREATE_FLIGHTS, 
-                    'weather': queries.CREATE_WEATHER, 
-                    'flight_weather': queries.CREATE_FLIGHT_WEATHER}
-  for table in table_list:
-    conn = db_connect()
-    if not table_exists(table, conn):
-      execute(create_queries[table])
-
-# create views if they don't exist
-def create_views():
-  view_list = ['flight_weather_data_view']
-  create_queries = {'flight_weather_data_view': queries.CREATE_FLIGHT_WEATHER_VIEW}
-  for view in view_list:
-    execute(create_queries[view])
-
 # create the flight_activities table and views
 def flight_activity_tables_views():
   query_list = [queries.CREATE_FLIGHT_ACTIVITIES,
                 queries.ADD_ACTIVITY_COLUMN,
+                queries.TRACK_LABEL_CHANGES,
                 queries.LABEL_4620, queries.LABEL_4929,
                 queries.LABEL_4940, queries.LABEL_5019,
                 queries.LABEL_5021, queries.LABEL_5034,
@@ -222,139 +178,362 @@ def flight_activity_tables_views():
                 queries.LABELED_ACTIVITIES_VIEW,
                 queries.PILOT_WEIGHTS
                 ]
+  if partitioned_telemetry():
+    query_list[0] = queries.CREATE_FLIGHT_ACTIVITIES_PARTITIONED
   for query in query_list:
     execute(query)
+  create_materialized_views()
+
+# takes in the flight ids the scrape looked at and the ones it could not store, returns the plane's new
+# high-water mark: the newest id below every flight that still has to be scraped
+def next_high_water_mark(seen_ids, not_done_ids, previous):
+  done_ids = [id for id in seen_ids if not not_done_ids or id < min(not_done_ids)]
+  return max(done_ids + [previous])
+
+# checks if the scrape can stop at this page: every flight on it is known and it reaches the high-water mark
+def page_stops_scrape(page_ids, is_known, high_water_mark):
+  return bool(page_ids) and all(is_known(page_id) for page_id in page_ids) and min(page_ids) <= high_water_mark
+
+# ends the read-only transaction a lookup on the scrape's connection opened. the connection is held for the
+# whole plane, left idle in transaction it would block DDL and be cut by idle_in_transaction_session_timeout,
+# taking its session advisory locks with it. the session locks outlive the commit
+def end_read(cur):
+  cur.connection.commit()
+
+# holds session advisory locks on the flight ids one scrape worker is ingesting, on the worker's own
+# connection, so two workers (or two scraper runs) never ingest the same flight
+class FlightLocks:
+  def __init__(self, cur):
+    self.cur = cur
+    self.held = []
+
+  # takes the lock on the flight id, returns False when another worker already holds it
+  def acquire(self, flight_id):
+    self.cur.execute(queries.TRY_LOCK_FLIGHT, (FLIGHT_LOCK_NAMESPACE, int(flight_id)))
+    acquired = self.cur.fetchone()[0]
+    end_read(self.cur)
+    if acquired:
+      self.held.append(int(flight_id))
+    return acquired
+
+  # checks the flights table again once the lock is held: another run may have stored the flight and released
+  # its lock after the plane's known ids were loaded. releases the lock of a stored flight and returns True
+  def already_stored(self, flight_id):
+    stored = int(flight_id) in ingested_flight_ids([flight_id], self.cur)
+    if stored:
+      self.cur.execute(queries.UNLOCK_FLIGHT, (FLIGHT_LOCK_NAMESPACE, int(flight_id)))
+      self.held.remove(int(flight_id))
+    end_read(self.cur)
+    return stored
+
+  # releases every lock, the pooled connection must not hand them to its next user
+  def release_all(self):
+    for flight_id in self.held:
+      self.cur.execute(queries.UNLOCK_FLIGHT, (FLIGHT_LOCK_NAMESPACE, flight_id))
+    self.held = []
+    end_read(self.cur)
+
+# loads what is already stored for the plane: returns its high-water mark and a check for known flight ids.
+# flights at or below the mark are done, the stored ids above it are loaded once
+def known_flights(cur, plane):
+  high_water_mark = plane_high_water_mark(plane)
+  cur.execute(queries.SELECT_FLIGHT_IDS_ABOVE, (high_water_mark,))
+  known_ids = {row[0] for row in cur.fetchall()}
+  end_read(cur)
+  def is_known(flight_id):
+    return flight_id <= high_water_mark or flight_id in known_ids
+  return high_water_mark, is_known
+
+# takes in the cells of a flight list row (id, date, type, plane, notes) and returns its job dict for the pipeline
+def flight_job(row_data, plane):
+  return {'id': row_data[0], 'datetime': convert_str_to_datetime(row_data[1]), 'notes': row_data[4],
+          'flight_type': row_data[2], 'plane': plane}
+
+# records the download time of the future once it finishes, and returns it
+def time_download(download, pipeline, flight_id=None):
+  download_start = time.perf_counter()
+  def record_download_time(done):
+    if done.exception() is None:
+      pipeline.time_stage('download', time.perf_counter() - download_start, flight_id)
+  download.add_done_callback(record_download_time)
+  return download
+
+# hands the finished downloads to the pipeline and returns the (job, future) pairs still downloading.
+# with wait set, it waits for every download to finish or fail. flights whose download timed out or failed,
+# or that had nothing to download yet, are skipped and left for the next run
+def submit_downloads(downloads, pipeline, submitted_ids, skipped_ids, wait=False):
+  still_downloading = []
+  for job, download in downloads:
+    if not wait and not download.done():
+      still_downloading.append((job, download))
+      continue
+    try:
+      zip_path = download.result()
+    except OSError as error:
+      print(f"Skipping flight {job['id']}: {error}")
+      zip_path = None
+    if zip_path is None:
+      skipped_ids.append(int(job['id']))
+      continue
+    pipeline.submit(job, zip_path)
+    submitted_ids.append(int(job['id']))
+  return still_downloading
+
+_activity_tables_lock = threading.Lock()
+
+# waits for the plane's flights to be written, moves its high-water mark past everything that is now stored
+# and links weather to the new flights
+def finish_plane(plane, pipeline, high_water_mark, seen_ids, skipped_ids, submitted_ids, download_dir):
+  loaded_flights = pipeline.drain(plane)
+  loaded_ids = {int(flight['id']) for flight in loaded_flights}
+  not_done_ids = skipped_ids + [id for id in submitted_ids if id not in loaded_ids]
+  new_high_water_mark = next_high_water_mark(seen_ids, not_done_ids, high_water_mark)
+  if new_high_water_mark > high_water_mark:
+    push_plane_high_water_mark(plane, new_high_water_mark)
+  # flights an earlier run loaded but stopped before linking weather to are linked along with the new ones
+  resumed_flights = [flight for flight in flights_awaiting_weather(plane) if flight['id'] not in loaded_ids]
+  if resumed_flights:
+    print(f"Linking weather to {len(resumed_flights)} flights left over from an earlier run")
+  # list of dates to determine how far back to scrape weather data
+  date_list = [flight['datetime'] for flight in loaded_flights + resumed_flights]
+  # list of flight ids added to db to properly link weather to flights
+  ids_list = [flight['id'] for flight in loaded_flights + resumed_flights]
+  if ids_list:
+    start = time.perf_counter()
+    weather_data(date_list, ids_list, download_dir)
+    pipeline.record_weather_link(ids_list, time.perf_counter() - start)
+  else:
+    print("There are no new flights to push to database.")
 
-def scrape(driver, cur, download_dir):
+  # plane workers finish concurrently, only one of them may create the activity tables
+  with _activity_tables_lock:
+    conn = db_connect()
+    # check if flight_activities table exists and the manually labelled flightdata exists
+    if not table_exists('flight_activities', conn) and select(queries.MANUAL_FLIGHTS_TO_LABEL)[0]:
+      flight_activity_tables_views()
+      print("Flight activity table and view added, with six manually labelled flights, and pilot weights added")
+    # rebuild the materialized views' rows of the flights linked or relabeled since their last refresh
+    refreshed_ids = refresh_flight_views()
+    if refreshed_ids:
+      print(f"Refreshed the materialized views for {len(refreshed_ids)} flights")
+
+# pipeline is the IngestPipeline that prepares and loads the downloaded flights
+def scrape(driver, cur, download_dir, pipeline):
   # Get the plane registration info
   registration_label = driver.find_element(By.XPATH, "//td[text()='Registration']")
   registration_value = registration_label.find_element(By.XPATH, "following-sibling::td")
   plane = registration_value.text
 
-  # then get each data row for the given plane
-  rows = driver.find_elements(By.CLASS_NAME, "clickable-aircraft")
-
-  # tracks if there is a next page in the table
-  is_next_page = True
-
-  # list of dates to determine how far back to scrape weather data
-  date_list = []
-  # list of flight ids added to db to properly link weather to flights
-  ids_list = []
-
-  # get flight data while we have more pages of data to look through
-  while is_next_page:
-    
-    # Iterate over the rows and extract the data from each column
-    for row in rows:
-
-      # find all of the table elements in the given row
-      cells = row.find_elements(By.TAG_NAME, "td")
-
-      # get the data from each row into a list
-      row_data = [cell.text for cell in cells]
-      current_flight_id = row_data[0]
-      current_flight_str_datetime = row_data[1]
-      current_flight_datetime = convert_str_to_datetime(current_flight_str_datetime)
-      
-      # Used to limit the dates, in acutal code, remove this
-      #flight_date = current_flight_datetime.date()
-      #if flight_date < date(2025,6,1) or flight_date > date(2025,6,13):
-      #  continue
-      
-      current_flight_type = row_data[2]
-      current_flight_notes = row_data[4]
-
-      # query database for this flight ID
-      cur.execute('SELECT 1 FROM flights WHERE id = %s', (int(current_flight_id), ))
-      flight_id = cur.fetchone()
-
-      # if the flight id is in the database, skip this row
-      if flight_id is not None:
-          continue
-      # otherwise click on flight details
-      else:
-          # click this row
-          row.click()
+  high_water_mark, is_known = known_flights(cur, plane)
+  flight_locks = FlightLocks(cur)
+  try:
+    # every id looked at, and the ones that could not be downloaded or loaded this time
+    seen_ids = []
+    skipped_ids = []
+    submitted_ids = []
+    # (job, future) of every download not handed to the pipeline yet
+    watcher = DownloadWatcher(download_dir)
+    downloads = []
+
+    # then get each data row for the given plane
+    rows = driver.find_elements(By.CLASS_NAME, "clickable-aircraft")
+
+    # tracks if there is a next page in the table
+    is_next_page = True
+
+    # get flight data while we have more pages of data to look through
+    while is_next_page:
+      # the table is newest first, so once a whole page is known and reaches down to the high-water mark,
+      # every later page is known too. a flight left behind by an earlier run keeps the mark below it
+      page_ids = [int(row.find_element(By.TAG_NAME, "td").text) for row in rows]
+      seen_ids.extend(page_ids)
+      if page_stops_scrape(page_ids, is_known, high_water_mark):
+        break
+
+      # Iterate over the rows and extract the data from each column
+      for row in rows:
+
+        # find all of the table elements in the given row
+        cells = row.find_elements(By.TAG_NAME, "td")
+
+        # get the data from each row into a list
+        row_data = [cell.text for cell in cells]
+        current_flight_id = row_data[0]
+
+        # if the flight id is in the database, skip this row
+        if is_known(int(current_flight_id)):
+            continue
+        # or if another scraper is ingesting it
+        elif not flight_locks.acquire(current_flight_id):
+            skipped_ids.append(int(current_flight_id))
+            continue
+        # or if another scraper stored it since the plane's known ids were loaded
+        elif flight_locks.already_stored(current_flight_id):
+            continue
+        # otherwise click on flight details
+        else:
+            # click this row
+            row.click()
       
-      download_csv_link = driver.find_elements(By.LINK_TEXT, "Download CSV file")
-      # if the file is currently processing, there will be no download link, so skip this one for now
-      if not download_csv_link:
-        driver.back()
-      else:      
-        # get the download link
-        current_download_link = download_csv_link[0].get_attribute("href")
-        # check if the current filename is available, if not then continue
-        if str(current_flight_id) not in str(current_download_link):
+        download_csv_link = driver.find_elements(By.LINK_TEXT, "Download CSV file")
+        # if the file is currently processing, there will be no download link, so skip this one for now
+        if not download_csv_link:
+          skipped_ids.append(int(current_flight_id))
+          driver.back()
+        else:      
+          # get the download link
+          current_download_link = download_csv_link[0].get_attribute("href")
+          # check if the current filename is available, if not then continue
+          if str(current_flight_id) not in str(current_download_link):
+            skipped_ids.append(int(current_flight_id))
+            driver.back()
+            continue
+          current_file_name = os.path.basename(current_download_link)
+          # watch for the file, then click the link. the download finishes while the browser moves on
+          # and the finished zips are handed to the pipeline, which transforms and loads them
+          job = flight_job(row_data, plane)
+          download = time_download(watcher.expect(current_file_name), pipeline, job['id'])
+          download_csv_link[0].click()
+          downloads.append((job, download))
+          downloads = submit_downloads(downloads, pipeline, submitted_ids, skipped_ids)
           driver.back()
-          continue
-        push_flight_metadata(current_flight_id, current_flight_datetime, current_flight_notes, current_flight_type, plane)
-        ids_list.append(current_flight_id)
-        date_list.append(current_flight_datetime)   
-        current_file_name = os.path.basename(current_download_link)
-        # click the link
-        download_csv_link[0].click()
-        new_file_path = os.path.join(download_dir, current_file_name)
-        timeout = 0
-        # wait until the file downloads
-        while not os.path.exists(new_file_path):
-          time.sleep(0.05)
-          timeout += 0.05
-          # timeout the download at 25 seconds
-          if timeout == 25:
-            raise Exception("Timeout of 25 seconds reached to download. Please try again.")
-        # extract the downloaded file
-        with zipfile.ZipFile(new_file_path, 'r') as zip:
-          zip.extractall(download_dir)
-        # open all new files as pandas data frames
-        normal_data_path = new_file_path[:-4] + ".csv"
-        df = pd.read_csv(normal_data_path)
-        # transform the data into something to put into the database
-        df = transform_overview_data(df)
-        # push the flight data into the database
-        push_flight_data(df, current_flight_id, current_flight_type)
-        # delete the temp files from disk
-        shutil.rmtree(download_dir, ignore_errors=True)
-        driver.back()
         
-      # locate the row after page refresh
-      time.sleep(0.1)
-      rows = driver.find_elements(By.CLASS_NAME, "clickable-aircraft")
-
-    # check for more pages of data
-    next_page = driver.find_elements(By.LINK_TEXT, "Next")
-    # if there is, go to the next page, otherwise break
-    if next_page:
-      time.sleep(0.05)
-      next_page[0].click()
-      rows = driver.find_elements(By.CLASS_NAME, "clickable-aircraft")
-    else:
-      is_next_page = False
-      break
-  if ids_list:
-    weather_data(date_list, ids_list, driver, download_dir)
-  else:
-    print("There are no new flights to push to database.")
-
+        # locate the row after page refresh
+        time.sleep(0.1)
+        rows = driver.find_elements(By.CLASS_NAME, "clickable-aircraft")
+
+      # check for more pages of data
+      next_page = driver.find_elements(By.LINK_TEXT, "Next")
+      # if there is, go to the next page, otherwise break
+      if next_page:
+        time.sleep(0.05)
+        next_page[0].click()
+        rows = driver.find_elements(By.CLASS_NAME, "clickable-aircraft")
+      else:
+        is_next_page = False
+        break
+    # wait for the downloads still in flight, then for this plane's flights to be written
+    submit_downloads(downloads, pipeline, submitted_ids, skipped_ids, wait=True)
+    watcher.close()
+    finish_plane(plane, pipeline, high_water_mark, seen_ids, skipped_ids, submitted_ids, download_dir)
+  finally:
+    # the flights are written by now, or failed
+    flight_locks.release_all()
+
+# scrapes one plane like scrape, over HTTP and without a browser. the client's download threads fetch the
+# flight pages and zips while the flight list is read, and finished zips go to the pipeline as they arrive
+def scrape_portal(client, plane_url, cur, download_dir, pipeline):
+  page = client.get_page(plane_url)
+  plane = page.registration
+  if plane is None:
+    raise PortalError(f"no Registration found on {plane_url}")
+  high_water_mark, is_known = known_flights(cur, plane)
+  flight_locks = FlightLocks(cur)
+  seen_ids = []
+  skipped_ids = []
+  submitted_ids = []
+  downloads = []
+
+  try:
+    while page is not None:
+      page_ids = [int(row.cells[0]) for row in page.rows]
+      seen_ids.extend(page_ids)
+      if page_stops_scrape(page_ids, is_known, high_water_mark):
+        break
+      for row in page.rows:
+        if is_known(int(row.cells[0])):
+          continue
+        # another worker is ingesting this flight
+        if not flight_locks.acquire(row.cells[0]):
+          skipped_ids.append(int(row.cells[0]))
+          continue
+        # another run stored it since the plane's known ids were loaded
+        if flight_locks.already_stored(row.cells[0]):
+          continue
+        job = flight_job(row.cells, plane)
+        downloads.append((job, time_download(client.download_flight(row.href, job['id'], download_dir), pipeline, job['id'])))
+        downloads = submit_downloads(downloads, pipeline, submitted_ids, skipped_ids)
+      next_page = page.link(NEXT_LINK_TEXT)
+      page = client.get_page(next_page) if next_page else None
+
+    submit_downloads(downloads, pipeline, submitted_ids, skipped_ids, wait=True)
+    finish_plane(plane, pipeline, high_water_mark, seen_ids, skipped_ids, submitted_ids, download_dir)
+  finally:
+    # the flights are written by now, or failed
+    flight_locks.release_all()
+
+def portal_client():
+  return PortalClient(os.getenv("PIPISTREL_UI"), os.getenv("user"), os.getenv("password"))
+
+# scrapes one plane in its own worker: its own logged in session, database connection and download directory
+def scrape_plane_worker(plane_url, download_dir, pipeline):
+  client = portal_client()
   conn = db_connect()
-  # check if flight_activities table exists and the manually labelled flightdata exists
-  if not table_exists('flight_activities', conn) and select(queries.MANUAL_FLIGHTS_TO_LABEL)[0]:
-    flight_activity_tables_views()
-    print("Flight activity table and view added, with six manually labelled flights, and pilot weights added")
+  cur = conn.cursor()
+  try:
+    client.login()
+    scrape_portal(client, plane_url, cur, download_dir, pipeline)
+  finally:
+    cur.close()
+    db_disconnect(conn)
+    client.close()
+
+# takes in the wanted number of plane workers and returns how many the connection pool can serve. each worker holds
+# its own connection and borrows one more at a time (high-water mark, weather, views), and the loader thread needs one
+def plane_worker_limit(workers, pool_size=POOL_SIZE):
+  limit = max(1, min(workers, (pool_size - 1) // 2))
+  if limit < workers:
+    print(f"Scraping {limit} planes at a time, a pool of {pool_size} connections cannot serve {workers} workers")
+  return limit
+
+# logs in to the portal over HTTP and scrapes every plane, up to workers planes at a time.
+# the planes share the ingest pipeline, each drains only its own flights
+def scrape_over_http(download_dir, pipeline, workers=SCRAPER_PLANE_WORKERS):
+  client = portal_client()
+  try:
+    plane_urls = client.plane_urls(client.login())
+  finally:
+    client.close()
+  with ThreadPoolExecutor(max_workers=plane_worker_limit(workers), thread_name_prefix="plane-scraper") as executor:
+    planes = [executor.submit(scrape_plane_worker, plane_url, os.path.join(download_dir, f"plane_{index}"), pipeline)
+              for index, plane_url in enumerate(plane_urls)]
+    for plane in planes:
+      plane.result()
+
+# logs in to the portal in Chrome and scrapes every plane
+def scrape_with_browser(pipeline):
+  env = environment_setup()
+  try:
+    pipistrel_login(env['driver'])
+    get_plane_info(env['driver']) # Default first plane stuff
+    scrape(env['driver'], env['cursor'], env['download_dir'], pipeline)
+
+    # If there are more than 1 plane, then we will loop until all planes have been iterated through
+    pipistrel_go_home(env['driver'])
+    numPlanes = get_number_of_planes(env['driver'])
+
+    for i in range(numPlanes - 1):
+       get_plane_info(env['driver'], 1 + i)
+       scrape(env['driver'], env['cursor'], env['download_dir'], pipeline)
+  finally:
+    # the cursor's connection goes back to the pool only now, nothing else shares it during the scrape
+    env['cursor'].close()
+    db_disconnect(env['conn'])
 
 if __name__ == '__main__':
   log_last_run_time()
-  env = environment_setup()
-  pipistrel_login(env['driver'])
-  get_plane_info(env['driver']) # Default first plane stuff
   create_tables()
   create_views()
-  scrape(env['driver'], env['cursor'], env['download_dir'])
-     
-  # If there are more than 1 plane, then we will loop until all planes have been iterated through
-  pipistrel_go_home(env['driver'])
-  numPlanes = get_number_of_planes(env['driver'])
-  
-  for i in range(numPlanes - 1):
-     get_plane_info(env['driver'], 1 + i)
-     scrape(env['driver'], env['cursor'], env['download_dir'])
\ No newline at end of file
+  pipeline = IngestPipeline(ledger=IngestLedger('scrape').start())
+  try:
+    if SCRAPER_MODE == 'http':
+      # the browser is the fallback when the portal cannot be scraped over HTTP
+      try:
+        scrape_over_http(download_directory(), pipeline)
+      except (PortalError, requests.RequestException) as error:
+        print(f"Scraping over HTTP failed ({error}), falling back to the browser")
+        scrape_with_browser(pipeline)
+    else:
+      scrape_with_browser(pipeline)
+  finally:
+    pipeline.close()
@@ -1,27 +1,52 @@
 # this file has all commands related to storing data in the database
 
-import psycopg2
-from sqlalchemy import create_engine
-from sqlalchemy.types import Float
 import os
-from dotenv import load_dotenv
-from datetime import datetime, timedelta
+import datetime
+from database import get_connection, get_engine
 import pandas as pd
-import joblib
+from resampling import resample_flight_data, DEFAULT_BUCKET_WIDTH
+from bulk_load import copy_dataframe
+import queries
+import telemetry_schema
+from weather_matching import match_weather_to_flights, match_weather_chunks
+
+# the METAR station every weather row comes from, and the natural key of the weather table
+WEATHER_STATION = "CYKF"
+WEATHER_KEY = ("station", "weather_date", "weather_time_utc")
+# the weather readings declared NOT NULL
+WEATHER_REQUIRED_COLUMNS = ("temperature", "dewpoint", "relative_humidity", "wind_speed", "pressure_altimeter",
+                            "sea_level_pressure", "visibility")
 
 # this function creates and returns a connection to the database
+# the connection comes from the shared pool in database.py
 def db_connect():
-  # Load .env file
-  load_dotenv()
+  return get_connection()
+
+# this function checks if telemetry is stored in the single partitioned flight_telemetry table
+# (TELEMETRY_STORAGE=partitioned) instead of one flightdata_<id> table per flight (the default)
+def partitioned_telemetry():
+  return os.getenv('TELEMETRY_STORAGE', 'per_flight') == 'partitioned'
 
-  # Get the connection string from the environment variable
-  connection_string = os.getenv('DATABASE_URL')
+# returns the relation to select the given flight's telemetry from, usable anywhere a table name is
+def telemetry_source(flight_id):
+  flight_id = int(flight_id)
+  if partitioned_telemetry():
+    return f"(SELECT * FROM flight_telemetry WHERE flight_id = {flight_id}) AS flightdata_{flight_id}"
+  return f"flightdata_{flight_id}"
 
-  # Connect to the PostgreSQL database
-  conn = psycopg2.connect(connection_string)
-  return conn
+# returns one query selecting the given columns of every given flight's telemetry, each row led by its
+# flight's id as batch_flight_id and each flight's rows ordered by time_min, so any number of flights are read
+# in a single round trip. with per flight tables every given flight's table has to exist
+def telemetry_batch_query(columns, flight_ids):
+  ids = [int(flight_id) for flight_id in flight_ids]
+  column_list = ", ".join(columns)
+  if partitioned_telemetry():
+    return (f"SELECT flight_id AS batch_flight_id, {column_list} FROM flight_telemetry "
+            f"WHERE flight_id = ANY(ARRAY[{', '.join(str(id) for id in ids)}]::int[]) ORDER BY flight_id, time_min")
+  return " UNION ALL ".join(f"(SELECT {id} AS batch_flight_id, {column_list} FROM flightdata_{id} ORDER BY time_min)"
+                            for id in ids)
 
-# this function disconnects the given connection from the database
+# this function hands the given connection back to the pool
 def db_disconnect(conn):
   conn.close()
 
@@ -105,14 +130,16 @@ def select(query, params=None):
 
   return result
 
-# takes in flight metadata and pushes it to the flights table
-def push_flight_metadata(id, datetime, notes, flight_type, plane):
-  # separate date and time
-  date = datetime.date()
-  time = datetime.time()
-  insert_query = "INSERT INTO flights (id, flight_date, flight_time_utc, flight_notes, flight_type, plane) VALUES (%s, %s, %s, %s, %s, %s)"
-  values = (id, date, time, notes, flight_type, plane)
-  execute(insert_query, values)
+# streams the given df into the given table with COPY, creating the table if needed.
+# with conn given the rows are written on it as part of its open transaction, and not committed
+def bulk_insert(df, table, if_exists="append", explicit_columns=None, conn=None):
+  if conn is not None:
+    return copy_dataframe(df, table, conn, if_exists=if_exists, explicit_columns=explicit_columns, commit=False)
+  conn = db_connect()
+  try:
+    copy_dataframe(df, table, conn, if_exists=if_exists, explicit_columns=explicit_columns)
+  finally:
+    db_disconnect(conn)
 
 # push the scraper runtime to the database
 def push_scraper_runtime(time):
@@ -121,171 +148,365 @@ def push_scraper_runtime(time):
   insert_query = f"INSERT INTO scraper_last_run (runtime) VALUES ('{time}')"
   execute(insert_query)
 
-# Predicts activity for specific columns
-def predict_activity(flight_id):
-  
-    # Get the activity label model too
-    label_model_filename = 'ML_model_outputs/label_xgboost_model.joblib'
-    label_model = joblib.load(label_model_filename)
-
-    # create sqlalchemy connection
-    engine_string = "postgresql+psycopg2" + os.getenv('DATABASE_URL')[8:]
-    engine = create_engine(engine_string)
-    # Make the query
-    query = f"""SELECT flight_id AS id, 
-                    time_min AS time,
-                    ((bat_1_soc + bat_2_soc) / 2) AS soc,
-                    motor_rpm AS motor_rpm, 
-                    ((bat_1_voltage + bat_2_voltage) / 2) AS voltage,
-                    motor_power AS motor_power,
-                    pressure_alt AS pressure_altitude,
-                    ground_speed AS ground_speed,
-                    pitch AS pitch,
-                    roll AS roll,
-                    activity AS exercise, 
-                    ias AS ias, 
-                    ((bat_1_soh + bat_2_soh) / 2) AS soh, 
-                    stall_warn_active AS stall_warn_active,
-                    requested_torque AS torque,
-                    heading AS heading, 
-                    qng AS qng
-                FROM labeled_activities_view
-                WHERE flight_id={flight_id}"""
-    # Select the data based on the query
-    flight_data = pd.read_sql_query(query, engine).dropna() 
-
-    # now predict:
-    id_col = flight_data["id"]
-    flight_data.drop(columns=["id"], inplace=True)
-    predictions = label_model.predict(flight_data)
-
-    # insert the predicted values back into the x dataframe
-    flight_data['activity'] = predictions
-    flight_data['flight_id'] = id_col
-
-    # convert labels
-    labels = ['HASEL', 'NA', 'climb', 'cruise', 'descent', 'landing', 'post-flight',
-          'power off stall', 'power on stall', 'pre-flight', 'slow flight',
-          'steep turn', 'steep turns', 'takeoff']
-    flight_data['activity'] = flight_data['activity'].map(lambda x: labels[x])
-
-    # trim all columns except for the ones in flight_activities table
-    flight_activities_data = flight_data[['flight_id', 'time', 'activity']]
-    flight_activities_data = flight_activities_data.rename(columns={"time": "time_min"})
-    flight_activities_data.to_sql('flight_activities', engine, if_exists='append', index=False)
-
-    # Dispose of the connection, so we don't overuse it.
-    engine.dispose()
-
-# takes in flight data df, and pushes it to its own data table
-def push_flight_data(df, flight_id, flight_type):
-  columns = list(df.columns.values)
-  # lowercase and underscore the spaces
-  modified_columns = [col.replace(" ", "_").lower() for col in columns]
-  # fix the time columns
-  modified_columns[0] = "time_min"
-  modified_columns[36] = "time_stamp"
-  # replace the initial column names in the df
-  df = df.set_axis(modified_columns, axis="columns")
+# returns the plane's high-water mark, the newest flight id below which the scraper has nothing left to do
+def plane_high_water_mark(plane):
+  result = select(queries.SELECT_PLANE_HIGH_WATER_MARK, (plane,))
+  return result[0] if result is not None else 0
+
+# moves the plane's high-water mark up to flight_id, it never moves down
+def push_plane_high_water_mark(plane, flight_id):
+  execute(queries.UPSERT_PLANE_HIGH_WATER_MARK, (plane, int(flight_id)))
+
+# takes in a list of flight metadata dicts (id, datetime, notes, flight_type, plane)
+# and pushes all of them to the flights table with one COPY
+def push_flights_metadata(flights, conn=None):
+  flights_df = pd.DataFrame({
+    "id": [int(flight["id"]) for flight in flights],
+    "flight_date": [flight["datetime"].date() for flight in flights],
+    "flight_time_utc": [flight["datetime"].time() for flight in flights],
+    "flight_notes": [flight["notes"] for flight in flights],
+    "flight_type": [flight["flight_type"] for flight in flights],
+    "plane": [flight["plane"] for flight in flights],
+  })
+  bulk_insert(flights_df, "flights", conn=conn)
+
+# appends the given activity labels (flight_id, time_min, activity) to flight_activities
+def push_flight_activities(flight_activities_data, conn=None):
+  bulk_insert(flight_activities_data, 'flight_activities', conn=conn)
+
+# takes in a transformed flight data df (export headers or database names) and returns it in database format:
+# the columns declared in telemetry_schema in table order, a flight_id column, downsampled and cast to the
+# declared dtypes. does not touch the database
+def prepare_flight_data(df, flight_id):
+  # rename the export headers, keep only the declared columns and add the missing ones as nulls
+  df = df.rename(columns=telemetry_schema.source_names())
+  df = df.reindex(columns=telemetry_schema.column_names()[1:])
   # add the flight_id column to df
   df.insert(0, "flight_id", int(flight_id))
-  # Get the maximum time of the flight data
-  max_time = df["time_min"].to_numpy().max()
-  # timeindex is every 1.2 seconds calculated on a minute scale from 0 to 1. So 1 = 60 seconds, 0.05 = 3 seconds, 0.02 = 1.2 seconds, 0.0166 ~ 1 second
-  initial_time = 0
-  time_index = 0.02
-  end_time = 0
-  # Collecting downsampled data
-  downsampled_df = pd.DataFrame(columns=df.columns)
-  # Find the variables between the initial and final time and add them to the downsampled 
-  while end_time <= max_time:
-      end_time = end_time + time_index
-      downsampled_data = df[(df["time_min"] >= initial_time) & (df["time_min"] < end_time)].mean(skipna=True).to_dict()
-      downsampled_data["time_min"] = initial_time
-      downsampled_data["flight_id"] = int(flight_id)
-      downsampled_df.loc[len(downsampled_df)] = downsampled_data
-      initial_time = initial_time + time_index
-  # table name
-  table_name = "flightdata_" + str(flight_id)
-  # create sqlalchemy connection
-  engine_string = "postgresql+psycopg2" + os.getenv('DATABASE_URL')[8:]
-  engine = create_engine(engine_string)
-  # set column types explicitly for error prevention for empty columns
-  explicit_columns = {'lat': Float(), 'lng': Float(), 'ground_speed': Float(),
-                      'motor_temp': Float(), 'ias': Float(), 'inverter_temp': Float(),
-                      'pressure_alt': Float(), 'pitch': Float(), 'roll': Float(),
-                      'heading': Float(), 'stall_diff_pressure': Float(), 'qng': Float(),
-                      'oat': Float()}
-  # add new table to db
-  downsampled_df.to_sql(table_name, engine, if_exists="fail", index=False, dtype=explicit_columns)
-  engine.dispose()
-  if flight_type == "Flight test":
-    predict_activity(flight_id)  
-
-# query weather df for all records in between the given times
-def query_weather_df(df, date, start_time, end_time):
-  # Filter the DataFrame based on the conditions
-  # case one: time falls in the interval [start time of flight, end time of flight]
-  filtered_df = df[
-      (df['weather_date'] == date) &
-      (df['weather_time_utc'] >= start_time) &
-      (df['weather_time_utc'] <= end_time)
-  ]
-  # case two: no time within the start or end, get the closest one before
-  if filtered_df.empty:
-    df['weather_time_utc'] = pd.to_datetime(df['weather_time_utc'], format='%H:%M:%S').dt.time
-    times_before = df[(df['weather_time_utc'] < start_time) & (df['weather_date'] == date)]
-    filtered_df = times_before.loc[[times_before.index.max()]]
-  # case three: times exists within the interval, but doesnt cover all of the interval
-  else:
-    # if we missed any time in flight due to first weather data being recorded after the flight started
-    min_weather_index = filtered_df.iloc[[0]]['weather_time_utc'].index[0]
-    if filtered_df.iloc[[0]]['weather_time_utc'].values[0] > start_time:
-      # get the previous record from the original df and add it to the top of the filtered_df
-      previous_weather_reading = df.loc[[min_weather_index - 1]]
-      filtered_df = pd.concat([previous_weather_reading, filtered_df])
-  return filtered_df
-
-# creates a relationship between flight id and weather id
-def weather_flight_rel(filtered_df, flight_id):
-  # query filtered_df to get the id of all records with the needed dates and times
-  for index, row in filtered_df.iterrows():
-    weather_date = row["weather_date"]
-    weather_time_utc = row["weather_time_utc"]
-    weather_query = "SELECT id FROM weather WHERE weather_date=%s AND weather_time_utc=%s"
-    weather_values = (weather_date, weather_time_utc,)
-    # get weather id for the current record
-    current_weather_id = select(weather_query, weather_values)
-    # push these values to flight_weather table
-    flight_weather_insert_query = "INSERT INTO flight_weather (flight_id, weather_id) VALUES (%s, %s)"
-    values = (flight_id, current_weather_id[0])
-    execute(flight_weather_insert_query, values)
-
-# takes in weather dataframe and id list, queries flights to 
+  # downsample the data into 0.02 minute (1.2 second) buckets
+  downsampled_df = resample_flight_data(df, flight_id, DEFAULT_BUCKET_WIDTH, telemetry_schema.aggregations())
+  return downsampled_df.astype(telemetry_schema.storage_dtypes())
+
+# takes in a dict of flight id to prepared flight df (from prepare_flight_data)
+# and writes all of them to the telemetry storage
+def write_flight_data(flight_dfs, conn=None):
+  if partitioned_telemetry():
+    # add all of the flights' rows to the shared telemetry table in one load
+    bulk_insert(pd.concat(flight_dfs.values(), ignore_index=True), "flight_telemetry", conn=conn)
+    return
+  # set column types explicitly, so empty columns still get their declared type
+  explicit_columns = telemetry_schema.sqlalchemy_types()
+  for flight_id, downsampled_df in flight_dfs.items():
+    # each flight gets its own flightdata_<id> table
+    table_name = "flightdata_" + str(int(flight_id))
+    bulk_insert(downsampled_df, table_name, if_exists="fail", explicit_columns=explicit_columns, conn=conn)
+
+# returns the set of the given flight ids that are already in the flights table
+# a flight's row is written in the same transaction as its data, so these flights are completely ingested.
+# with cursor given the check runs on it instead of a connection borrowed from the pool
+def ingested_flight_ids(flight_ids, cursor=None):
+  if cursor is not None:
+    cursor.execute("SELECT id FROM flights WHERE id = ANY(%s)", ([int(id) for id in flight_ids],))
+    return {row[0] for row in cursor.fetchall()}
+  conn = db_connect()
+  cursor = conn.cursor()
+  try:
+    return ingested_flight_ids(flight_ids, cursor)
+  finally:
+    cursor.close()
+    db_disconnect(conn)
+
+# removes the telemetry and labels a load that crashed before ingest ran in one transaction left behind
+# for the given flights, so they can be loaded again. flights in the flights table are complete and never touched
+def clear_flight_data(flight_ids):
+  ingested = ingested_flight_ids(flight_ids)
+  ids = [int(id) for id in flight_ids if int(id) not in ingested]
+  if not ids:
+    return
+  conn = db_connect()
+  cursor = conn.cursor()
+  try:
+    if partitioned_telemetry():
+      cursor.execute("DELETE FROM flight_telemetry WHERE flight_id = ANY(%s)", (ids,))
+    else:
+      for id in ids:
+        cursor.execute(f"DROP TABLE IF EXISTS flightdata_{id}")
+    cursor.execute("SELECT to_regclass('flight_activities') IS NOT NULL")
+    if cursor.fetchone()[0]:
+      cursor.execute("DELETE FROM flight_activities WHERE flight_id = ANY(%s)", (ids,))
+    conn.commit()
+  except Exception:
+    conn.rollback()
+    raise
+  finally:
+    cursor.close()
+    db_disconnect(conn)
+
+# takes in a flight's telemetry df and returns its SOH summary (see CREATE_FLIGHT_SOH_SUMMARY): the first, last and mean
+# SOH of each battery over the rows where both report one, like the SOH plot always averaged them
+def soh_summary(df):
+  soh_df = df.loc[df["bat_1_soh"].notna() & df["bat_2_soh"].notna() & (df["bat_1_soh"] != 0) & (df["bat_2_soh"] != 0),
+                  ["time_min", "bat_1_soh", "bat_2_soh"]].sort_values("time_min")
+  summary = {"samples": len(soh_df)}
+  for column in ("bat_1_soh", "bat_2_soh"):
+    values = soh_df[column].astype("float64")
+    summary[column + "_first"] = values.iloc[0] if len(values) else None
+    summary[column + "_last"] = values.iloc[-1] if len(values) else None
+    summary[column + "_mean"] = values.mean() if len(values) else None
+  return summary
+
+# takes in flight metadata dicts (id, flight_date, plane) and their telemetry dfs by flight id,
+# and returns their flight_soh_summary rows
+def soh_summaries(flights, flight_dfs):
+  dfs = {int(id): df for id, df in flight_dfs.items()}
+  return pd.DataFrame([dict(flight_id=int(flight["id"]), plane=flight["plane"], flight_date=flight["flight_date"],
+                            **soh_summary(dfs[int(flight["id"])])) for flight in flights])
+
+# writes the given flight_soh_summary rows on conn's open transaction, and adds them to soh_rollup once it exists
+def write_soh_summaries(summaries_df, conn):
+  bulk_insert(summaries_df, "flight_soh_summary", conn=conn)
+  cursor = conn.cursor()
+  try:
+    cursor.execute("SELECT to_regclass('soh_rollup') IS NOT NULL")
+    if cursor.fetchone()[0]:
+      cursor.execute(queries.ADD_TO_SOH_ROLLUP, {"ids": [int(id) for id in summaries_df["flight_id"]]})
+  finally:
+    cursor.close()
+
+# writes the SOH summaries of the flights loaded before they were written at ingest, batch_size flights at a time.
+# flights without SOH rows get an empty summary, so every flight is only read once
+def backfill_soh_summaries(batch_size=50):
+  flights_df = pd.read_sql_query(queries.SELECT_FLIGHTS_WITHOUT_SOH_SUMMARY, get_engine(),
+                                 params={"partitioned": partitioned_telemetry()})
+  flights = [{"id": int(row.id), "flight_date": row.flight_date, "plane": row.plane}
+             for row in flights_df.itertuples(index=False)]
+  for start in range(0, len(flights), batch_size):
+    batch = flights[start:start + batch_size]
+    soh_df = pd.read_sql_query(telemetry_batch_query(["time_min", "bat_1_soh", "bat_2_soh"],
+                                                     [flight["id"] for flight in batch]), get_engine())
+    flight_dfs = {flight["id"]: soh_df[soh_df["batch_flight_id"] == flight["id"]] for flight in batch}
+    conn = db_connect()
+    try:
+      write_soh_summaries(soh_summaries(batch, flight_dfs), conn)
+      conn.commit()
+    except Exception:
+      conn.rollback()
+      raise
+    finally:
+      db_disconnect(conn)
+  if flights:
+    print(f"Wrote the SOH summaries of {len(flights)} earlier flights")
+
+# takes in the job dicts of a batch of prepared flights, their telemetry dfs by flight id and their activity
+# labels (or None), and writes the telemetry, the labels, the flights rows, their SOH summaries and their 'loaded'
+# ingest state in one transaction. a crash before the commit leaves nothing behind, so the flights are simply loaded again
+def ingest_flights(jobs, flight_dfs, labels_df=None):
+  flight_ids = [int(job['id']) for job in jobs]
+  # rows left by a load from before ingest was transactional
+  clear_flight_data(flight_ids)
+  conn = db_connect()
+  cursor = conn.cursor()
+  try:
+    write_flight_data(flight_dfs, conn)
+    if labels_df is not None:
+      push_flight_activities(labels_df, conn)
+    push_flights_metadata(jobs, conn)
+    write_soh_summaries(soh_summaries([{"id": job["id"], "flight_date": job["datetime"].date(), "plane": job["plane"]}
+                                       for job in jobs], flight_dfs), conn)
+    cursor.execute(queries.INSERT_INGEST_STATE, (flight_ids,))
+    conn.commit()
+  except Exception:
+    conn.rollback()
+    raise
+  finally:
+    cursor.close()
+    db_disconnect(conn)
+
+# returns the flights of the plane (of every plane without one) that were loaded but have no weather linked yet,
+# as dicts with their id and start datetime
+def flights_awaiting_weather(plane=None):
+  conn = db_connect()
+  cursor = conn.cursor()
+  try:
+    cursor.execute(queries.SELECT_FLIGHTS_AWAITING_WEATHER, {"plane": plane})
+    return [{'id': row[0], 'datetime': datetime.datetime.combine(row[1], row[2])} for row in cursor.fetchall()]
+  finally:
+    cursor.close()
+    db_disconnect(conn)
+
+# brings flight_weather_data_mat, labeled_activities_mat and flight_rollup_30s up to date: the flights linked to their weather
+# since their last refresh and the relabeled ones are rebuilt from the views in one transaction, nothing else
+# is touched. returns the refreshed flight ids
+def refresh_flight_views():
+  conn = db_connect()
+  cursor = conn.cursor()
+  try:
+    cursor.execute("SELECT to_regclass('flight_weather_data_mat') IS NOT NULL, to_regclass('labeled_activities_mat') IS NOT NULL, "
+                   "to_regclass('flight_rollup_30s') IS NOT NULL")
+    weather_mat_exists, labeled_mat_exists, rollup_exists = cursor.fetchone()
+    if not weather_mat_exists:
+      return []
+    cursor.execute(queries.LOCK_VIEW_REFRESH)
+    cursor.execute(queries.SELECT_STALE_MATERIALIZED_FLIGHTS)
+    stale = cursor.fetchall()
+    flight_ids = [row[0] for row in stale]
+    if flight_ids:
+      cursor.execute(queries.REFRESH_FLIGHT_WEATHER_MAT, {"ids": flight_ids})
+      if labeled_mat_exists:
+        cursor.execute(queries.REFRESH_LABELED_ACTIVITIES_MAT, {"ids": flight_ids})
+      if rollup_exists:
+        cursor.execute(queries.REFRESH_FLIGHT_ROLLUP_30S, {"ids": flight_ids})
+      cursor.execute(queries.RECORD_MATERIALIZED_FLIGHTS, {"ids": flight_ids, "versions": [row[1] for row in stale]})
+    conn.commit()
+    return flight_ids
+  except Exception:
+    conn.rollback()
+    raise
+  finally:
+    cursor.close()
+    db_disconnect(conn)
+
+# returns the start (UTC datetime) and duration in minutes of every given flight, in one query
+def flight_windows(id_list):
+  durations = " UNION ALL ".join(f"SELECT {int(id)} AS flight_id, MAX(time_min) AS duration_min FROM {telemetry_source(id)}"
+                                 for id in id_list)
+  query = f"""SELECT f.id AS flight_id, f.flight_date, f.flight_time_utc, d.duration_min
+              FROM flights f
+              JOIN ({durations}) d ON d.flight_id = f.id"""
+  flights_df = pd.read_sql_query(query, get_engine())
+  flights_df["start"] = pd.to_datetime(flights_df["flight_date"].astype(str) + " " + flights_df["flight_time_utc"].astype(str))
+  return flights_df[["flight_id", "start", "duration_min"]]
+
+# the weather columns of the given rows (with the station added if missing), their quoted column list
+# and the SET list refreshing an existing observation; the key columns never change
+def weather_upsert_columns(weather_df):
+  if "station" not in weather_df.columns:
+    weather_df = weather_df.assign(station=WEATHER_STATION)
+  columns = ", ".join(f'"{col}"' for col in weather_df.columns)
+  updates = ", ".join(f'"{col}" = EXCLUDED."{col}"' for col in weather_df.columns if col not in WEATHER_KEY)
+  return weather_df, columns, updates
+
+# stages the given rows (link_order, flight_id, then the weather columns) and upserts them into weather,
+# linking them to their flights too when link is set. the given linked flights are marked weather_linked.
+# all of it runs in one transaction
+def upsert_staged_weather(staged_df, columns, updates, link, linked_ids=()):
+  conn = db_connect()
+  cursor = conn.cursor()
+  try:
+    if not staged_df.empty:
+      cursor.execute(queries.CREATE_WEATHER_STAGING.format(columns=columns))
+      copy_dataframe(staged_df, "weather_staging", conn, commit=False)
+      cursor.execute(queries.UPSERT_STAGED_WEATHER.format(columns=columns, updates=updates))
+      if link:
+        cursor.execute(queries.LINK_STAGED_WEATHER)
+    if linked_ids:
+      cursor.execute(queries.MARK_WEATHER_LINKED, ([int(id) for id in linked_ids],))
+    conn.commit()
+  except Exception:
+    conn.rollback()
+    raise
+  finally:
+    cursor.close()
+    db_disconnect(conn)
+
+# takes in the weather rows matched to each flight (a flight_id column plus the weather columns),
+# upserts them into the weather table and links them to their flights in one transaction.
+# an observation shared by overlapping flights is stored once and linked to each of them.
+# flight_ids are the flights the rows were matched for, they are marked weather_linked in the same transaction
+# (including those no observation matched). rows missing one of the NOT NULL readings are skipped like in
+# store_weather, so one incomplete observation does not fail every flight of the call
+def link_weather_to_flights(matched_df, flight_ids=()):
+  matched_df = matched_df.dropna(subset=[col for col in WEATHER_REQUIRED_COLUMNS if col in matched_df.columns])
+  if matched_df.empty and not flight_ids:
+    return
+  weather_df, columns, updates = weather_upsert_columns(matched_df.drop(columns=["flight_id"]))
+  staged_df = matched_df[["flight_id"]].astype(int)
+  staged_df.insert(0, "link_order", range(1, len(matched_df) + 1))
+  staged_df = pd.concat([staged_df.reset_index(drop=True), weather_df.reset_index(drop=True)], axis=1)
+  upsert_staged_weather(staged_df, columns, updates, link=True, linked_ids=flight_ids)
+
+# takes in weather rows that are not tied to any flight (a day of the METAR archive) and upserts them
+# into weather. rows missing one of the NOT NULL readings are skipped, returns the number of rows stored
+def store_weather(weather_df):
+  weather_df = weather_df.dropna(subset=list(WEATHER_REQUIRED_COLUMNS))
+  if weather_df.empty:
+    return 0
+  weather_df, columns, updates = weather_upsert_columns(weather_df.reset_index(drop=True))
+  staged_df = pd.DataFrame({"link_order": range(1, len(weather_df) + 1), "flight_id": 0})
+  staged_df = pd.concat([staged_df, weather_df], axis=1)
+  upsert_staged_weather(staged_df, columns, updates, link=False)
+  return len(weather_df)
+
+# takes in weather dataframe (or time-ordered chunks of one) and id list, queries flights to
 # determine which weather data corresponds to which flight
 def relevant_weather(df, id_list):
-  id_query = "SELECT flight_date, flight_time_utc FROM flights WHERE id= %s"
-  # loop through each id and get the flight date and time
-  for id in id_list:
-    flight_info = select(id_query, (id,))
-    current_date = flight_info[0]
-    current_time = flight_info[1]
-    # query how long this flight was in minutes
-    flight_len_query = "SELECT MAX(time_min) FROM flightdata_" + str(id)
-    flight_len = select(flight_len_query)
-    datetime_obj = datetime.combine(current_date, current_time)
-    # calculate the end time of the flight
-    flight_end_datetime = datetime_obj + timedelta(minutes=flight_len[0])
-    flight_end_time = flight_end_datetime.time()
-    # given the start and end times, query the weather df for all records in that time period
-    filtered_df = query_weather_df(df, current_date, current_time, flight_end_time)
-    # create sqlalchemy connection
-    engine_string = "postgresql+psycopg2" + os.getenv('DATABASE_URL')[8:]
-    engine = create_engine(engine_string)
-    # insert new weather data into weather table
-    filtered_df.to_sql("weather", engine, if_exists="append", index=False)
-    # create relationship between flight and newly added weather data
-    weather_flight_rel(filtered_df, id)
-    engine.dispose()
+  if not id_list:
+    return
+  # get the start and length of every flight, then match all of them to the weather in one pass
+  flights_df = flight_windows(id_list)
+  if isinstance(df, pd.DataFrame):
+    matched_df = match_weather_to_flights(flights_df, df)
+  else:
+    matched_df = match_weather_chunks(flights_df, df)
+  # insert the new weather data and create the relationships between flights and weather in one go
+  link_weather_to_flights(matched_df, id_list)
+
+# create tables if they don't exist
+def create_tables():
+  table_list = ['flights', 'weather', 'flight_weather', 'weather_coverage', 'scraper_plane_progress',
+                'flight_ingest_state', 'ingest_runs', 'ingest_flight_metrics', 'flight_label_versions',
+                'materialized_flights', 'flight_soh_summary']
+  create_queries = {'flights': queries.CREATE_FLIGHTS, 
+                    'weather': queries.CREATE_WEATHER, 
+                    'flight_weather': queries.CREATE_FLIGHT_WEATHER,
+                    'weather_coverage': queries.CREATE_WEATHER_COVERAGE,
+                    'scraper_plane_progress': queries.CREATE_SCRAPER_PLANE_PROGRESS,
+                    'flight_ingest_state': queries.CREATE_FLIGHT_INGEST_STATE,
+                    'ingest_runs': queries.CREATE_INGEST_RUNS,
+                    'ingest_flight_metrics': queries.CREATE_INGEST_FLIGHT_METRICS,
+                    'flight_label_versions': queries.CREATE_FLIGHT_LABEL_VERSIONS,
+                    'materialized_flights': queries.CREATE_MATERIALIZED_FLIGHTS,
+                    'flight_soh_summary': queries.CREATE_FLIGHT_SOH_SUMMARY}
+  if partitioned_telemetry():
+    table_list.append('flight_telemetry')
+    create_queries['flight_telemetry'] = queries.CREATE_FLIGHT_TELEMETRY
+  for table in table_list:
+    conn = db_connect()
+    if not table_exists(table, conn):
+      execute(create_queries[table])
+  execute(queries.ADD_LABEL_VERSION_COLUMNS)
+  execute(queries.WIDEN_INGEST_FLIGHT_METRICS_PLANE)
 
+# create views if they don't exist
+def create_views():
+  view_list = ['flight_weather_data_view']
+  create_queries = {'flight_weather_data_view': queries.CREATE_FLIGHT_WEATHER_VIEW}
+  if partitioned_telemetry():
+    create_queries['flight_weather_data_view'] = queries.CREATE_FLIGHT_WEATHER_VIEW_PARTITIONED
+  for view in view_list:
+    execute(create_queries[view])
+  # stamp label changes for the dashboard's telemetry cache, on databases labeled before it had the triggers
+  if table_exists('flight_activities', db_connect()):
+    execute(queries.TRACK_LABEL_CHANGES)
+  create_materialized_views()
 
+# create the materialized copies of the views if they don't exist, the first time from every flight.
+# labeled_activities_mat needs flight_activities, so it is created once labeled_activities_view is,
+# and flight_rollup_30s is built from labeled_activities_mat. soh_rollup is built once every flight has its SOH summary,
+# ingest adds to it after that
+def create_materialized_views():
+  if not table_exists('flight_weather_data_mat', db_connect()):
+    execute(queries.CREATE_FLIGHT_WEATHER_MAT)
+    print("Materialized flight_weather_data_view into flight_weather_data_mat")
+  if view_exists('labeled_activities_view', db_connect()) and not table_exists('labeled_activities_mat', db_connect()):
+    execute(queries.CREATE_LABELED_ACTIVITIES_MAT)
+    print("Materialized labeled_activities_view into labeled_activities_mat")
+  if table_exists('labeled_activities_mat', db_connect()) and not table_exists('flight_rollup_30s', db_connect()):
+    execute(queries.CREATE_FLIGHT_ROLLUP_30S)
+    execute(queries.INSERT_FLIGHT_ROLLUP_30S.format(where=""))
+    print("Built the 30 second rollup of every flight into flight_rollup_30s")
+  backfill_soh_summaries()
+  if not table_exists('soh_rollup', db_connect()):
+    execute(queries.CREATE_SOH_ROLLUP)
+    execute(queries.INSERT_SOH_ROLLUP)
+    print("Built the monthly and weekly SOH rollup of every flight into soh_rollup")
@@ -0,0 +1,113 @@
+# this file declares every stored telemetry column in one place
+# the export reader, resampling, the COPY column types, the telemetry table and function definitions
+# and the dashboard's column choices are all generated from TELEMETRY_COLUMNS
+from collections import namedtuple
+import numpy as np
+from sqlalchemy.types import BigInteger, Float
+
+# name: database column, source: export csv header (leading spaces stripped), dtype: numpy dtype it is stored as,
+# unit: unit of the values, label: dashboard label, aggregate_label: dashboard label of the aggregate choice
+# (columns sharing one are averaged together, None leaves the column out), aggregation: resampling rule
+TelemetryColumn = namedtuple("TelemetryColumn", ["name", "source", "dtype", "unit", "label", "aggregate_label", "aggregation"])
+
+# float32 keeps 7 significant digits, plenty for the sensor readings. time, position and the
+# epoch time stamp need float64. changing a dtype here changes the type new telemetry is stored as
+TELEMETRY_COLUMNS = [
+  TelemetryColumn("flight_id", None, "int64", None, "Flight ID", "Flight ID", None),
+  TelemetryColumn("time_min", "time(min)", "float64", "min", "Time (Min)", "Time (min)", None),
+  TelemetryColumn("bat_1_current", "bat 1 current", "float32", "amp", "Bat 1 Current (amp)", "Current (Amp)", "mean"),
+  TelemetryColumn("bat_1_voltage", "bat 1 voltage", "float32", "volts", "Bat 1 Voltage (volts)", "Voltage (Volts)", "mean"),
+  TelemetryColumn("bat_2_current", "bat 2 current", "float32", "amp", "Bat 2 Current (amp)", "Current (Amp)", "mean"),
+  TelemetryColumn("bat_2_voltage", "bat 2 voltage", "float32", "volts", "Bat 2 Voltage (volts)", "Voltage (Volts)", "mean"),
+  TelemetryColumn("bat_1_soc", "bat 1 soc", "float32", "percent", "Bat 1 SOC (Percent)", "State-of-Charge (Percent)", "mean"),
+  TelemetryColumn("bat_2_soc", "bat 2 soc", "float32", "percent", "Bat 2 SOC (Percent)", "State-of-Charge (Percent)", "mean"),
+  TelemetryColumn("bat_1_soh", "bat 1 soh", "float32", "percent", "Bat 1 SOH (Percent)", "State-of-Health (Percent)", "mean"),
+  TelemetryColumn("bat_2_soh", "bat 2 soh", "float32", "percent", "Bat 2 SOH (Percent)", "State-of-Health (Percent)", "mean"),
+  TelemetryColumn("bat_1_min_cell_temp", "bat 1 min cell temp", "float32", "°C", "Bat 1 Min Cell Temp (°C)", "Minimum Cell Temperature (°C)", "mean"),
+  TelemetryColumn("bat_2_min_cell_temp", "bat 2 min cell temp", "float32", "°C", "Bat 2 Min Cell Temp (°C)", "Minimum Cell Temperature (°C)", "mean"),
+  TelemetryColumn("bat_1_max_cell_temp", "bat 1 max cell temp", "float32", "°C", "Bat 1 Max Cell Temp (°C)", "Maximum Cell Temperature (°C)", "mean"),
+  TelemetryColumn("bat_2_max_cell_temp", "bat 2 max cell temp", "float32", "°C", "Bat 2 Max Cell Temp (°C)", "Maximum Cell Temperature (°C)", "mean"),
+  TelemetryColumn("bat_1_avg_cell_temp", "bat 1 avg cell temp", "float32", "°C", "Bat 1 Avg Cell Temp (°C)", "Average Cell Temperature (°C)", "mean"),
+  TelemetryColumn("bat_2_avg_cell_temp", "bat 2 avg cell temp", "float32", "°C", "Bat 2 Avg Cell Temp (°C)", "Average Cell Temperature (°C)", "mean"),
+  TelemetryColumn("bat_1_min_cell_volt", "bat 1 min cell volt", "float32", "volts", "Bat 1 Min Cell Volt (volts)", "Minimum Cell Volt (Volts)", "mean"),
+  TelemetryColumn("bat_2_min_cell_volt", "bat 2 min cell volt", "float32", "volts", "Bat 2 Min Cell Volt (volts)", "Minimum Cell Volt (Volts)", "mean"),
+  TelemetryColumn("bat_1_max_cell_volt", "bat 1 max cell volt", "float32", "volts", "Bat 1 Max Cell Volt (volts)", "Maximum Cell Volt (Volts)", "mean"),
+  TelemetryColumn("bat_2_max_cell_volt", "bat 2 max cell volt", "float32", "volts", "Bat 2 Max Cell Volt (volts)", "Maximum Cell Volt (Volts)", "mean"),
+  TelemetryColumn("requested_torque", "requested torque", "float32", "Nm", "Requested Torque (Nm)", "Requested Torque (Nm)", "mean"),
+  TelemetryColumn("motor_rpm", "motor rpm", "float32", "rpm", "Motor RPM (rpm)", "Motor RPM (rpm)", "mean"),
+  TelemetryColumn("motor_power", "motor power", "float32", "KW", "Motor Power (KW)", "Motor Power (KW)", "mean"),
+  TelemetryColumn("motor_temp", "motor temp", "float32", "°C", "Motor Temp (°C)", "Motor Temperature (°C)", "mean"),
+  TelemetryColumn("ias", "IAS", "float32", "knots", "Indicated Air Speed (knots)", "Indicated Air Speed (Knots)", "mean"),
+  TelemetryColumn("stall_warn_active", "stall_warn_active", "float32", "0/1", "Stall Warn Active (0/1)", "Stall Warn Active (0/1)", "mean"),
+  TelemetryColumn("inverter_temp", "inverter temp", "float32", "°C", "Inverter Temp (°C)", "Inverter Temp (°C)", "mean"),
+  TelemetryColumn("bat_1_cooling_temp", "bat 1 cooling temp", "float32", "°C", "Bat 1 Cooling Temp (°C)", "Bat 1 Cooling Temp (°C)", "mean"),
+  TelemetryColumn("inverter_cooling_temp_1", "inverter cooling temp 1", "float32", "°C", "Inverter Cooling Temp 1 (°C)", "Inverter Cooling Temperature (°C)", "mean"),
+  TelemetryColumn("inverter_cooling_temp_2", "inverter cooling temp 2", "float32", "°C", "Inverter Cooling Temp 2 (°C)", "Inverter Cooling Temperature (°C)", "mean"),
+  TelemetryColumn("remaining_flight_time", "remaining flight time", "float32", None, "Remaining Flight Time", "Remaining Flight Time", "mean"),
+  TelemetryColumn("pressure_alt", "PRESSURE_ALT", "float32", "m", "Pressure Altitude (m)", "Pressure Altitude (Meters)", "mean"),
+  TelemetryColumn("lat", "LAT", "float64", "degrees", "Latitude (Degrees)", "Latitude (Degrees)", "mean"),
+  TelemetryColumn("lng", "LNG", "float64", "degrees", "Longitude (Degrees)", "Longitude (Degrees)", "mean"),
+  TelemetryColumn("ground_speed", "GROUND_SPEED", "float32", "knots", "Ground Speed (knots)", "Ground Speed (Knots)", "mean"),
+  TelemetryColumn("pitch", "PITCH", "float32", "degrees", "Pitch (Degrees)", "Pitch (Degrees)", "mean"),
+  TelemetryColumn("roll", "ROLL", "float32", "degrees", "Roll (Degrees)", "Roll (Degrees)", "mean"),
+  TelemetryColumn("time_stamp", "TIMESTAMP", "float64", "seconds", "Time Stamp (Seconds)", None, "mean"),
+  TelemetryColumn("heading", "HEADING", "float32", "degrees", "Heading (Degrees)", "Heading (Degrees)", "mean"),
+  TelemetryColumn("stall_diff_pressure", "STALL_DIFF_PRESSURE", "float32", "Pa", "Stall Diff Pressure (Pa)", "Stall Diff Pressure (Pa)", "mean"),
+  TelemetryColumn("qng", "QNG", "float32", "hPa", "QNG (hPa)", "QNG (hPa)", "mean"),
+  TelemetryColumn("oat", "OAT", "float32", "°C", "Outside Air Temperature (°C)", "Outside Air Temperature (°C)", "mean"),
+  TelemetryColumn("iso_leakage_current", "ISO leakage current", "float32", None, "ISO Leakage Current", "ISO Leakage Current", "mean"),
+]
+
+# the postgres and sqlalchemy types of each dtype
+SQL_TYPES = {"int64": "int8", "float64": "float8", "float32": "float4"}
+# what get_flight_data returns, always float8 so the function and the views on it never change type
+READ_SQL_TYPES = {"int64": "int8", "float64": "float8", "float32": "float8"}
+SQLALCHEMY_TYPES = {"int64": BigInteger, "float64": lambda: Float(precision=53), "float32": lambda: Float(precision=24)}
+
+# the database column names, in table order
+def column_names():
+  return [column.name for column in TELEMETRY_COLUMNS]
+
+# the columns read from the export csv, mapped from their header to their database name
+def source_names():
+  return {column.source: column.name for column in TELEMETRY_COLUMNS if column.source is not None}
+
+# the numpy dtype of every column read from the export csv, by header
+def source_dtypes():
+  return {column.source: np.dtype(column.dtype) for column in TELEMETRY_COLUMNS if column.source is not None}
+
+# the resampling rule of every value column
+def aggregations():
+  return {column.name: column.aggregation for column in TELEMETRY_COLUMNS if column.aggregation is not None}
+
+# the numpy dtype of every column, by database name
+def storage_dtypes():
+  return {column.name: column.dtype for column in TELEMETRY_COLUMNS}
+
+# the sqlalchemy type of every column, used when COPY creates a flightdata_<id> table
+def sqlalchemy_types():
+  return {column.name: SQLALCHEMY_TYPES[column.dtype]() for column in TELEMETRY_COLUMNS}
+
+# the column definitions for a CREATE TABLE or RETURNS TABLE, one per line
+def column_definitions(sql_types=SQL_TYPES, not_null=(), indent="\t"):
+  return ",\n".join(f'{indent}"{column.name}" {sql_types[column.dtype]}' + (" NOT NULL" if column.name in not_null else "")
+                     for column in TELEMETRY_COLUMNS)
+
+# a select list casting every column to the given types, so tables stored with any of the types line up.
+# with table given the columns are read from that table (or alias) and keep their names
+def cast_select_list(sql_types=READ_SQL_TYPES, table=None):
+  if table is None:
+    return ", ".join(f'"{column.name}"::{sql_types[column.dtype]}' for column in TELEMETRY_COLUMNS)
+  return ", ".join(f'{table}."{column.name}"::{sql_types[column.dtype]} AS "{column.name}"' for column in TELEMETRY_COLUMNS)
+
+# the dashboard's granular choices: label -> [column]
+def granular_choices():
+  return {column.label: [column.name] for column in TELEMETRY_COLUMNS}
+
+# the dashboard's aggregate choices: label -> the columns averaged for it
+def aggregate_choices():
+  choices = {}
+  for column in TELEMETRY_COLUMNS:
+    if column.aggregate_label is not None:
+      choices.setdefault(column.aggregate_label, []).append(column.name)
+  return choices
@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+import activity_labeling
+
+class FakeLabelModel:
+  def __init__(self):
+    self.calls = []
+
+  def predict(self, features):
+    self.calls.append(features)
+    # label every row as takeoff
+    return np.full(len(features), activity_labeling.ACTIVITY_LABELS.index('takeoff'))
+
+def flight_df(flight_id, rows):
+  time_min = np.arange(rows) * 0.02
+  df = pd.DataFrame({"flight_id": flight_id, "time_min": time_min})
+  for col in ["bat_1_soc", "bat_2_soc", "motor_rpm", "bat_1_voltage", "bat_2_voltage", "motor_power",
+              "pressure_alt", "ground_speed", "pitch", "roll", "ias", "bat_1_soh", "bat_2_soh",
+              "stall_warn_active", "requested_torque", "heading", "qng", "oat"]:
+    df[col] = 1.0
+  return df
+
+def test_label_features_are_in_training_order_and_drop_incomplete_rows():
+  df = flight_df(4620, 4)
+  df.loc[1, "bat_2_soc"] = np.nan
+  df.loc[2, "oat"] = np.nan
+  features = activity_labeling.label_features(df)
+  assert list(features.columns[2:]) == activity_labeling.LABEL_FEATURES
+  assert features["time_min"].tolist() == [0.0, 0.04, 0.06]
+
+def test_predict_activities_labels_all_flights_in_one_call(monkeypatch):
+  model = FakeLabelModel()
+  monkeypatch.setattr(activity_labeling, "_label_model", model)
+  labels_df = activity_labeling.predict_activities([flight_df(4620, 3), flight_df(4929, 2)])
+  assert len(model.calls) == 1
+  assert list(model.calls[0].columns) == activity_labeling.LABEL_FEATURES
+  assert list(labels_df.columns) == ["flight_id", "time_min", "activity"]
+  assert labels_df["flight_id"].tolist() == [4620, 4620, 4620, 4929, 4929]
+  assert set(labels_df["activity"]) == {"takeoff"}
+
+def test_label_model_is_loaded_once(monkeypatch):
+  loads = []
+  monkeypatch.setattr(activity_labeling, "_label_model", None)
+  monkeypatch.setattr(activity_labeling.joblib, "load", lambda path: loads.append(path) or FakeLabelModel())
+  first = activity_labeling.get_label_model()
+  assert activity_labeling.get_label_model() is first
+  assert loads == [activity_labeling.LABEL_MODEL_PATH]
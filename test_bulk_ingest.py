@@ -0,0 +1,23 @@
+import datetime
+import bulk_ingest
+
+def write_metadata(path):
+  path.write_text("id,datetime,type,notes,plane\n"
+                  "4620,2023-10-16 14:30:00,Flight test,,C-GMUT\n"
+                  "4929,2023-10-17 09:05:00,Training,circuits,C-GMUT\n"
+                  "4940,2023-10-18 16:45:00,Training,,C-GMVB\n")
+
+def test_read_metadata(tmp_path):
+  write_metadata(tmp_path / "flights.csv")
+  jobs = bulk_ingest.read_metadata(tmp_path / "flights.csv")
+  assert jobs[0] == {"id": 4620, "datetime": datetime.datetime(2023, 10, 16, 14, 30), "notes": "",
+                     "flight_type": "Flight test", "plane": "C-GMUT"}
+  assert [job["notes"] for job in jobs] == ["", "circuits", ""]
+
+def test_pending_flights_skips_ingested_and_missing_exports(monkeypatch, tmp_path):
+  write_metadata(tmp_path / "flights.csv")
+  (tmp_path / "4929.zip").write_bytes(b"")
+  (tmp_path / "4620.zip").write_bytes(b"")
+  monkeypatch.setattr(bulk_ingest, "ingested_flight_ids", lambda ids: {4620})
+  pending = bulk_ingest.pending_flights(bulk_ingest.read_metadata(tmp_path / "flights.csv"), str(tmp_path))
+  assert [(job["id"], zip_path) for job, zip_path in pending] == [(4929, str(tmp_path / "4929.zip"))]
@@ -0,0 +1,105 @@
+import pytest
+import pandas as pd
+import numpy as np
+import datetime
+from sqlalchemy.types import Float
+import bulk_load
+
+# stands in for a psycopg2 connection, records what the loader sends
+class FakeConnection:
+  def __init__(self, table_exists=False, integer_columns=(), fail_copy=False):
+    self.table_exists = table_exists
+    self.integer_columns = integer_columns
+    self.fail_copy = fail_copy
+    self.queries = []
+    self.copied = None
+    self.committed = False
+    self.rolled_back = False
+
+  def cursor(self):
+    return FakeCursor(self)
+
+  def commit(self):
+    self.committed = True
+
+  def rollback(self):
+    self.rolled_back = True
+
+  def close(self):
+    pass
+
+class FakeCursor:
+  def __init__(self, conn):
+    self.conn = conn
+    self.result = []
+
+  def execute(self, query, params=None):
+    self.conn.queries.append(query)
+    if "to_regclass" in query:
+      self.result = [(self.conn.table_exists,)]
+    elif "information_schema.columns" in query:
+      self.result = [(col,) for col in self.conn.integer_columns]
+
+  def fetchone(self):
+    return self.result[0]
+
+  def fetchall(self):
+    return self.result
+
+  def copy_expert(self, query, buffer):
+    if self.conn.fail_copy:
+      raise RuntimeError("copy failed")
+    self.conn.queries.append(query)
+    self.conn.copied = buffer.read()
+
+  def close(self):
+    pass
+
+def sample_df():
+  return pd.DataFrame({"flight_id": [1, 1], "time_min": [0.0, 0.02], "lat": [np.nan, np.nan],
+                       "weather_date": [datetime.date(2023, 10, 16)] * 2,
+                       "weather_time_utc": [datetime.time(0, 51), datetime.time(1, 51)],
+                       "metar": ["CYKF 160051Z", ""]})
+
+def test_create_table_query_types():
+  query = bulk_load.create_table_query(sample_df(), "flightdata_1", {"lat": Float()})
+  assert "flight_id BIGINT" in query
+  assert "time_min FLOAT(53)" in query
+  assert "lat FLOAT" in query
+  assert "weather_date DATE" in query
+  assert "weather_time_utc TIME WITHOUT TIME ZONE" in query
+  assert "metar TEXT" in query
+
+def test_copy_creates_table_and_writes_nulls():
+  conn = FakeConnection()
+  rows = bulk_load.copy_dataframe(sample_df(), "flightdata_1", conn)
+  assert rows == 2
+  assert conn.committed
+  assert any(query.startswith("\nCREATE TABLE") for query in conn.queries)
+  assert conn.queries[-1].startswith('COPY "flightdata_1" ("flight_id", "time_min"')
+  assert conn.copied.splitlines() == ["1,0.0,\\N,2023-10-16,00:51:00,CYKF 160051Z",
+                                      '1,0.02,\\N,2023-10-16,01:51:00,']
+
+def test_copy_rounds_floats_for_integer_columns():
+  conn = FakeConnection(table_exists=True, integer_columns=["wind_speed"])
+  df = pd.DataFrame({"wind_speed": [6.0, np.nan], "temperature": ["42.80", "41.00"]})
+  bulk_load.copy_dataframe(df, "weather", conn)
+  assert conn.copied.splitlines() == ["6,42.80", "\\N,41.00"]
+
+def test_copy_fails_if_table_exists():
+  conn = FakeConnection(table_exists=True)
+  with pytest.raises(ValueError):
+    bulk_load.copy_dataframe(sample_df(), "flightdata_1", conn, if_exists="fail")
+  assert conn.rolled_back and not conn.committed
+
+def test_copy_rolls_back_on_error():
+  conn = FakeConnection(fail_copy=True)
+  with pytest.raises(RuntimeError):
+    bulk_load.copy_dataframe(sample_df(), "flightdata_1", conn)
+  assert conn.rolled_back and not conn.committed
+
+def test_copy_leaves_the_callers_transaction_to_the_caller():
+  conn = FakeConnection(fail_copy=True)
+  with pytest.raises(RuntimeError):
+    bulk_load.copy_dataframe(sample_df(), "flightdata_1", conn, commit=False)
+  assert not conn.rolled_back and not conn.committed
@@ -0,0 +1,28 @@
+import pytest
+import sqlite3
+from sqlalchemy.exc import TimeoutError
+from database import MeteredQueuePool
+
+def sqlite_pool(size=2, timeout=30):
+  return MeteredQueuePool(lambda: sqlite3.connect(":memory:", check_same_thread=False),
+                          pool_size=size, max_overflow=0, timeout=timeout)
+
+def test_pool_counts_checkouts_and_reuses_connections():
+  pool = sqlite_pool()
+  first = pool.connect()
+  dbapi_connection = first.dbapi_connection
+  first.close()
+  second = pool.connect()
+  assert second.dbapi_connection is dbapi_connection
+  second.close()
+  assert pool.checkouts == 2
+  assert pool.checkedin() == 1
+  assert pool.max_wait >= 0
+
+def test_pool_is_bounded_and_records_wait():
+  pool = sqlite_pool(size=1, timeout=0.05)
+  held = pool.connect()
+  with pytest.raises(TimeoutError):
+    pool.connect()
+  assert pool.max_wait >= 0.05
+  held.close()
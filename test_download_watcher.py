@@ -0,0 +1,54 @@
+import os
+import sys
+import threading
+import time
+import pytest
+from download_watcher import DownloadWatcher
+
+# every test runs against inotify (where available) and the directory listing fallback
+@pytest.fixture(params=[True, False], ids=["inotify", "listing"])
+def watcher(request, tmp_path):
+  if request.param and not sys.platform.startswith("linux"):
+    pytest.skip("inotify is Linux only")
+  watcher = DownloadWatcher(str(tmp_path), use_inotify=request.param)
+  assert watcher.event_driven == request.param
+  yield watcher
+  watcher.close()
+
+# writes the file the way Chrome does: to <name>.crdownload, renamed into place when complete
+def chrome_download(directory, file_name, delay=0.0):
+  def download():
+    time.sleep(delay)
+    partial_path = os.path.join(directory, file_name + ".crdownload")
+    with open(partial_path, "wb") as partial:
+      partial.write(b"PK")
+    os.rename(partial_path, os.path.join(directory, file_name))
+  thread = threading.Thread(target=download)
+  thread.start()
+  return thread
+
+def test_resolves_when_the_crdownload_is_renamed(watcher, tmp_path):
+  download = watcher.expect("4620.zip", timeout=5)
+  chrome_download(str(tmp_path), "4620.zip", delay=0.05).join()
+  assert download.result(timeout=5) == os.path.join(str(tmp_path), "4620.zip")
+
+def test_several_downloads_in_flight(watcher, tmp_path):
+  downloads = {flight_id: watcher.expect(f"{flight_id}.zip", timeout=5) for flight_id in (4620, 4929, 4940)}
+  threads = [chrome_download(str(tmp_path), f"{flight_id}.zip", delay=0.1 * i)
+             for i, flight_id in enumerate((4940, 4620, 4929))]
+  for thread in threads:
+    thread.join()
+  assert all(download.result(timeout=5).endswith(f"{flight_id}.zip") for flight_id, download in downloads.items())
+
+def test_file_already_in_place(watcher, tmp_path):
+  (tmp_path / "5019.zip").write_bytes(b"PK")
+  assert watcher.expect("5019.zip", timeout=5).done()
+
+def test_times_out_at_the_deadline(watcher, tmp_path):
+  start = time.monotonic()
+  download = watcher.expect("5021.zip", timeout=0.2)
+  # the partial download never completes
+  (tmp_path / "5021.zip.crdownload").write_bytes(b"PK")
+  with pytest.raises(TimeoutError):
+    download.result(timeout=5)
+  assert time.monotonic() - start < 2
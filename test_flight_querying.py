@@ -0,0 +1,168 @@
+import datetime
+import numpy as np
+import pandas as pd
+import pytest
+import flight_querying
+from flight_querying import query_flights, TelemetryCache
+
+class Stamps:
+  def __init__(self):
+    self.last_run = datetime.datetime(2024, 5, 1, 8, 0)
+    self.label_versions = {}
+
+  def read(self):
+    return self.last_run, dict(self.label_versions)
+
+@pytest.fixture
+def stamps(monkeypatch):
+  stamps = Stamps()
+  cache = TelemetryCache(1 << 20, check_seconds=0, read_stamps=stamps.read)
+  monkeypatch.setattr(flight_querying, "telemetry_cache", cache)
+  return stamps
+
+def test_soc_of_several_flights_takes_two_queries(monkeypatch, stamps):
+  queries = []
+  def read_sql_query(query, engine, params=None):
+    queries.append(query)
+    if "FROM flights" in query:
+      assert params == {"ids": [4620, 4929, 4940]}
+      return pd.DataFrame({"id": [4929, 4620, 4940], "flight_date": [datetime.date(2023, 10, 17), datetime.date(2023, 10, 16),
+                                                                    datetime.date(2023, 10, 18)]})
+    if "to_regclass" in query:
+      # 4940 has no telemetry table
+      assert params == {"ids": [4620, 4929, 4940]}
+      return pd.DataFrame({"id": [4620, 4929]})
+    assert "flightdata_4940" not in query
+    return pd.DataFrame({"batch_flight_id": [4620, 4620, 4929], "time_min": [0.0, 0.5, 0.0],
+                         "bat_1_soc": [90.0, 88.0, 70.0], "bat_2_soc": [92.0, 90.0, 72.0]})
+  monkeypatch.setattr(flight_querying.pd, "read_sql_query", read_sql_query)
+  monkeypatch.setattr(flight_querying, "get_engine", lambda: None)
+  flights = query_flights().get_flight_soc_and_time(["4620", "4929", "4940"])
+  assert len(queries) == 3
+  assert list(flights["4620"]["soc"]) == [91.0, 89.0]
+  assert list(flights["4929"]["time_min"]) == [0.0]
+  assert flights["4929"]["date"] == "Oct 17, 2023"
+  # a flight without telemetry gets empty arrays
+  assert len(flights["4940"]["soc"]) == 0
+
+def test_flights_without_a_telemetry_table_are_not_read(monkeypatch, stamps):
+  queries = []
+  def read_sql_query(query, engine, params=None):
+    queries.append(query)
+    return pd.DataFrame({"id": []})
+  monkeypatch.setattr(flight_querying.pd, "read_sql_query", read_sql_query)
+  monkeypatch.setattr(flight_querying, "get_engine", lambda: None)
+  flights = query_flights().get_flights_data_on_ids(["time_min", "motor_power"], [4620])
+  # only the table lookup runs, the batch query would fail on the missing flightdata_4620
+  assert len(queries) == 1
+  assert len(flights[4620]["motor_power"]) == 0
+
+def fake_telemetry(monkeypatch, queries):
+  def read_sql_query(query, engine, params=None):
+    queries.append(query)
+    return pd.DataFrame({"time_min": [0.0, 0.5], "motor_power": [20.0, 21.0]})
+  monkeypatch.setattr(flight_querying.pd, "read_sql_query", read_sql_query)
+  monkeypatch.setattr(flight_querying, "get_engine", lambda: None)
+
+def test_a_flight_viewed_again_is_read_from_the_cache(monkeypatch, stamps):
+  queries = []
+  fake_telemetry(monkeypatch, queries)
+  first = query_flights().get_flight_data_on_id(["time_min", "motor_power"], "4620")
+  again = query_flights().get_flight_data_on_id(["motor_power"], 4620)
+  assert len(queries) == 1
+  assert list(again["motor_power"]) == list(first["motor_power"])
+  # the cached arrays cannot be changed through a returned frame
+  again.loc[0, "motor_power"] = 0.0
+  assert list(query_flights().get_flight_data_on_id(["motor_power"], 4620)["motor_power"]) == [20.0, 21.0]
+  assert flight_querying.telemetry_cache.stats()["hits"] == 2
+
+def test_a_new_scraper_run_clears_the_cache(monkeypatch, stamps):
+  queries = []
+  fake_telemetry(monkeypatch, queries)
+  query_flights().get_flight_data_on_id(["time_min"], 4620)
+  stamps.last_run = datetime.datetime(2024, 5, 2, 8, 0)
+  query_flights().get_flight_data_on_id(["time_min"], 4620)
+  assert len(queries) == 2
+  assert flight_querying.telemetry_cache.stats()["invalidations"] == 1
+
+def test_a_label_change_drops_only_that_flight(monkeypatch, stamps):
+  queries = []
+  fake_telemetry(monkeypatch, queries)
+  query_flights().get_flight_data_on_id(["time_min"], 4620)
+  query_flights().get_flight_data_on_id(["time_min"], 4929)
+  stamps.label_versions = {4929: 1}
+  query_flights().get_flight_data_on_id(["time_min"], 4620)
+  query_flights().get_flight_data_on_id(["time_min"], 4929)
+  assert len(queries) == 3
+
+def test_a_label_change_committed_late_is_still_seen(monkeypatch, stamps):
+  queries = []
+  fake_telemetry(monkeypatch, queries)
+  stamps.label_versions = {4620: 1, 4929: 3}
+  query_flights().get_flight_data_on_id(["time_min"], 4620)
+  query_flights().get_flight_data_on_id(["time_min"], 4929)
+  # 4620's relabel was stamped before 4929's but committed after the cache had seen 4929's
+  stamps.label_versions = {4620: 2, 4929: 3}
+  query_flights().get_flight_data_on_id(["time_min"], 4620)
+  query_flights().get_flight_data_on_id(["time_min"], 4929)
+  assert len(queries) == 3
+
+def test_the_least_recently_used_columns_are_evicted_by_bytes():
+  cache = TelemetryCache(2 * 8 * 100, check_seconds=3600, read_stamps=lambda: (None, None))
+  for flight_id in (4620, 4929):
+    cache.put(flight_id, {"time_min": np.zeros(100)})
+  cache.get(4620, ["time_min"])
+  cache.put(4940, {"time_min": np.zeros(100)})
+  assert cache.get(4929, ["time_min"]) is None
+  assert cache.get(4620, ["time_min"]) is not None
+  assert cache.stats()["evictions"] == 1 and cache.stats()["bytes"] == 2 * 8 * 100
+
+def test_queries_read_the_materialized_views_once_they_exist(monkeypatch):
+  class Cursor:
+    def execute(self, query, params):
+      self.table = params[0]
+    def fetchone(self):
+      return (self.table == "labeled_activities_mat",)
+    def close(self):
+      pass
+  class Connection:
+    def cursor(self):
+      return Cursor()
+  monkeypatch.setattr(flight_querying, "db_connect", lambda: Connection())
+  monkeypatch.setattr(flight_querying, "db_disconnect", lambda conn: None)
+  monkeypatch.setattr(flight_querying, "_materialized_tables", set())
+  assert flight_querying.view_source("labeled_activities_view") == "labeled_activities_mat AS labeled_activities_view"
+  assert flight_querying.view_source("flight_weather_data_view") == "flight_weather_data_view"
+
+def test_soc_rate_of_change_between_buckets():
+  rates = flight_querying.soc_rate_of_change(np.array([0.0, 0.5, 1.0]), np.array([90.0, 89.0, 88.5]))
+  assert list(rates) == [-2.0, -1.0, 0.0]
+
+def test_soc_roc_stats_read_the_rollup(monkeypatch):
+  read = []
+  def read_sql_query(query, engine, params=None):
+    read.append(query)
+    return pd.DataFrame({"fw_flight_id": [4620] * 3, "activity": ["climb", "climb", "cruise"], "time_min_rounded": [14.5, 15.0, 15.5],
+                         "bat_1_soc": [90.0] * 3, "bat_2_soc": [90.0] * 3, "motor_power": [50.0] * 3, "bat_1_soh": [98.0] * 3,
+                         "bat_2_soh": [98.0] * 3, "dates": [datetime.date(2023, 10, 16)] * 3,
+                         "soc_rate_of_change": [-2.0, -1.0, 0.0]})
+  monkeypatch.setattr(flight_querying.pd, "read_sql_query", read_sql_query)
+  monkeypatch.setattr(flight_querying, "get_engine", lambda: None)
+  monkeypatch.setattr(flight_querying, "_materialized_tables", {"flight_rollup_30s"})
+  stats = query_flights().get_soc_roc_stats_by_id(4620)
+  assert read == [flight_querying.queries.SELECT_FLIGHT_ROLLUP_30S]
+  assert list(stats["Activity"]) == ["climb", "cruise"]
+  assert list(stats["mean"]) == [-1.5, 0.0]
+
+def test_soh_plot_reads_the_monthly_rollup(monkeypatch):
+  read = []
+  def read_sql_query(query, engine, params=None):
+    read.append((query, params))
+    return pd.DataFrame({"flight_date": pd.to_datetime(["2023-09-01", "2023-10-01"]), "bat_1_soh": [99.0, 98.0],
+                         "bat_2_soh": [97.0, 96.0]})
+  monkeypatch.setattr(flight_querying.pd, "read_sql_query", read_sql_query)
+  monkeypatch.setattr(flight_querying, "get_engine", lambda: None)
+  monkeypatch.setattr(flight_querying, "_materialized_tables", {"soh_rollup"})
+  soh = query_flights().get_flight_soh()
+  assert read == [(flight_querying.queries.SELECT_SOH_ROLLUP, {"period": "month", "plane": None})]
+  assert list(soh["soh"]) == [98.0, 97.0]
@@ -0,0 +1,72 @@
+import json
+import ingest_ledger
+from ingest_ledger import IngestLedger, flight_metrics
+
+class FakeCursor:
+  def __init__(self, conn):
+    self.conn = conn
+    self.description = None
+
+  def execute(self, query, params=None):
+    if self.conn.fail:
+      raise RuntimeError("connection lost")
+    self.conn.executed.append((query, params))
+    self.description = [("id",)] if "RETURNING" in query else None
+
+  def executemany(self, query, params):
+    self.conn.executed.extend((query, row) for row in params)
+
+  def fetchone(self):
+    return (7,)
+
+  def close(self):
+    pass
+
+class FakeConnection:
+  def __init__(self, fail=False):
+    self.fail = fail
+    self.executed = []
+    self.rolled_back = False
+
+  def cursor(self):
+    return FakeCursor(self)
+
+  def commit(self):
+    pass
+
+  def rollback(self):
+    self.rolled_back = True
+
+def fake_db(monkeypatch, conn):
+  monkeypatch.setattr(ingest_ledger, "db_connect", lambda: conn)
+  monkeypatch.setattr(ingest_ledger, "db_disconnect", lambda conn: None)
+
+def test_flight_metrics_maps_the_stages_to_columns():
+  metrics = flight_metrics({"id": "4620", "plane": "C-GMUT"}, "loaded", {"download": 1.5, "read": 0.2, "load": 0.1},
+                           zip_bytes=2048, rows_in=9000, rows_out=300)
+  assert metrics == {"flight_id": 4620, "plane": "C-GMUT", "status": "loaded", "zip_bytes": 2048, "rows_in": 9000,
+                     "rows_out": 300, "download_s": 1.5, "parse_s": 0.2, "resample_s": None, "label_s": None,
+                     "db_write_s": 0.1}
+
+def test_ledger_records_a_run(monkeypatch):
+  conn = FakeConnection()
+  fake_db(monkeypatch, conn)
+  ledger = IngestLedger("scrape").start()
+  assert ledger.run_id == 7
+  ledger.record_flights([flight_metrics({"id": 4620, "plane": "C-GMUT"}, "loaded", {"read": 0.2})])
+  ledger.record_weather_link([4620, 4929], 3.0)
+  ledger.finish(2, 0, {"read": 0.2, "load": 0.12345})
+  params = [params for _, params in conn.executed]
+  assert params[1]["run_id"] == 7 and params[1]["flight_id"] == 4620
+  assert params[2] == (1.5, 7, [4620, 4929])
+  assert params[3][:2] == (2, 0) and json.loads(params[3][2]) == {"read": 0.2, "load": 0.123}
+
+def test_ledger_failures_do_not_stop_the_ingest(monkeypatch):
+  conn = FakeConnection(fail=True)
+  fake_db(monkeypatch, conn)
+  ledger = IngestLedger("bulk").start()
+  assert ledger.run_id is None and conn.rolled_back
+  # without a run nothing more is written
+  ledger.record_flights([flight_metrics({"id": 4620}, "loaded", {})])
+  ledger.finish(1, 0, {})
+  assert conn.executed == []
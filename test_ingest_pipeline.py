@@ -0,0 +1,147 @@
+import datetime
+import zipfile
+import pytest
+import ingest_pipeline
+from test_transformation import sample_flight_data
+
+def write_flight_zip(directory, flight_id, rows=5):
+  df = sample_flight_data().loc[[0] * rows].reset_index(drop=True)
+  df["time(min)"] = [i * 0.01 for i in range(rows)]
+  zip_path = directory / f"{flight_id}.zip"
+  with zipfile.ZipFile(zip_path, "w") as zip:
+    zip.writestr(f"{flight_id}.csv", df.to_csv(index=False))
+  return str(zip_path)
+
+def flight_job(flight_id):
+  return {"id": flight_id, "datetime": datetime.datetime(2023, 10, 16, 14, 30), "notes": "",
+          "flight_type": "Training", "plane": "C-GMUT"}
+
+@pytest.fixture
+def loaded(monkeypatch, tmp_path):
+  loaded = {"telemetry": [], "flights": []}
+  monkeypatch.setattr(ingest_pipeline, "STAGING_DIR", str(tmp_path / "staging"))
+  def ingest_flights(jobs, flight_dfs, labels_df=None):
+    loaded["telemetry"].append(flight_dfs)
+    loaded["flights"].extend(jobs)
+  monkeypatch.setattr(ingest_pipeline, "ingest_flights", ingest_flights)
+  return loaded
+
+def test_read_flight_zip_reads_the_csv_without_extracting(tmp_path):
+  zip_path = write_flight_zip(tmp_path, 4620)
+  df = ingest_pipeline.read_flight_zip(zip_path)
+  assert len(df) == 5
+  assert sorted(p.name for p in tmp_path.iterdir()) == ["4620.zip"]
+
+def test_pipeline_prepares_and_loads_every_flight(loaded, tmp_path):
+  pipeline = ingest_pipeline.IngestPipeline(workers=1, queue_size=2, batch_size=2)
+  try:
+    for flight_id in (4620, 4929, 4940):
+      pipeline.submit(flight_job(flight_id), write_flight_zip(tmp_path, flight_id))
+    loaded_flights = pipeline.drain()
+  finally:
+    pipeline.close()
+  assert sorted(flight["id"] for flight in loaded_flights) == [4620, 4929, 4940]
+  assert sorted(flight["id"] for flight in loaded["flights"]) == [4620, 4929, 4940]
+  telemetry = {flight_id: df for batch in loaded["telemetry"] for flight_id, df in batch.items()}
+  assert list(telemetry[4929].columns[:2]) == ["flight_id", "time_min"]
+  assert (telemetry[4929]["flight_id"] == 4929).all()
+  # the zips are removed once they are read
+  assert list((tmp_path / "staging").iterdir()) == []
+  assert {"read", "resample", "load"} <= set(pipeline.stage_seconds)
+
+def test_flight_tests_of_a_batch_are_labeled_in_one_call(loaded, monkeypatch, tmp_path):
+  import pandas as pd
+  calls = []
+  def predict_feature_activities(features_list):
+    calls.append(features_list)
+    return pd.DataFrame({"flight_id": [4620, 4929], "time_min": [0.0, 0.0], "activity": ["takeoff", "takeoff"]})
+  monkeypatch.setattr(ingest_pipeline, "predict_feature_activities", predict_feature_activities)
+  labels = []
+  def ingest_flights(jobs, flight_dfs, labels_df=None):
+    labels.append(labels_df)
+    loaded["flights"].extend(jobs)
+  monkeypatch.setattr(ingest_pipeline, "ingest_flights", ingest_flights)
+  pipeline = ingest_pipeline.IngestPipeline(workers=2, queue_size=4, batch_size=3)
+  try:
+    for flight_id in (4620, 4929):
+      pipeline.submit(dict(flight_job(flight_id), flight_type="Flight test"), write_flight_zip(tmp_path, flight_id))
+    pipeline.submit(flight_job(4940), write_flight_zip(tmp_path, 4940))
+    pipeline.drain()
+  finally:
+    pipeline.close()
+  assert sorted(flight["id"] for flight in loaded["flights"]) == [4620, 4929, 4940]
+  # one predict call for every flight test written in a batch, whatever the batches were
+  assert sum(len(features_list) for features_list in calls) == 2
+  assert len(calls) == sum(labels_df is not None for labels_df in labels)
+
+def test_pipeline_skips_flights_that_fail_to_prepare(loaded, tmp_path):
+  bad_zip = tmp_path / "5019.zip"
+  bad_zip.write_text("not a zip")
+  pipeline = ingest_pipeline.IngestPipeline(workers=1)
+  try:
+    pipeline.submit(flight_job(5019), str(bad_zip))
+    pipeline.submit(flight_job(5021), write_flight_zip(tmp_path, 5021))
+    loaded_flights = pipeline.drain()
+  finally:
+    pipeline.close()
+  assert [flight["id"] for flight in loaded_flights] == [5021]
+  assert pipeline.flights_failed == 1
+  assert [flight["id"] for flight in loaded["flights"]] == [5021]
+
+def test_pipeline_leaves_kept_zips_in_place(loaded, tmp_path):
+  zip_path = write_flight_zip(tmp_path, 5034)
+  pipeline = ingest_pipeline.IngestPipeline(workers=1)
+  try:
+    pipeline.submit(flight_job(5034), zip_path, keep_zip=True)
+    loaded_flights = pipeline.drain()
+  finally:
+    pipeline.close()
+  assert [flight["id"] for flight in loaded_flights] == [5034]
+  assert (tmp_path / "5034.zip").exists()
+
+def test_drain_returns_only_the_given_planes_flights(loaded, tmp_path):
+  pipeline = ingest_pipeline.IngestPipeline(workers=1)
+  try:
+    other_job = dict(flight_job(5034), plane="C-GMVX")
+    pipeline.submit(flight_job(5021), write_flight_zip(tmp_path, 5021))
+    pipeline.submit(other_job, write_flight_zip(tmp_path, 5034))
+    assert [flight["id"] for flight in pipeline.drain("C-GMUT")] == [5021]
+    assert [flight["id"] for flight in pipeline.drain("C-GMVX")] == [5034]
+  finally:
+    pipeline.close()
+
+class FakeLedger:
+  def __init__(self):
+    self.flights = []
+    self.weather_links = []
+    self.finished = None
+
+  def record_flights(self, metrics):
+    self.flights.extend(metrics)
+
+  def record_weather_link(self, flight_ids, seconds):
+    self.weather_links.append((flight_ids, seconds))
+
+  def finish(self, flights_loaded, flights_failed, stage_seconds):
+    self.finished = (flights_loaded, flights_failed)
+
+def test_pipeline_records_every_flight_in_the_ledger(loaded, tmp_path):
+  bad_zip = tmp_path / "5019.zip"
+  bad_zip.write_text("not a zip")
+  ledger = FakeLedger()
+  pipeline = ingest_pipeline.IngestPipeline(workers=1, ledger=ledger)
+  try:
+    pipeline.time_stage("download", 1.25, flight_id=5021)
+    pipeline.submit(flight_job(5019), str(bad_zip))
+    pipeline.submit(flight_job(5021), write_flight_zip(tmp_path, 5021, rows=50))
+    pipeline.drain()
+    pipeline.record_weather_link([5021], 0.5)
+  finally:
+    pipeline.close()
+  metrics = {row["flight_id"]: row for row in ledger.flights}
+  assert metrics[5019]["status"] == "failed" and metrics[5019]["zip_bytes"] == len("not a zip")
+  assert metrics[5021]["status"] == "loaded" and metrics[5021]["download_s"] == 1.25
+  assert metrics[5021]["rows_in"] == 50 and 0 < metrics[5021]["rows_out"] <= 50
+  assert metrics[5021]["parse_s"] is not None and metrics[5021]["db_write_s"] is not None
+  assert ledger.weather_links == [([5021], 0.5)]
+  assert ledger.finished == (1, 1)
@@ -0,0 +1,200 @@
+import datetime
+import os
+import pytest
+import scraper
+from portal_client import PortalClient, PortalError, PortalPage
+from portal_stub import PortalStub, StubFlight, portal_datetime
+
+def stub_flights():
+  start = datetime.datetime(2023, 10, 16, 14, 30)
+  flights = [StubFlight(5000 + i, "C-GMUT", start + datetime.timedelta(hours=i), zip_bytes=f"zip {5000 + i}".encode())
+             for i in range(25)]
+  flights.append(StubFlight(6000, "C-GMVX", start, flight_type="Flight test", notes="circuits", zip_bytes=b"zip 6000"))
+  # still processing, no download yet
+  flights.append(StubFlight(6001, "C-GMVX", start + datetime.timedelta(hours=1)))
+  return flights
+
+@pytest.fixture
+def stub():
+  stub = PortalStub(stub_flights(), page_size=10).start()
+  yield stub
+  stub.stop()
+
+@pytest.fixture
+def client(stub):
+  client = PortalClient(stub.url, "pilot", "secret", concurrency=2, backoff=0.01)
+  yield client
+  client.close()
+
+def test_logs_in_once_and_lists_the_planes(stub, client):
+  home_page = client.login()
+  assert client.plane_urls(home_page) == [stub.url + "aircraft/0/", stub.url + "aircraft/1/"]
+  assert client.get_page(stub.url + "aircraft/1/").registration == "C-GMVX"
+  assert stub.requests.count("/accounts/login/") == 1
+
+def test_wrong_password_raises(stub):
+  client = PortalClient(stub.url, "pilot", "wrong")
+  try:
+    with pytest.raises(PortalError):
+      client.login()
+  finally:
+    client.close()
+
+def test_flight_list_pages(stub, client):
+  client.login()
+  page = client.get_page(stub.url + "aircraft/0/")
+  assert [row.cells[0] for row in page.rows] == [str(5024 - i) for i in range(10)]
+  assert page.rows[0].href == stub.url + "flights/5024/"
+  assert page.link("Next") == stub.url + "aircraft/0/?page=2"
+  assert client.get_page(stub.url + "aircraft/0/?page=3").link("Next") is None
+
+def test_downloads_retry_server_errors(stub, client, tmp_path):
+  stub.failures["/media/exports/6000.zip"] = 2
+  client.login()
+  zip_path = client.download_flight(stub.url + "flights/6000/", "6000", str(tmp_path)).result(timeout=10)
+  assert zip_path == str(tmp_path / "6000.zip")
+  assert (tmp_path / "6000.zip").read_bytes() == b"zip 6000"
+  assert client.requests_retried == 2
+  assert os.listdir(tmp_path) == ["6000.zip"]
+
+def test_processing_flight_has_no_download(stub, client, tmp_path):
+  client.login()
+  assert client.download_flight(stub.url + "flights/6001/", "6001", str(tmp_path)).result(timeout=10) is None
+
+def test_onclick_and_link_rows_are_followed():
+  html = ('<table><tr class="clickable-aircraft" onclick="window.location.href=\'/aircraft/7/\'"><td>C-GMUT</td></tr>'
+          '<tr class="clickable-aircraft"><td><a href="/flights/5/">5</a></td></tr></table>')
+  page = PortalPage(html, "https://portal.example/")
+  assert [row.href for row in page.rows] == ["https://portal.example/aircraft/7/", "https://portal.example/flights/5/"]
+
+def test_portal_dates_parse():
+  for value in (datetime.datetime(2023, 10, 1, 20, 20), datetime.datetime(2023, 9, 5, 0, 0),
+                datetime.datetime(2024, 5, 2, 12, 0), datetime.datetime(2024, 3, 2, 8, 0)):
+    assert scraper.convert_str_to_datetime(portal_datetime(value)) == value
+
+class FakeCursor:
+  def __init__(self, known_ids, locked_ids=(), stored_ids=()):
+    self.known_ids = known_ids
+    # flights another worker holds the lock on
+    self.locked_ids = locked_ids
+    # flights another run stored after the known ids were loaded
+    self.stored_ids = stored_ids
+    self.held = set()
+    self.result = None
+    self.rows = None
+    # whether a transaction is left open on the connection
+    self.in_transaction = False
+    self.connection = self
+
+  def execute(self, query, params=None):
+    self.in_transaction = True
+    if "pg_try_advisory_lock" in query:
+      self.result = (params[1] not in self.locked_ids,)
+      if self.result[0]:
+        self.held.add(params[1])
+    elif "pg_advisory_unlock" in query:
+      self.held.remove(params[1])
+    elif "id = ANY" in query:
+      self.rows = [(flight_id,) for flight_id in params[0] if flight_id in self.stored_ids]
+
+  def fetchone(self):
+    return self.result
+
+  def commit(self):
+    self.in_transaction = False
+
+  def fetchall(self):
+    if self.rows is not None:
+      rows, self.rows = self.rows, None
+      return rows
+    return [(flight_id,) for flight_id in self.known_ids]
+
+  def close(self):
+    pass
+
+class FakeConnection:
+  def cursor(self):
+    return FakeCursor([])
+
+class FakePipeline:
+  def __init__(self):
+    self.submitted = []
+
+  def time_stage(self, stage, seconds):
+    pass
+
+  def submit(self, job, zip_path):
+    self.submitted.append((job, zip_path))
+
+  def drain(self, plane=None):
+    return [job for job, _ in self.submitted if plane is None or job["plane"] == plane]
+
+  def record_weather_link(self, flight_ids, seconds):
+    pass
+
+@pytest.fixture
+def scrape_state(monkeypatch):
+  state = {"marks": {}, "linked": []}
+  monkeypatch.setattr(scraper, "plane_high_water_mark", lambda plane: 5009 if plane == "C-GMUT" else 0)
+  monkeypatch.setattr(scraper, "push_plane_high_water_mark",
+                      lambda plane, flight_id: state["marks"].update({plane: flight_id}))
+  monkeypatch.setattr(scraper, "weather_data", lambda dates, ids, download_dir: state["linked"].extend(ids))
+  monkeypatch.setattr(scraper, "flights_awaiting_weather", lambda plane=None: [])
+  monkeypatch.setattr(scraper, "refresh_flight_views", lambda: [])
+  monkeypatch.setattr(scraper, "db_connect", lambda: FakeConnection())
+  monkeypatch.setattr(scraper, "db_disconnect", lambda conn: None)
+  monkeypatch.setattr(scraper, "table_exists", lambda table, conn: True)
+  return state
+
+def test_scrape_portal_downloads_only_new_flights(stub, client, scrape_state, tmp_path):
+  marks = scrape_state["marks"]
+  linked = scrape_state["linked"]
+  client.login()
+  pipeline = FakePipeline()
+  cursor = FakeCursor([5020, 5021, 5022, 5023, 5024])
+  scraper.scrape_portal(client, stub.url + "aircraft/0/", cursor, str(tmp_path), pipeline)
+  assert cursor.held == set()
+  # every lookup and lock is committed, the connection is never left idle in transaction
+  assert not cursor.in_transaction
+  assert sorted(int(job["id"]) for job, _ in pipeline.submitted) == list(range(5010, 5020))
+  assert all(open(zip_path, "rb").read() == f"zip {job['id']}".encode() for job, zip_path in pipeline.submitted)
+  assert marks == {"C-GMUT": 5024}
+  assert sorted(linked) == [str(flight_id) for flight_id in range(5010, 5020)]
+  # only the new flights' pages are opened, paging stops at the page below the high-water mark
+  assert sorted(path for path in stub.requests if path.startswith("/flights/")) == \
+    [f"/flights/{flight_id}/" for flight_id in range(5010, 5020)]
+
+def test_scrape_portal_skips_flights_locked_by_another_worker(stub, client, scrape_state, tmp_path):
+  client.login()
+  pipeline = FakePipeline()
+  scraper.scrape_portal(client, stub.url + "aircraft/0/", FakeCursor([], locked_ids=(5024,)), str(tmp_path), pipeline)
+  assert 5024 not in {int(job["id"]) for job, _ in pipeline.submitted}
+  # the mark stays below the locked flight, so the next run looks at it again
+  assert scrape_state["marks"] == {"C-GMUT": 5023}
+
+def test_scrape_portal_skips_flights_stored_after_the_known_ids_were_loaded(stub, client, scrape_state, tmp_path):
+  client.login()
+  pipeline = FakePipeline()
+  cursor = FakeCursor([], stored_ids=(5024,))
+  scraper.scrape_portal(client, stub.url + "aircraft/0/", cursor, str(tmp_path), pipeline)
+  assert 5024 not in {int(job["id"]) for job, _ in pipeline.submitted}
+  assert cursor.held == set()
+  # the stored flight is done, it does not hold the mark back
+  assert scrape_state["marks"] == {"C-GMUT": 5024}
+
+def test_plane_workers_are_capped_by_the_pool():
+  assert scraper.plane_worker_limit(2, pool_size=5) == 2
+  assert scraper.plane_worker_limit(4, pool_size=5) == 2
+  assert scraper.plane_worker_limit(4, pool_size=2) == 1
+
+def test_planes_are_scraped_in_parallel_workers(stub, scrape_state, monkeypatch, tmp_path):
+  monkeypatch.setattr(scraper, "portal_client", lambda: PortalClient(stub.url, "pilot", "secret", backoff=0.01))
+  pipeline = FakePipeline()
+  scraper.scrape_over_http(str(tmp_path), pipeline, workers=2)
+  zip_dirs = {os.path.dirname(zip_path) for _, zip_path in pipeline.submitted}
+  assert zip_dirs == {str(tmp_path / "plane_0"), str(tmp_path / "plane_1")}
+  assert sorted(int(job["id"]) for job, _ in pipeline.submitted) == list(range(5010, 5025)) + [6000]
+  # 6001 is still processing, the mark stays below it
+  assert scrape_state["marks"] == {"C-GMUT": 5024, "C-GMVX": 6000}
+  # every worker logged in with its own session
+  assert stub.requests.count("/accounts/login/") == 3
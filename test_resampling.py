@@ -0,0 +1,50 @@
+import pytest
+import pandas as pd
+import numpy as np
+import resampling
+from benchmark_resampling import legacy_downsample
+
+def sample_flight_data():
+  rng = np.random.default_rng(0)
+  # 2 Hz samples with jitter and a gap, so some buckets are empty and some hold several rows
+  times = np.concatenate([np.arange(0, 1.5, 1 / 120), np.arange(2.0, 2.5, 1 / 120)])
+  times = np.sort(times + rng.uniform(0, 0.004, len(times)))
+  df = pd.DataFrame({"time_min": times,
+                     "bat_1_soc": rng.uniform(20, 100, len(times)),
+                     "motor_power": rng.uniform(0, 60, len(times)),
+                     "lat": np.nan})
+  df.loc[5:9, "motor_power"] = np.nan
+  df.insert(0, "flight_id", 1234)
+  return df
+
+def test_bucket_starts_match_accumulated_loop():
+  starts = resampling.bucket_starts(3.0)
+  expected = []
+  current = 0
+  while current <= 3.0:
+    expected.append(current)
+    current = current + 0.02
+  assert starts.tolist() == expected
+
+def test_resample_matches_legacy_loop():
+  df = sample_flight_data()
+  expected_df = legacy_downsample(df, 1234).astype({"flight_id": "int64"}).astype({col: float for col in df.columns[1:]})
+  actual_df = resampling.resample_flight_data(df, 1234)
+  assert list(actual_df.columns) == list(df.columns)
+  pd.testing.assert_frame_equal(actual_df, expected_df, check_exact=False, rtol=1e-12)
+
+def test_resample_custom_width_and_aggregations():
+  df = pd.DataFrame({"time_min": [0.0, 0.1, 0.6, 0.7, 1.2],
+                     "motor_power": [1.0, 3.0, 5.0, np.nan, 9.0],
+                     "bat_1_soc": [90.0, 89.0, 88.0, 87.0, 86.0]})
+  actual_df = resampling.resample_flight_data(df, 7, bucket_width=0.5, aggregations={"motor_power": "max", "bat_1_soc": "last"})
+  expected_df = pd.DataFrame({"flight_id": [7, 7, 7],
+                              "time_min": [0.0, 0.5, 1.0],
+                              "motor_power": [3.0, 5.0, 9.0],
+                              "bat_1_soc": [89.0, 87.0, 86.0]})
+  pd.testing.assert_frame_equal(actual_df, expected_df)
+
+def test_resample_rejects_unknown_aggregation():
+  df = pd.DataFrame({"time_min": [0.0], "motor_power": [1.0]})
+  with pytest.raises(ValueError):
+    resampling.resample_flight_data(df, 7, aggregations={"motor_power": "median"})
@@ -1,6 +1,6 @@
 import pytest
 from dotenv import load_dotenv
-from scraper import convert_str_to_datetime, weather_data
+from scraper import convert_str_to_datetime, weather_data, next_high_water_mark, page_stops_scrape
 from datetime import datetime
 
 class TestScraper:
@@ -10,3 +10,18 @@ class TestScraper:
     converted_datetime = convert_str_to_datetime(test_datetime)
     expected_datetime = datetime(2023, 10, 1, 20, 20)
     assert converted_datetime == expected_datetime
+
+  def test_next_high_water_mark_stops_below_flights_left_behind(self):
+    seen_ids = [5040, 5039, 5038, 5037, 5036]
+    assert next_high_water_mark(seen_ids, [], 5030) == 5040
+    assert next_high_water_mark(seen_ids, [5038], 5030) == 5037
+    assert next_high_water_mark(seen_ids, [5036], 5030) == 5030
+
+  def test_page_stops_scrape_once_known_down_to_the_mark(self):
+    known_ids = {5040, 5039, 5038}
+    is_known = lambda flight_id: flight_id <= 5037 or flight_id in known_ids
+    assert page_stops_scrape([5040, 5039, 5038, 5037], is_known, 5037)
+    assert not page_stops_scrape([5041, 5040, 5039, 5038], is_known, 5037)
+    # a known page above the mark may still have an older flight left behind below it
+    assert not page_stops_scrape([5040, 5039, 5038], is_known, 5037)
+    assert not page_stops_scrape([], is_known, 5037)
@@ -0,0 +1,184 @@
+import pytest
+import storage
+
+def test_telemetry_source_per_flight(monkeypatch):
+  monkeypatch.setenv("TELEMETRY_STORAGE", "per_flight")
+  assert storage.telemetry_source("4620") == "flightdata_4620"
+
+def test_telemetry_source_partitioned(monkeypatch):
+  monkeypatch.setenv("TELEMETRY_STORAGE", "partitioned")
+  assert storage.telemetry_source(4620) == "(SELECT * FROM flight_telemetry WHERE flight_id = 4620) AS flightdata_4620"
+
+def test_link_weather_to_flights_stages_rows_in_one_transaction(monkeypatch):
+  import datetime
+  import pandas as pd
+  from test_bulk_load import FakeConnection
+  conn = FakeConnection(table_exists=True)
+  monkeypatch.setattr(storage, "db_connect", lambda: conn)
+  matched_df = pd.DataFrame({"weather_date": [datetime.date(2023, 10, 16)] * 3,
+                             "weather_time_utc": [datetime.time(0, 51), datetime.time(1, 51), datetime.time(0, 51)],
+                             "temperature": [42.8, 41.0, 42.8],
+                             "flight_id": [4620, 4620, 4929]})
+  storage.link_weather_to_flights(matched_df)
+  assert conn.committed and not conn.rolled_back
+  assert conn.queries[0].strip().startswith("CREATE TEMP TABLE weather_staging")
+  assert conn.copied.splitlines() == ["1,4620,2023-10-16,00:51:00,42.8,CYKF",
+                                      "2,4620,2023-10-16,01:51:00,41.0,CYKF",
+                                      "3,4929,2023-10-16,00:51:00,42.8,CYKF"]
+  upsert = next(query for query in conn.queries if query.strip().startswith("INSERT INTO weather"))
+  assert "ON CONFLICT (station, weather_date, weather_time_utc)" in upsert
+  assert '"temperature" = EXCLUDED."temperature"' in upsert
+  assert '"station" = EXCLUDED' not in upsert
+  assert "INSERT INTO flight_weather" in conn.queries[-1]
+
+def test_link_weather_skips_observations_missing_a_required_reading(monkeypatch):
+  import io
+  import pandas as pd
+  from test_bulk_load import FakeConnection
+  from test_transformation import sample_weather_data
+  from transformation import read_weather_csv
+  conn = FakeConnection(table_exists=True)
+  monkeypatch.setattr(storage, "db_connect", lambda: conn)
+  archive_df = sample_weather_data().loc[[0, 0]].reset_index(drop=True)
+  archive_df.loc[1, "valid"] = "2023-10-16 01:51"
+  archive_df.loc[1, "tmpf"] = "M"
+  weather_df = read_weather_csv(io.StringIO(archive_df.to_csv(index=False)))
+  storage.link_weather_to_flights(weather_df.assign(flight_id=[4620, 4929]), [4620, 4929])
+  assert conn.committed and not conn.rolled_back
+  # the 01:51 observation has no temperature, only the 00:51 one is stored
+  assert len(conn.copied.splitlines()) == 1 and conn.copied.startswith("1,4620,2023-10-16,00:51:00,")
+  assert "weather_linked" in conn.queries[-1]
+
+def test_store_weather_upserts_without_linking(monkeypatch):
+  import datetime
+  import pandas as pd
+  from test_bulk_load import FakeConnection
+  conn = FakeConnection(table_exists=True)
+  monkeypatch.setattr(storage, "db_connect", lambda: conn)
+  weather_df = pd.DataFrame({"weather_date": [datetime.date(2023, 10, 16)] * 2,
+                             "weather_time_utc": [datetime.time(0, 51), datetime.time(1, 51)]})
+  for col in storage.WEATHER_REQUIRED_COLUMNS:
+    weather_df[col] = [1.0, None]
+  assert storage.store_weather(weather_df) == 1
+  assert conn.committed
+  assert len(conn.copied.splitlines()) == 1 and conn.copied.startswith("1,0,2023-10-16,00:51:00,")
+  assert not any("INSERT INTO flight_weather" in query for query in conn.queries)
+
+def test_ingest_flights_writes_a_batch_in_one_transaction(monkeypatch):
+  import datetime
+  import pandas as pd
+  from test_bulk_load import FakeConnection
+  conn = FakeConnection(table_exists=True)
+  monkeypatch.setattr(storage, "db_connect", lambda: conn)
+  monkeypatch.setattr(storage, "clear_flight_data", lambda flight_ids: None)
+  monkeypatch.setenv("TELEMETRY_STORAGE", "partitioned")
+  jobs = [{"id": "4620", "datetime": datetime.datetime(2023, 10, 16, 14, 30), "notes": "", "flight_type": "Training",
+           "plane": "C-GMUT"}]
+  storage.ingest_flights(jobs, {"4620": pd.DataFrame({"flight_id": [4620], "time_min": [0.0], "bat_1_soh": [98.0],
+                                                      "bat_2_soh": [97.0]})},
+                         pd.DataFrame({"flight_id": [4620], "time_min": [0.0], "activity": ["takeoff"]}))
+  assert conn.committed and not conn.rolled_back
+  assert storage.queries.ADD_TO_SOH_ROLLUP in conn.queries
+  assert "flight_ingest_state" in conn.queries[-1]
+
+def test_ingest_flights_rolls_back_the_batch_on_failure(monkeypatch):
+  import datetime
+  import pandas as pd
+  from test_bulk_load import FakeConnection
+  conn = FakeConnection(table_exists=True)
+  monkeypatch.setattr(storage, "db_connect", lambda: conn)
+  monkeypatch.setattr(storage, "clear_flight_data", lambda flight_ids: None)
+  monkeypatch.setenv("TELEMETRY_STORAGE", "partitioned")
+  def fail(*args, **kwargs):
+    raise RuntimeError("connection lost")
+  monkeypatch.setattr(storage, "push_flights_metadata", fail)
+  jobs = [{"id": "4620", "datetime": datetime.datetime(2023, 10, 16, 14, 30), "notes": "", "flight_type": "Training",
+           "plane": "C-GMUT"}]
+  with pytest.raises(RuntimeError):
+    storage.ingest_flights(jobs, {"4620": pd.DataFrame({"flight_id": [4620], "time_min": [0.0]})})
+  assert conn.rolled_back and not conn.committed
+
+def test_soh_summary_of_the_rows_where_both_batteries_report():
+  import numpy as np
+  import pandas as pd
+  df = pd.DataFrame({"time_min": [0.04, 0.0, 0.02, 0.06], "bat_1_soh": [97.0, 0.0, 99.0, 98.0],
+                     "bat_2_soh": [95.0, 96.0, 97.0, np.nan]})
+  assert storage.soh_summary(df) == {"samples": 2, "bat_1_soh_first": 99.0, "bat_1_soh_last": 97.0, "bat_1_soh_mean": 98.0,
+                                     "bat_2_soh_first": 97.0, "bat_2_soh_last": 95.0, "bat_2_soh_mean": 96.0}
+  assert storage.soh_summary(df.iloc[[1]])["samples"] == 0
+
+def test_flights_without_matching_weather_are_still_marked_linked(monkeypatch):
+  import pandas as pd
+  from test_bulk_load import FakeConnection
+  conn = FakeConnection(table_exists=True)
+  monkeypatch.setattr(storage, "db_connect", lambda: conn)
+  storage.link_weather_to_flights(pd.DataFrame(columns=["weather_date", "weather_time_utc", "flight_id"]), [4620])
+  assert conn.committed
+  assert conn.copied == "" or conn.copied is None
+  assert [query for query in conn.queries if "weather_linked" in query]
+
+def test_telemetry_batch_query_per_flight(monkeypatch):
+  monkeypatch.setenv("TELEMETRY_STORAGE", "per_flight")
+  assert storage.telemetry_batch_query(["time_min", "motor_power"], ["4620", 4929]) == \
+    ("(SELECT 4620 AS batch_flight_id, time_min, motor_power FROM flightdata_4620 ORDER BY time_min) UNION ALL "
+     "(SELECT 4929 AS batch_flight_id, time_min, motor_power FROM flightdata_4929 ORDER BY time_min)")
+
+def test_telemetry_batch_query_partitioned(monkeypatch):
+  monkeypatch.setenv("TELEMETRY_STORAGE", "partitioned")
+  assert storage.telemetry_batch_query(["time_min"], ["4620", 4929]) == \
+    ("SELECT flight_id AS batch_flight_id, time_min FROM flight_telemetry "
+     "WHERE flight_id = ANY(ARRAY[4620, 4929]::int[]) ORDER BY flight_id, time_min")
+
+class RefreshCursor:
+  def __init__(self, conn):
+    self.conn = conn
+    self.result = None
+
+  def execute(self, query, params=None):
+    self.conn.queries.append((query, params))
+    if "to_regclass" in query:
+      self.result = [self.conn.tables]
+    elif "SELECT s.flight_id" in query:
+      self.result = [(flight_id, None) for flight_id in self.conn.stale_ids]
+
+  def fetchone(self):
+    return self.result[0]
+
+  def fetchall(self):
+    return self.result
+
+  def close(self):
+    pass
+
+class RefreshConnection:
+  def __init__(self, tables, stale_ids):
+    self.tables = tables
+    self.stale_ids = stale_ids
+    self.queries = []
+    self.committed = False
+
+  def cursor(self):
+    return RefreshCursor(self)
+
+  def commit(self):
+    self.committed = True
+
+  def close(self):
+    pass
+
+def test_refresh_flight_views_rebuilds_only_the_stale_flights(monkeypatch):
+  conn = RefreshConnection((True, True, True), [5021, 5034])
+  monkeypatch.setattr(storage, "db_connect", lambda: conn)
+  assert storage.refresh_flight_views() == [5021, 5034]
+  assert conn.committed
+  refreshes = [(query, params) for query, params in conn.queries if query.strip().startswith("DELETE")]
+  assert [query.split()[2] for query, _ in refreshes] == ["flight_weather_data_mat", "labeled_activities_mat", "flight_rollup_30s"]
+  assert all(params == {"ids": [5021, 5034]} for _, params in refreshes)
+  # the label versions the refresh read are recorded with it
+  assert conn.queries[-1] == (storage.queries.RECORD_MATERIALIZED_FLIGHTS, {"ids": [5021, 5034], "versions": [None, None]})
+
+def test_refresh_flight_views_waits_for_the_materialized_tables(monkeypatch):
+  conn = RefreshConnection((False, False, False), [5021])
+  monkeypatch.setattr(storage, "db_connect", lambda: conn)
+  assert storage.refresh_flight_views() == []
+  assert len(conn.queries) == 1
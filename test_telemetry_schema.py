@@ -0,0 +1,31 @@
+import telemetry_schema
+from test_transformation import sample_flight_data
+import transformation
+
+def test_every_kept_export_column_is_declared():
+  kept = list(transformation.transform_overview_data(sample_flight_data()).columns)
+  assert list(telemetry_schema.source_names()) == kept
+  assert telemetry_schema.column_names()[:2] == ["flight_id", "time_min"]
+  assert telemetry_schema.source_names()["TIMESTAMP"] == "time_stamp"
+
+def test_aggregate_choices_average_the_two_batteries():
+  choices = telemetry_schema.aggregate_choices()
+  assert choices["State-of-Charge (Percent)"] == ["bat_1_soc", "bat_2_soc"]
+  assert choices["Inverter Cooling Temperature (°C)"] == ["inverter_cooling_temp_1", "inverter_cooling_temp_2"]
+  assert all(1 <= len(columns) <= 2 for columns in choices.values())
+  assert "time_stamp" not in [col for columns in choices.values() for col in columns]
+  assert len(telemetry_schema.granular_choices()) == len(telemetry_schema.TELEMETRY_COLUMNS)
+
+def test_sql_is_generated_from_the_declared_types():
+  definitions = telemetry_schema.column_definitions(not_null=("flight_id",)).split(",\n")
+  assert definitions[0] == '\t"flight_id" int8 NOT NULL'
+  assert '\t"bat_1_soc" float4' in definitions
+  assert '\t"lat" float8' in definitions
+  # get_flight_data always returns float8
+  assert "float4" not in telemetry_schema.column_definitions(telemetry_schema.READ_SQL_TYPES)
+  assert '"bat_1_soc"::float8' in telemetry_schema.cast_select_list()
+
+def test_partitioned_view_reads_the_same_types_as_get_flight_data():
+  import queries
+  assert "fd.*" not in queries.CREATE_FLIGHT_WEATHER_VIEW_PARTITIONED
+  assert 'fd."bat_1_soc"::float8 AS "bat_1_soc"' in queries.CREATE_FLIGHT_WEATHER_VIEW_PARTITIONED
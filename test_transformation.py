@@ -125,3 +125,49 @@ def test_data_format_cleaning():
   actual_df = transformation.weather_column_names(actual_df)
   actual_df = transformation.data_format_cleaning(actual_df)
   pd.testing.assert_frame_equal(actual_df, expected_df, check_dtype=False)
+
+def test_read_overview_csv_matches_transform_overview_data():
+  import io
+  import telemetry_schema
+  df = sample_flight_data().loc[[0, 0, 0]].reset_index(drop=True)
+  df["time(min)"] = [0.0, 0.01, 0.02]
+  df["motor power"] = [1.5, np.nan, 3.0]
+  # exports have a leading space before most headers
+  csv_bytes = df.rename(columns=lambda col: " " + col).to_csv(index=False).encode()
+  expected_df = transformation.transform_overview_data(df).rename(columns=telemetry_schema.source_names())
+  expected_df = expected_df.astype({col: dtype for col, dtype in telemetry_schema.storage_dtypes().items() if col in expected_df})
+  actual_df = transformation.read_overview_csv(io.BytesIO(csv_bytes))
+  pd.testing.assert_frame_equal(actual_df, expected_df)
+  assert actual_df["motor_power"].dtype == np.float32
+  chunks = list(transformation.read_overview_csv(io.BytesIO(csv_bytes), chunksize=2))
+  assert [len(chunk) for chunk in chunks] == [2, 1]
+  pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), expected_df)
+
+def sample_weather_csv():
+  rows = [sample_weather_data().iloc[0].tolist()]
+  second = list(rows[0])
+  second[1] = "2023-10-16 01:51"
+  # a missing temperature and wind direction, a gust, no weather codes and a trace of rain
+  second[2], second[5], second[11], second[20], second[7] = "M", "M", "17.00", "M", "T"
+  rows.append(second)
+  return pd.DataFrame(rows, columns=sample_weather_data().columns).to_csv(index=False)
+
+def test_read_weather_csv_matches_weather_transformation():
+  import io
+  import warnings
+  csv_text = sample_weather_csv()
+  expected_df = transformation.weather_transformation(pd.read_csv(io.StringIO(csv_text)))
+  with warnings.catch_warnings():
+    warnings.simplefilter("error")
+    actual_df = transformation.read_weather_csv(io.StringIO(csv_text))
+  assert list(actual_df.columns) == list(expected_df.columns)
+  for col in expected_df.columns:
+    if col in ("weather_date", "weather_time_utc", "sky_coverage_1", "sky_coverage_2", "sky_coverage_3",
+               "sky_coverage_4", "weather_codes", "metar"):
+      pd.testing.assert_series_equal(actual_df[col], expected_df[col], check_dtype=False)
+    else:
+      pd.testing.assert_series_equal(actual_df[col].astype(float), pd.to_numeric(expected_df[col]).astype(float))
+  assert actual_df["wind_direction"].dtype == "Int64"
+  assert actual_df["wind_direction"].isna().tolist() == [False, True]
+  chunks = list(transformation.read_weather_csv(io.StringIO(csv_text), chunksize=1))
+  pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), actual_df)
@@ -0,0 +1,88 @@
+import datetime
+import pytest
+import weather_archive
+from test_transformation import sample_weather_data
+
+def write_archive(path, timestamps):
+  row = sample_weather_data()
+  archive_df = row.loc[[0] * len(timestamps)].reset_index(drop=True)
+  archive_df["valid"] = timestamps
+  archive_df.to_csv(path, index=False)
+  return str(path)
+
+@pytest.fixture
+def archive(monkeypatch):
+  archive = {"covered": [], "stored": [], "recorded": []}
+  monkeypatch.setattr(weather_archive, "covered_ranges", lambda station, start, end: list(archive["covered"]))
+  monkeypatch.setattr(weather_archive, "store_weather", lambda df: archive["stored"].append(df) or len(df))
+  monkeypatch.setattr(weather_archive, "record_coverage",
+                      lambda station, start, end: archive["recorded"].append((station, start, end)))
+  return archive
+
+def day(n):
+  return datetime.date(2023, 10, n)
+
+def test_missing_ranges_skips_covered_days():
+  covered = [(day(12), day(14)), (day(15), day(16)), (day(1), day(3))]
+  assert weather_archive.missing_ranges(covered, day(10), day(18)) == [(day(10), day(12)), (day(14), day(15)),
+                                                                       (day(16), day(18))]
+  assert weather_archive.missing_ranges([(day(9), day(20))], day(10), day(18)) == []
+  assert weather_archive.missing_ranges([], day(10), day(11)) == [(day(10), day(11))]
+
+def test_local_fetcher_returns_only_the_requested_days(tmp_path):
+  path = write_archive(tmp_path / "CYKF.csv", ["2023-10-15 23:51", "2023-10-16 00:51", "2023-10-16 23:51",
+                                               "2023-10-17 00:51"])
+  fetched = weather_archive.LocalMetarFetcher(path).fetch("CYKF", day(16), day(17)).read()
+  assert "2023-10-16 00:51" in fetched and "2023-10-16 23:51" in fetched
+  assert "2023-10-15" not in fetched and "2023-10-17" not in fetched
+
+def test_update_archive_fetches_only_the_missing_days(archive, tmp_path):
+  path = write_archive(tmp_path / "CYKF.csv", ["2023-10-14 00:51", "2023-10-16 00:51", "2023-10-17 00:51"])
+  archive["covered"] = [(day(14), day(16))]
+  fetcher = weather_archive.LocalMetarFetcher(path)
+  rows = weather_archive.update_archive(day(14), day(18), fetcher=fetcher, today=day(18))
+  assert rows == 2
+  stored_days = [d for df in archive["stored"] for d in df["weather_date"]]
+  assert stored_days == [day(16), day(17)]
+  assert (archive["stored"][0]["station"] == "CYKF").all()
+  # yesterday is fetched but not recorded, the next scrape downloads it again
+  assert archive["recorded"] == [("CYKF", day(16), day(17))]
+
+def test_update_archive_records_only_days_with_observations(archive, tmp_path):
+  path = write_archive(tmp_path / "CYKF.csv", ["2023-10-14 00:51", "2023-10-15 00:51", "2023-10-17 00:51"])
+  weather_archive.update_archive(day(14), day(19), fetcher=weather_archive.LocalMetarFetcher(path), today=day(20))
+  # the 16th and 18th returned nothing, they are downloaded again next time
+  assert archive["recorded"] == [("CYKF", day(14), day(16)), ("CYKF", day(17), day(18))]
+
+def test_update_archive_records_nothing_for_an_empty_download(archive, tmp_path):
+  path = write_archive(tmp_path / "CYKF.csv", [])
+  assert weather_archive.update_archive(day(14), day(16), fetcher=weather_archive.LocalMetarFetcher(path), today=day(20)) == 0
+  assert archive["recorded"] == []
+
+def test_update_archive_downloads_nothing_when_covered(archive):
+  class FailingFetcher:
+    bytes_fetched = 0
+    def fetch(self, station, start_date, end_date):
+      raise AssertionError("nothing should be downloaded")
+  archive["covered"] = [(day(1), day(17))]
+  assert weather_archive.update_archive(day(14), day(16), fetcher=FailingFetcher(), today=day(17)) == 0
+  assert archive["recorded"] == []
+
+def test_iem_fetcher_requests_the_window_without_a_browser():
+  class FakeResponse:
+    content = b"station,valid\n"
+    text = "station,valid\n"
+    def raise_for_status(self):
+      pass
+  class FakeSession:
+    def get(self, url, params, timeout):
+      self.url, self.params = url, params
+      return FakeResponse()
+  session = FakeSession()
+  fetcher = weather_archive.IemMetarFetcher(session=session)
+  assert fetcher.fetch("CYKF", day(30), datetime.date(2023, 11, 1)).read() == "station,valid\n"
+  params = dict(session.params)
+  assert session.url == weather_archive.METAR_URL
+  assert (params["year2"], params["month2"], params["day2"]) == (2023, 11, 1)
+  assert [value for key, value in session.params if key == "report_type"] == [3, 4]
+  assert fetcher.bytes_fetched == len(FakeResponse.content)
@@ -0,0 +1,63 @@
+import pytest
+import pandas as pd
+import datetime
+import weather_matching
+
+def sample_weather_data():
+  # hourly observations around midnight UTC, stored out of order like a concatenated archive
+  times = [datetime.datetime(2023, 10, 16, 22, 0), datetime.datetime(2023, 10, 16, 20, 0),
+           datetime.datetime(2023, 10, 16, 21, 0), datetime.datetime(2023, 10, 16, 23, 0),
+           datetime.datetime(2023, 10, 17, 0, 0), datetime.datetime(2023, 10, 17, 1, 0)]
+  return pd.DataFrame({"weather_date": [t.date() for t in times],
+                       "weather_time_utc": [t.time() for t in times],
+                       "temperature": [22.0, 20.0, 21.0, 23.0, 0.0, 1.0]})
+
+def flights(*rows):
+  return pd.DataFrame(rows, columns=["flight_id", "start", "duration_min"])
+
+def matched_temperatures(flights_df, weather_df):
+  matched_df = weather_matching.match_weather_to_flights(flights_df, weather_df)
+  return {flight_id: group["temperature"].tolist() for flight_id, group in matched_df.groupby("flight_id")}
+
+def test_readings_inside_flight_plus_previous_reading():
+  flights_df = flights((1, datetime.datetime(2023, 10, 16, 20, 30), 100))
+  assert matched_temperatures(flights_df, sample_weather_data()) == {1: [20.0, 21.0, 22.0]}
+
+def test_no_previous_reading_when_one_lands_on_start():
+  flights_df = flights((1, datetime.datetime(2023, 10, 16, 21, 0), 30))
+  assert matched_temperatures(flights_df, sample_weather_data()) == {1: [21.0]}
+
+def test_closest_reading_before_short_flight():
+  flights_df = flights((1, datetime.datetime(2023, 10, 16, 21, 10), 20))
+  assert matched_temperatures(flights_df, sample_weather_data()) == {1: [21.0]}
+
+def test_flight_crossing_midnight():
+  flights_df = flights((1, datetime.datetime(2023, 10, 16, 23, 30), 45))
+  assert matched_temperatures(flights_df, sample_weather_data()) == {1: [23.0, 0.0]}
+
+def test_several_flights_and_flight_before_all_weather():
+  flights_df = flights((1, datetime.datetime(2023, 10, 16, 19, 0), 30),
+                       (2, datetime.datetime(2023, 10, 16, 20, 30), 100),
+                       (3, datetime.datetime(2023, 10, 17, 0, 15), 10))
+  assert matched_temperatures(flights_df, sample_weather_data()) == {2: [20.0, 21.0, 22.0], 3: [0.0]}
+
+def test_input_is_not_modified():
+  weather_df = sample_weather_data()
+  original_df = weather_df.copy()
+  weather_matching.match_weather_to_flights(flights((1, datetime.datetime(2023, 10, 16, 20, 30), 100)), weather_df)
+  pd.testing.assert_frame_equal(weather_df, original_df)
+
+def test_chunked_matching_matches_whole_archive():
+  weather_df = sample_weather_data().sort_values(["weather_date", "weather_time_utc"], ignore_index=True)
+  flights_df = flights((1, datetime.datetime(2023, 10, 16, 19, 0), 30),
+                       (2, datetime.datetime(2023, 10, 16, 20, 30), 100),
+                       (3, datetime.datetime(2023, 10, 16, 21, 10), 20),
+                       (4, datetime.datetime(2023, 10, 16, 23, 30), 45),
+                       (5, datetime.datetime(2023, 10, 17, 0, 0), 10))
+  expected_df = weather_matching.match_weather_to_flights(flights_df, weather_df)
+  expected_df = expected_df.sort_values(["flight_id", "temperature"], ignore_index=True)
+  for chunk_size in range(1, len(weather_df) + 1):
+    chunks = [weather_df.iloc[i:i + chunk_size] for i in range(0, len(weather_df), chunk_size)]
+    actual_df = weather_matching.match_weather_chunks(flights_df, chunks)
+    actual_df = actual_df.sort_values(["flight_id", "temperature"], ignore_index=True)
+    pd.testing.assert_frame_equal(actual_df, expected_df)
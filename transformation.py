@@ -1,6 +1,17 @@
 # the methods in this script transform scraped flight and weather data into required format
-from datetime import datetime
+import csv
+import io
 import numpy as np
+import pandas as pd
+import telemetry_schema
+
+# the overview columns that are not stored: both batteries' cell temperatures, a few raw sensor columns
+# and the derivatives that only newer exports have
+CELL_TEMP_COLUMNS = ["bat " + str(battery) + " cell " + str(temp) + " temp" for battery in range(1, 3) for temp in range(1, 17)]
+REMAINING_COLUMNS = ["time(ms)", "inverter operating time", "stall_pressure_diff_raw", "stall_calibrated_value",
+                     "ACC_LONG", "ACC_LAT", "ACC_NORM"]
+DERIVATIVE_COLUMNS = ["ias_derivative", "pitch_derivative", "roll_derivative", "alt_derivative"]
+DROPPED_OVERVIEW_COLUMNS = frozenset(CELL_TEMP_COLUMNS + REMAINING_COLUMNS + DERIVATIVE_COLUMNS)
 
 # takes a pandas df of the overview data as input, drops unneeded columns
 def transform_overview_data(df):
@@ -12,71 +23,67 @@ def transform_overview_data(df):
 
 # drops the cell temperatures for both batteries
 def drop_cell_temps(df):
-  # variables for each battery and temp
-  batteries = range(1, 3)
-  temps = range(1, 17)
-  for battery in batteries:
-    for temp in temps:
-      current_battery_temp = "bat " + str(battery) + " cell " + str(temp) + " temp"
-      df = df.drop(current_battery_temp, axis=1)
-  return df
+  return df.drop(columns=CELL_TEMP_COLUMNS)
 
 # drops the remaining columns (manually)
 def drop_remaining_columns(df):
-  df = df.drop("time(ms)", axis=1)
-  df = df.drop("inverter operating time", axis=1)
-  df = df.drop("stall_pressure_diff_raw", axis=1)
-  df = df.drop("stall_calibrated_value", axis=1)
-  df = df.drop("ACC_LONG", axis=1)
-  df = df.drop("ACC_LAT", axis=1)
-  df = df.drop("ACC_NORM", axis=1)
   if "ias_derivative" in df.columns:
-    df = df.drop("ias_derivative", axis=1)
-    df = df.drop("pitch_derivative", axis=1)
-    df = df.drop("roll_derivative", axis=1)
-    df = df.drop("alt_derivative", axis=1)
-  return df
+    return df.drop(columns=REMAINING_COLUMNS + DERIVATIVE_COLUMNS)
+  return df.drop(columns=REMAINING_COLUMNS)
+
+# reads an open overview csv file (e.g. a member opened straight out of the export zip) into a df of the
+# telemetry columns declared in telemetry_schema. the headers are stripped before parsing, only the declared
+# columns are parsed, each with its declared dtype, and they come back under their database names.
+# with chunksize an iterator of dfs of that many rows is returned instead
+def read_overview_csv(source, chunksize=None):
+  if not isinstance(source, io.TextIOBase):
+    source = io.TextIOWrapper(source, encoding="utf-8-sig", newline="")
+  names = [name.lstrip() for name in next(csv.reader([source.readline()]))]
+  source_names = telemetry_schema.source_names()
+  source_dtypes = telemetry_schema.source_dtypes()
+  kept = [name for name in names if name in source_names]
+  reader = pd.read_csv(source, header=None, names=names, usecols=kept,
+                       dtype={name: source_dtypes[name] for name in kept}, chunksize=chunksize)
+  if chunksize is None:
+    return reader.rename(columns=source_names)
+  return (chunk.rename(columns=source_names) for chunk in reader)
+
+# the METAR archive columns that are not stored
+DROPPED_WEATHER_COLUMNS = ["station", "p01i", "feel", "ice_accretion_1hr", "ice_accretion_3hr", "ice_accretion_6hr",
+                           "peak_wind_gust", "peak_wind_drct", "peak_wind_time", "snowdepth"]
+# the kept archive columns and their DB names, in table order after weather_date and weather_time_utc
+WEATHER_COLUMN_NAMES = {"tmpf": "temperature", "dwpf": "dewpoint", "relh": "relative_humidity",
+                        "drct": "wind_direction", "sknt": "wind_speed", "alti": "pressure_altimeter",
+                        "mslp": "sea_level_pressure", "vsby": "visibility", "gust": "wind_gust",
+                        "skyc1": "sky_coverage_1", "skyc2": "sky_coverage_2", "skyc3": "sky_coverage_3",
+                        "skyc4": "sky_coverage_4", "skyl1": "sky_level_1", "skyl2": "sky_level_2",
+                        "skyl3": "sky_level_3", "skyl4": "sky_level_4", "wxcodes": "weather_codes", "metar": "metar"}
+# the columns stored as SMALLINT and the text columns, by archive name
+WEATHER_SMALLINT_COLUMNS = ["drct", "sknt", "gust", "skyl1", "skyl2", "skyl3", "skyl4"]
+WEATHER_TEXT_COLUMNS = ["skyc1", "skyc2", "skyc3", "skyc4", "wxcodes", "metar"]
+# "M" marks a missing value, "T" a trace amount (only in the precipitation columns, which are not stored)
+WEATHER_MISSING = "M"
+WEATHER_TRACE = "T"
+# rows per chunk when a METAR archive is read in chunks
+WEATHER_CHUNK_ROWS = 50000
 
 # takes in weather df, drops the irrelevant weather columns
 def drop_weather_columns(df):
-  df = df.drop("station", axis=1)
-  df = df.drop("p01i", axis=1)
-  df = df.drop("feel", axis=1)
-  df = df.drop("ice_accretion_1hr", axis=1)
-  df = df.drop("ice_accretion_3hr", axis=1)
-  df = df.drop("ice_accretion_6hr", axis=1)
-  df = df.drop("peak_wind_gust", axis=1)
-  df = df.drop("peak_wind_drct", axis=1)
-  df = df.drop("peak_wind_time", axis=1)
-  df = df.drop("snowdepth", axis=1)
-  return df
+  return df.drop(columns=DROPPED_WEATHER_COLUMNS)
 
 # takes in weather df, converts timestamp into date and time
 def weather_datetime_parsing(df):
-  # get the timestamps into a list
-  timestamp_list = df['valid'].tolist()
-  # create lists for new, separated date and time
-  weather_date = []
-  weather_time_utc = []
-  # for each timestamp, separate date and time, push to new list
-  for timestamp in timestamp_list:
-    datetime_obj = datetime.strptime(timestamp, "%Y-%m-%d %H:%M")
-    weather_date.append(datetime_obj.date())
-    weather_time_utc.append(datetime_obj.time())
+  # parse every timestamp at once
+  valid = pd.to_datetime(df['valid'], format="%Y-%m-%d %H:%M")
   # replace the valid column with the weather date
-  df["valid"] = weather_date
+  df["valid"] = valid.dt.date
   # make a new column after with the weather time in UTC
-  df.insert(1, "weather_time_utc", weather_time_utc)
+  df.insert(1, "weather_time_utc", valid.dt.time)
   return df
 
 # takes in weather df, changes column names to those in DB schema
 def weather_column_names(df):
-  new_columns = ["weather_date", "weather_time_utc", "temperature", "dewpoint",
-                 "relative_humidity", "wind_direction", "wind_speed",
-                 "pressure_altimeter", "sea_level_pressure", "visibility",
-                 "wind_gust", "sky_coverage_1", "sky_coverage_2", "sky_coverage_3",
-                 "sky_coverage_4", "sky_level_1", "sky_level_2", "sky_level_3",
-                 "sky_level_4", "weather_codes", "metar"]
+  new_columns = ["weather_date", "weather_time_utc"] + list(WEATHER_COLUMN_NAMES.values())
   # replace the initial column names in the df
   df = df.set_axis(new_columns, axis="columns")
   return df
@@ -84,15 +91,10 @@ def weather_column_names(df):
 # cleans data to be ingestible to db
 def data_format_cleaning(df):
   # replace "M" values with null
-  df.replace("M", np.nan, inplace=True)
-  # convert smallint columns to int
-  df['wind_direction'] = df['wind_direction'].astype(float).round().astype(int, errors="ignore")
-  df['wind_speed'] = df['wind_speed'].astype(float).round().astype(int, errors="ignore")
-  df['wind_gust'] = df['wind_gust'].astype(float).round().astype(int, errors="ignore")
-  df['sky_level_1'] = df['sky_level_1'].astype(float).round().astype(int, errors="ignore")
-  df['sky_level_2'] = df['sky_level_2'].astype(float).round().astype(int, errors="ignore")
-  df['sky_level_3'] = df['sky_level_3'].astype(float).round().astype(int, errors="ignore")
-  df['sky_level_4'] = df['sky_level_4'].astype(float).round().astype(int, errors="ignore")
+  df = df.replace(WEATHER_MISSING, np.nan)
+  # convert the smallint columns to nullable ints as one group
+  smallint_columns = [WEATHER_COLUMN_NAMES[col] for col in WEATHER_SMALLINT_COLUMNS]
+  df[smallint_columns] = df[smallint_columns].apply(pd.to_numeric).round().astype("Int64")
   return df
 
 # combine the transformation functions into one
@@ -103,3 +105,30 @@ def weather_transformation(df):
   df = data_format_cleaning(df)
   
   return df
+
+# reads a METAR archive csv (a path or an open file) straight into the weather_transformation format.
+# only the stored columns are parsed, the "M" and "T" sentinels become nulls while parsing and the numeric
+# columns get their dtypes up front. with chunksize an iterator of transformed dfs is returned, so a
+# multi-year archive never has to be held in memory at once
+def read_weather_csv(source, chunksize=None):
+  numeric_columns = [col for col in WEATHER_COLUMN_NAMES if col not in WEATHER_TEXT_COLUMNS]
+  reader = pd.read_csv(source, usecols=["valid"] + list(WEATHER_COLUMN_NAMES),
+                       dtype={**{col: np.float64 for col in numeric_columns}, **{col: object for col in WEATHER_TEXT_COLUMNS}},
+                       na_values={**{col: [WEATHER_MISSING, WEATHER_TRACE] for col in numeric_columns},
+                                  **{col: [WEATHER_MISSING] for col in WEATHER_TEXT_COLUMNS}},
+                       keep_default_na=False, chunksize=chunksize)
+  if chunksize is None:
+    return _clean_weather_chunk(reader)
+  return (_clean_weather_chunk(chunk) for chunk in reader)
+
+# puts one parsed archive chunk into the weather_transformation format
+def _clean_weather_chunk(df):
+  df = df[["valid"] + list(WEATHER_COLUMN_NAMES)]
+  df = weather_datetime_parsing(df)
+  df = weather_column_names(df)
+  # empty fields are missing too
+  text_columns = [WEATHER_COLUMN_NAMES[col] for col in WEATHER_TEXT_COLUMNS]
+  df[text_columns] = df[text_columns].replace("", np.nan)
+  smallint_columns = [WEATHER_COLUMN_NAMES[col] for col in WEATHER_SMALLINT_COLUMNS]
+  df[smallint_columns] = df[smallint_columns].round().astype("Int64")
+  return df
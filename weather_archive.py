@@ -0,0 +1,145 @@
+# this file keeps the weather table as a local METAR archive. weather_coverage records which whole days
+# of a station are already stored, so a scrape only downloads the days it is missing, straight over HTTP
+import datetime as dt
+import io
+import os
+import pandas as pd
+import requests
+from database import get_engine
+from storage import db_connect, db_disconnect, store_weather, relevant_weather, WEATHER_STATION
+from transformation import read_weather_csv, WEATHER_CHUNK_ROWS, WEATHER_COLUMN_NAMES, WEATHER_SMALLINT_COLUMNS
+import queries
+
+# the Iowa Mesonet ASOS download, seconds to wait for it, and a local archive csv to read instead (for tests
+# and offline runs, see LocalMetarFetcher)
+METAR_URL = "https://mesonet.agron.iastate.edu/cgi-bin/request/asos.py"
+METAR_TIMEOUT = int(os.getenv('METAR_TIMEOUT', 60))
+METAR_FILE = os.getenv('METAR_FILE')
+# days before today (UTC) whose last observations the Mesonet may not have published yet. they are stored
+# but not recorded as covered, so the next scrapes download them again
+METAR_UNSETTLED_DAYS = int(os.getenv('METAR_UNSETTLED_DAYS', 1))
+
+# downloads the METAR archive of a station for the days start_date (inclusive) to end_date (exclusive)
+# every fetcher has fetch(station, start_date, end_date) returning the archive csv as a text stream
+class IemMetarFetcher:
+  def __init__(self, url=METAR_URL, timeout=METAR_TIMEOUT, session=None):
+    self.url = url
+    self.timeout = timeout
+    self.session = session if session is not None else requests.Session()
+    self.bytes_fetched = 0
+
+  def fetch(self, station, start_date, end_date):
+    params = [("station", station), ("data", "all"),
+              ("year1", start_date.year), ("month1", start_date.month), ("day1", start_date.day),
+              ("year2", end_date.year), ("month2", end_date.month), ("day2", end_date.day),
+              ("tz", "Etc/UTC"), ("format", "onlycomma"), ("latlon", "no"), ("elev", "no"),
+              ("missing", "M"), ("trace", "T"), ("direct", "yes"), ("report_type", 3), ("report_type", 4)]
+    response = self.session.get(self.url, params=params, timeout=self.timeout)
+    response.raise_for_status()
+    self.bytes_fetched += len(response.content)
+    return io.StringIO(response.text)
+
+# stands in for IemMetarFetcher with an archive csv already on disk, returning only the requested days
+class LocalMetarFetcher:
+  def __init__(self, path):
+    self.path = path
+    self.bytes_fetched = 0
+
+  def fetch(self, station, start_date, end_date):
+    archive_df = pd.read_csv(self.path, dtype=str, keep_default_na=False)
+    days = archive_df["valid"].str[:10]
+    archive_df = archive_df[(archive_df["station"] == station) &
+                            (days >= start_date.isoformat()) & (days < end_date.isoformat())]
+    text = archive_df.to_csv(index=False)
+    self.bytes_fetched += len(text)
+    return io.StringIO(text)
+
+# the fetcher scrapes use: the local archive when METAR_FILE is set, the Iowa Mesonet otherwise
+def default_fetcher():
+  if METAR_FILE:
+    return LocalMetarFetcher(METAR_FILE)
+  return IemMetarFetcher()
+
+# takes in the covered (start, end) day ranges and returns the ranges of [start_date, end_date) not covered
+def missing_ranges(covered, start_date, end_date):
+  gaps = []
+  next_missing = start_date
+  for covered_start, covered_end in sorted(covered):
+    if covered_start >= end_date:
+      break
+    if covered_start > next_missing:
+      gaps.append((next_missing, covered_start))
+    next_missing = max(next_missing, covered_end)
+  if next_missing < end_date:
+    gaps.append((next_missing, end_date))
+  return gaps
+
+# returns the recorded (start, end) day ranges of the station overlapping [start_date, end_date)
+def covered_ranges(station, start_date, end_date):
+  conn = db_connect()
+  cursor = conn.cursor()
+  try:
+    cursor.execute(queries.SELECT_WEATHER_COVERAGE, (station, start_date, end_date))
+    return [(row[0], row[1]) for row in cursor.fetchall()]
+  finally:
+    cursor.close()
+    db_disconnect(conn)
+
+# takes in the days that have observations and returns them as (start, end) ranges of consecutive days
+def observed_ranges(days):
+  ranges = []
+  for day in sorted(set(days)):
+    if ranges and ranges[-1][1] == day:
+      ranges[-1] = (ranges[-1][0], day + dt.timedelta(days=1))
+    else:
+      ranges.append((day, day + dt.timedelta(days=1)))
+  return ranges
+
+def record_coverage(station, start_date, end_date):
+  conn = db_connect()
+  cursor = conn.cursor()
+  try:
+    cursor.execute(queries.INSERT_WEATHER_COVERAGE, (station, start_date, end_date))
+    conn.commit()
+  finally:
+    cursor.close()
+    db_disconnect(conn)
+
+# downloads and stores the days of [start_date, end_date) the archive is missing, returns the rows stored.
+# only the days that returned observations and are older than METAR_UNSETTLED_DAYS are recorded as covered.
+# today, the unsettled days and days the download had nothing for are downloaded again next time
+def update_archive(start_date, end_date, station=WEATHER_STATION, fetcher=None, today=None):
+  fetcher = fetcher if fetcher is not None else default_fetcher()
+  today = today if today is not None else dt.datetime.now(dt.timezone.utc).date()
+  settled_end = today - dt.timedelta(days=METAR_UNSETTLED_DAYS)
+  rows_stored = 0
+  for gap_start, gap_end in missing_ranges(covered_ranges(station, start_date, end_date), start_date, end_date):
+    source = fetcher.fetch(station, gap_start, gap_end)
+    observed_days = set()
+    for chunk in read_weather_csv(source, chunksize=WEATHER_CHUNK_ROWS):
+      rows_stored += store_weather(chunk.assign(station=station))
+      observed_days.update(chunk["weather_date"])
+    for covered_start, covered_end in observed_ranges(day for day in observed_days if day < settled_end):
+      record_coverage(station, covered_start, covered_end)
+  print(f"Weather archive: stored {rows_stored} observations, {fetcher.bytes_fetched / 1e3:.1f} kB downloaded")
+  return rows_stored
+
+# returns the archived observations of the station from start_date to end_date (exclusive), in time order
+def archived_weather(start_date, end_date, station=WEATHER_STATION):
+  columns = ["weather_date", "weather_time_utc"] + list(WEATHER_COLUMN_NAMES.values())
+  query = queries.SELECT_ARCHIVED_WEATHER.format(columns=", ".join(f'"{col}"' for col in columns))
+  weather_df = pd.read_sql_query(query, get_engine(),
+                                 params={"station": station, "start": start_date, "end": end_date})
+  smallint_columns = [WEATHER_COLUMN_NAMES[col] for col in WEATHER_SMALLINT_COLUMNS]
+  weather_df[smallint_columns] = weather_df[smallint_columns].astype("Int64")
+  return weather_df
+
+# takes in the start datetimes and ids of newly stored flights, brings the archive up to date around them
+# and links every flight to its observations. the window starts a day early for the reading before a flight
+# just after midnight and ends a day late for flights running past midnight
+def link_archived_weather(date_list, ids_list, station=WEATHER_STATION, fetcher=None, today=None):
+  today = today if today is not None else dt.datetime.now(dt.timezone.utc).date()
+  start_date = min(date_list).date() - dt.timedelta(days=1)
+  end_date = min(max(date_list).date() + dt.timedelta(days=2), today + dt.timedelta(days=1))
+  update_archive(start_date, end_date, station, fetcher, today)
+  relevant_weather(archived_weather(start_date, end_date, station), ids_list)
@@ -1,6 +1,5 @@
 from datetime import date
-from dotenv import load_dotenv
-from sqlalchemy import create_engine
+from database import get_engine
 from forecast import get_forcast_from_today
 from storage import db_connect, table_exists, execute
 import pandas as pd
@@ -9,17 +8,10 @@ import os
 # Database Connection Function ---------------------------------------------------------------------------------------------------------
 def connect():
     """
-    The function initiates a connection with the PostgreSQL database using the DATABASE_URL.
+    The function returns the process-wide engine for the PostgreSQL database, see database.py.
     """
-    # Load .env file
-    load_dotenv()
-
-    # Connect to Database
-    engine_string = "postgresql+psycopg2" + os.getenv('DATABASE_URL')[8:]
-    
-    engine = create_engine(engine_string)
-
-    return engine
+    # Borrow the shared engine, its pool keeps the connections open between queries
+    return get_engine()
 
 
 def get_current_date():
@@ -73,6 +65,5 @@ def get_forecast_by_current_date():
             """
     weather_flight_df = pd.read_sql_query(query, engine)
 
-    # Dispose of the engine and close its connection and then return the dataframe
-    engine.dispose()
+    # Return the dataframe
     return weather_flight_df
\ No newline at end of file
@@ -0,0 +1,67 @@
+# the methods in this script match METAR weather observations to the flights they cover
+import numpy as np
+import pandas as pd
+
+# combines the weather_date and weather_time_utc columns into one datetime64 array
+# a multi-year archive only has a few thousand distinct dates and times, so only those are parsed
+def weather_datetimes(df):
+  date_codes, unique_dates = pd.factorize(df["weather_date"])
+  time_codes, unique_times = pd.factorize(df["weather_time_utc"])
+  dates = pd.to_datetime(pd.Index(unique_dates).astype(str)).to_numpy()
+  times = pd.to_timedelta(pd.Index(unique_times).astype(str)).to_numpy()
+  return dates[date_codes] + times[time_codes]
+
+# takes in a df of flights (flight_id, start as a UTC datetime, duration_min) and the weather df,
+# returns every (flight, weather row) pair as the weather rows with a flight_id column added.
+# a flight gets every reading between its start and end, plus the last reading before it started
+# unless a reading lands exactly on the start. flights crossing midnight UTC are handled since
+# the comparison is done on full datetimes. the input dfs are not modified.
+def match_weather_to_flights(flights_df, weather_df):
+  if weather_df.empty or flights_df.empty:
+    return weather_df.iloc[0:0].assign(flight_id=pd.Series(dtype=int))
+
+  # sort the weather once, everything after this is a binary search
+  weather_times = weather_datetimes(weather_df)
+  order = np.argsort(weather_times, kind="stable")
+  weather_times = weather_times[order]
+
+  starts = pd.to_datetime(flights_df["start"]).to_numpy()
+  ends = starts + pd.to_timedelta(flights_df["duration_min"].fillna(0).to_numpy(dtype=float), unit="m").to_numpy()
+
+  # the readings inside [start, end] are the positions lo..hi-1
+  lo = np.searchsorted(weather_times, starts, side="left")
+  hi = np.searchsorted(weather_times, ends, side="right")
+  # step back to the reading before the flight started, unless one lands exactly on the start
+  exact_start = (lo < len(weather_times)) & (weather_times[np.minimum(lo, len(weather_times) - 1)] == starts)
+  first = np.where(~exact_start & (lo > 0), lo - 1, lo)
+
+  # every flight is now one contiguous run [first, hi) of the sorted weather, expand the runs into pairs
+  counts = np.maximum(hi - first, 0)
+  flight_index = np.repeat(np.arange(len(flights_df)), counts)
+  run_offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+  weather_index = order[np.repeat(first, counts) + run_offsets]
+
+  matched_df = weather_df.iloc[weather_index].reset_index(drop=True)
+  matched_df["flight_id"] = flights_df["flight_id"].to_numpy()[flight_index]
+  return matched_df
+
+# same as match_weather_to_flights, for an archive that comes in time-ordered chunks (e.g. read_weather_csv
+# with a chunksize), so only the matched rows are ever kept. each chunk is matched with the last reading of
+# the chunk before it prepended, and only against the flights that start before the chunk ends; a flight
+# starting later finds its preceding reading in a later chunk. a pair found in two chunks is kept once
+def match_weather_chunks(flights_df, weather_chunks):
+  starts = pd.to_datetime(flights_df["start"]).to_numpy()
+  matched = []
+  previous = None
+  for chunk in weather_chunks:
+    if chunk.empty:
+      continue
+    if previous is not None:
+      chunk = pd.concat([previous, chunk], ignore_index=True)
+    chunk_end = weather_datetimes(chunk).max()
+    matched.append(match_weather_to_flights(flights_df[starts <= chunk_end], chunk))
+    previous = chunk.iloc[[int(np.argmax(weather_datetimes(chunk)))]]
+  if not matched:
+    return match_weather_to_flights(flights_df, pd.DataFrame())
+  matched_df = pd.concat(matched, ignore_index=True)
+  return matched_df.drop_duplicates(subset=["flight_id", "weather_date", "weather_time_utc"], ignore_index=True)
@@ -1,5 +1,4 @@
-from dotenv import load_dotenv
-from sqlalchemy import create_engine
+from database import get_engine
 import pandas as pd
 import os
 
@@ -10,15 +9,8 @@ class query_weather:
         """
         
         """
-        # Load .env files
-        load_dotenv()
-
-        # Connect to Database
-        engine_string = "postgresql+psycopg2" + os.getenv('DATABASE_URL')[8:]
-        
-        engine = create_engine(engine_string)
-
-        return engine
+        # Borrow the shared engine, its pool keeps the connections open between queries
+        return get_engine()
     
 
     def get_weather_by_flight_id(self, flight_id):
@@ -51,8 +43,6 @@ class query_weather:
         # Select the data based on the query
         weather_flight_df = pd.read_sql_query(query, engine)
 
-        engine.dispose()
-
         return weather_flight_df
     
 
@@ -72,7 +62,5 @@ class query_weather:
         # Select the data based on the query
         weather_flight_df = pd.read_sql_query(query, engine)
 
-        engine.dispose()
-
         return weather_flight_df
         